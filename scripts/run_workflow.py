@@ -5,21 +5,28 @@ Usage:
     python scripts/run_workflow.py --workflow triagem_rapida --input data/inputs/caso.json
     python scripts/run_workflow.py --workflow peticao_inicial --input caso.json --interactive
     python scripts/run_workflow.py --workflow triagem_rapida --caso "Empregado demitido após 5 anos..."
+    python scripts/run_workflow.py --workflow peticao_inicial --input caso.json --parallel
+    python scripts/run_workflow.py --workflow peticao_inicial --input caso.json --stream
+    python scripts/run_workflow.py --workflow triagem_rapida --input-glob "data/inputs/*.json" \
+        --concurrency 8 --output-dir data/outputs
 """
 import argparse
-import json
+import asyncio
+import glob
 import logging
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from src.agents.base_agent import run_sync
 from src.workflows.workflow_engine import WorkflowEngine
 from src.workflows.definitions import (
     triagem_rapida_workflow,
     recurso_ordinario_workflow,
     peticao_inicial_workflow,
 )
+from src.utils import json_utils
 from src.utils.workflow_models import WorkflowStatus
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s — %(message)s")
@@ -32,6 +39,13 @@ WORKFLOW_MAP = {
 }
 
 
+def _print_stream(agent_name: str, chunk: str, is_final: bool) -> None:
+    if is_final:
+        print(f"   [{agent_name}] ✓", flush=True)
+    else:
+        print(f"   [{agent_name}] {chunk}", flush=True)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Run a legal workflow")
     parser.add_argument("--workflow", required=True, choices=list(WORKFLOW_MAP.keys()))
@@ -39,16 +53,36 @@ def main():
     input_group = parser.add_mutually_exclusive_group(required=True)
     input_group.add_argument("--input", help="JSON file with workflow input")
     input_group.add_argument("--caso", help="Case description text (quick mode)")
+    input_group.add_argument("--input-glob",
+                             help="Glob of JSON inputs to run as a batch (e.g. 'casos/*.json')")
 
     parser.add_argument("--interactive", action="store_true", help="Enable human gates")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Run independent steps concurrently")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print each agent's output fields as they are generated")
     parser.add_argument("--output", help="Save result JSON to file")
     parser.add_argument("--trace-only", action="store_true", help="Print only execution trace")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="Batch mode: workflows in flight at once (default: 4)")
+    parser.add_argument("--length-bins", type=int,
+                        help="Batch mode: run cases in N groups of similar length")
+    parser.add_argument("--output-dir",
+                        help="Batch mode: save each result as <output-dir>/<input stem>.json")
     args = parser.parse_args()
 
+    if args.input_glob:
+        if args.interactive:
+            parser.error("--interactive cannot be combined with --input-glob")
+        paths = sorted(Path(p) for p in glob.glob(args.input_glob, recursive=True))
+        if not paths:
+            parser.error(f"no input matches {args.input_glob!r}")
+        results = run_sync(_run_batch(paths, args))
+        sys.exit(0 if all(r.succeeded for r in results) else 1)
+
     # Load input
     if args.input:
-        with open(args.input) as f:
-            initial_input = json.load(f)
+        initial_input = json_utils.loads(Path(args.input).read_bytes())
     else:
         initial_input = {"caso": args.caso}
 
@@ -60,9 +94,14 @@ def main():
     # Run
     print(f"\n🚀 Iniciando workflow: {args.workflow}")
     print(f"   Interativo: {args.interactive}")
+    print(f"   Paralelo: {args.parallel}")
     print()
 
-    result = engine.run(args.workflow, initial_input, interactive=args.interactive)
+    result = run_sync(engine.arun(
+        args.workflow, initial_input,
+        interactive=args.interactive, parallel=args.parallel,
+        streaming_callback=_print_stream if args.stream else None,
+    ))
 
     # Output
     print(f"\n{'='*60}")
@@ -111,19 +150,60 @@ def main():
 
     # Save output
     if args.output:
-        output_data = {
-            "workflow_id": result.workflow_id,
-            "workflow_name": result.workflow_name,
-            "status": result.status.value,
-            "final_output": result.final_output,
-            "trace": result.trace.to_dict(),
-        }
-        with open(args.output, "w", encoding="utf-8") as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        Path(args.output).write_bytes(json_utils.dumpb(_output_data(result), pretty=True))
         print(f"\n💾 Resultado salvo em: {args.output}")
 
     sys.exit(0 if result.succeeded else 1)
 
 
+def _output_data(result) -> dict:
+    return {
+        "workflow_id": result.workflow_id,
+        "workflow_name": result.workflow_name,
+        "status": result.status.value,
+        "final_output": result.final_output,
+        "trace": result.trace.to_dict(),
+    }
+
+
+async def _run_batch(paths: list[Path], args) -> list:
+    """
+    Run the workflow once per input file, up to --concurrency at a time.
+
+    One process, one engine and one pooled SDK client serve the whole
+    batch (WorkflowEngine.arun_batch), so interpreter startup and TLS
+    handshakes are paid once.
+    """
+    engine = WorkflowEngine()
+    engine.register(WORKFLOW_MAP[args.workflow]())
+    output_dir = Path(args.output_dir) if args.output_dir else None
+    if output_dir:
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"\n🚀 Lote: {len(paths)} casos — workflow {args.workflow}, "
+          f"concorrência {args.concurrency}, paralelo {args.parallel}\n")
+
+    raw_inputs = await asyncio.gather(*(asyncio.to_thread(p.read_bytes) for p in paths))
+    inputs = [json_utils.loads(raw) for raw in raw_inputs]
+
+    async def report(index: int, result) -> None:
+        path = paths[index]
+        icon = "✅" if result.succeeded else "❌"
+        print(f"  {icon} {path.name}: {result.status.value} "
+              f"({result.trace.total_duration_ms:.0f}ms, {result.trace.total_tokens_used} tokens)")
+        if output_dir:
+            data = json_utils.dumpb(_output_data(result), pretty=True)
+            await asyncio.to_thread((output_dir / f"{path.stem}.json").write_bytes, data)
+
+    results = await engine.arun_batch(
+        args.workflow, inputs,
+        max_concurrent=args.concurrency, parallel=args.parallel, on_result=report,
+        length_bins=args.length_bins,
+    )
+    ok = sum(r.succeeded for r in results)
+    print(f"\n{ok}/{len(results)} concluídos com sucesso")
+    return results
+
+
 if __name__ == "__main__":
     main()
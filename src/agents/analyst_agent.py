@@ -34,40 +34,38 @@ Output contract (written to memory as 'analise'):
 """
 from __future__ import annotations
 
-from src.agents.base_agent import BaseAgent
+from src.agents.base_agent import BaseAgent, cached_system
+from src.utils.jit import maybe_njit
+from src.utils.prompt_compress import clip_by_tokens, dedupe_ordered
+from src.utils.prompt_utils import bulletize, joined
 from src.utils.workflow_models import WorkflowMemory
 
+CASO_MAX_TOKENS = 375  # ≈ 1500 characters of case text
+
+# prob < 0.4 → desfavoravel, 0.4 ≤ prob < 0.6 → incerto, prob ≥ 0.6 → favoravel
+_CATEGORIA_BINS = (0.4, 0.6)
+_CATEGORIAS = ("desfavoravel", "incerto", "favoravel")
+VALID_SEVERIDADES = frozenset({"alta", "media", "baixa"})
+
+
+@maybe_njit
+def _normalize_numeric(probability: float, confidence: float) -> tuple[int, float, float]:
+    """
+    (_CATEGORIAS index, probability, confidence), both clamped to [0, 1].
+
+    Scalar-only so it can go through maybe_njit; the index matches
+    bisect_right over _CATEGORIA_BINS.
+    """
+    prob = min(max(probability, 0.0), 1.0)
+    conf = min(max(confidence, 0.0), 1.0)
+    idx = 0
+    for cut in _CATEGORIA_BINS:
+        if prob >= cut:
+            idx += 1
+    return idx, prob, conf
 
-class AnalystAgent(BaseAgent):
-    """Analyzes case merits, risks, and recommends litigation strategy."""
 
-    @property
-    def name(self) -> str:
-        return "AnalystAgent"
-
-    @property
-    def description(self) -> str:
-        return "Avalia mérito, riscos e estratégia processual do caso."
-
-    def _build_prompt(self, memory: WorkflowMemory) -> tuple[str, str]:
-        classification = memory.get("classification", {})
-        pesquisa = memory.get("pesquisa", {})
-        caso = memory.get("caso", "")
-        cliente = memory.get("cliente", "")
-
-        area = classification.get("area", "")
-        subarea = classification.get("subarea", "")
-        complexidade = classification.get("complexidade", "")
-        procedimento = classification.get("procedimento", "")
-        fatos = classification.get("fatos_principais", [])
-
-        leg_principal = pesquisa.get("legislacao_principal", [])
-        sumulas = pesquisa.get("sumulas", [])
-        fund_favor = pesquisa.get("fundamentos_favor", [])
-        fund_contra = pesquisa.get("fundamentos_contra", [])
-        jurisp = pesquisa.get("jurisprudencia_dominante", "controvertida")
-
-        system = """\
+ANALYST_SYSTEM_PROMPT = """\
 Você é um advogado sênior brasileiro especializado em análise de mérito processual. 
 Analise o caso e produza uma avaliação jurídica estruturada.
 
@@ -95,56 +93,76 @@ CRITÉRIOS DE PROBABILIDADE:
 
 TIPOS DE RISCO: prescricao, decadencia, prova, tecnico, economico, reputacional
 """
-        user = f"""ÁREA: {area} / {subarea}
+
+ANALYST_USER_TEMPLATE = """ÁREA: {area} / {subarea}
 COMPLEXIDADE: {complexidade}
 PROCEDIMENTO: {procedimento}
-JURISPRUDÊNCIA DOMINANTE: {jurisp}
+JURISPRUDÊNCIA DOMINANTE: {jurisprudencia}
 
 CASO:
-{caso[:1500]}
+{caso}
 
-CLIENTE: {cliente or 'não informado'}
-FATOS PRINCIPAIS: {', '.join(fatos)}
+CLIENTE: {cliente}
+FATOS PRINCIPAIS: {fatos}
 
 FUNDAMENTOS FAVORÁVEIS:
-{chr(10).join('- ' + f for f in fund_favor[:5])}
+{fund_favor}
 
 FUNDAMENTOS CONTRÁRIOS:
-{chr(10).join('- ' + f for f in fund_contra[:3])}
+{fund_contra}
 
-LEGISLAÇÃO APLICÁVEL: {', '.join(leg_principal[:5])}
-SÚMULAS: {', '.join(sumulas[:5])}
+LEGISLAÇÃO APLICÁVEL: {legislacao}
+SÚMULAS: {sumulas}
 
 Produza a análise de mérito."""
 
-        return system, user
 
-    def _parse_output(self, raw: dict) -> tuple[dict, float]:
-        confidence = float(raw.get("confidence", 0.7))
-        confidence = max(0.0, min(1.0, confidence))
+class AnalystAgent(BaseAgent):
+    """Analyzes case merits, risks, and recommends litigation strategy."""
 
-        prob = float(raw.get("probabilidade_exito", 0.5))
-        prob = max(0.0, min(1.0, prob))
+    name = "AnalystAgent"
+    description = "Avalia mérito, riscos e estratégia processual do caso."
+
+    def _build_prompt(self, memory: WorkflowMemory) -> tuple[list[dict], str]:
+        m = memory.view()
+        classification = m.get("classification", {})
+        pesquisa = m.get("pesquisa", {})
+        legislacao = dedupe_ordered(pesquisa.get("legislacao_principal", []))
+        fund_favor = dedupe_ordered(pesquisa.get("fundamentos_favor", []))
+
+        user = ANALYST_USER_TEMPLATE.format_map({
+            "area": classification.get("area", ""),
+            "subarea": classification.get("subarea", ""),
+            "complexidade": classification.get("complexidade", ""),
+            "procedimento": classification.get("procedimento", ""),
+            "jurisprudencia": pesquisa.get("jurisprudencia_dominante", "controvertida"),
+            "caso": clip_by_tokens(m.get("caso", ""), CASO_MAX_TOKENS),
+            "cliente": m.get("cliente", "") or "não informado",
+            "fatos": joined(dedupe_ordered(classification.get("fatos_principais", []))),
+            "fund_favor": bulletize(fund_favor, 5),
+            "fund_contra": bulletize(dedupe_ordered(pesquisa.get("fundamentos_contra", []), exclude=fund_favor), 3),
+            "legislacao": joined(legislacao, 5),
+            "sumulas": joined(dedupe_ordered(pesquisa.get("sumulas", []), exclude=legislacao), 5),
+        })
+
+        return cached_system(ANALYST_SYSTEM_PROMPT), user
 
-        # Auto-compute category from probability
-        if prob >= 0.6:
-            categoria = "favoravel"
-        elif prob >= 0.4:
-            categoria = "incerto"
-        else:
-            categoria = "desfavoravel"
+    def _parse_output(self, raw: dict) -> tuple[dict, float]:
+        idx, prob, confidence = _normalize_numeric(
+            float(raw.get("probabilidade_exito", 0.5)), float(raw.get("confidence", 0.7))
+        )
 
-        # Override with explicit if valid
-        explicit_cat = raw.get("categoria_exito", "")
-        if explicit_cat in ("favoravel", "incerto", "desfavoravel"):
-            categoria = explicit_cat
+        # Explicit category if valid, else derived from probability
+        categoria = raw.get("categoria_exito", "")
+        if categoria not in _CATEGORIAS:
+            categoria = _CATEGORIAS[idx]
 
         # Validate risks
         riscos = []
         for risk in raw.get("riscos", []):
             if isinstance(risk, dict) and "tipo" in risk:
                 sev = risk.get("severidade", "media")
-                if sev not in ("alta", "media", "baixa"):
+                if sev not in VALID_SEVERIDADES:
                     sev = "media"
                 riscos.append({
                     "tipo": risk["tipo"],
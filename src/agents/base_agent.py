@@ -26,19 +26,273 @@ Agent composition rules:
   - Agents communicate only through WorkflowMemory
   - Agents must not call other agents directly
   - The WorkflowEngine is responsible for sequencing
+
+Sync and async:
+  execute() blocks on the provider SDK; aexecute() awaits the async SDK.
+  Both share prompt building and output parsing, so they always agree.
+
+Connection reuse:
+  SDK clients are process-wide per provider and sit on one httpx pool
+  (HTTP/2 when `h2` is installed), so every agent of every workflow
+  reuses warm TLS connections instead of handshaking per call.
+  Async clients are kept per event loop — an httpx.AsyncClient must not
+  outlive or cross the loop it was first used on.
+
+Retries:
+  Rate limits, 5xx/overloaded responses and connection errors are retried
+  with exponential backoff and jitter (honouring Retry-After) before the
+  call gives up and returns an empty dict. Other errors fail immediately.
+
+Prompt caching:
+  Prompts may be plain strings or lists of content blocks. Agents return
+  their static system prompt via cached_system(), which marks it with an
+  Anthropic cache_control checkpoint; OpenAI gets the flattened text and
+  caches the identical prefix automatically.
+
+Result cache:
+  Each agent memoizes parsed (output, confidence) by a blake2b hash of
+  its name, model and prompts (bounded LRU, 1024 entries by default).
+  A hit skips the LLM call and parsing and reports llm_calls=0 — in
+  batch runs, similar cases often produce identical classifier and
+  researcher prompts. Only successful parses are stored, so a failed
+  attempt is still retried against the LLM. This memoization is the
+  only state an agent keeps between calls.
 """
 from __future__ import annotations
 
-import json
+import asyncio
+import functools
 import logging
+import os
+import random
+import re
+import sys
+import threading
 import time
+import weakref
 from abc import ABC, abstractmethod
-from typing import Optional, Any
+from collections.abc import AsyncIterator, MutableMapping
+from typing import Callable, ClassVar, Optional, Any, Union
 
-from src.utils.workflow_models import StepResult, StepStatus, WorkflowMemory
+from src.utils import json_utils
+from src.utils.json_stream import TopLevelJSONStream
+from src.utils.llm_cache import LRUCache, prompt_key
+from src.utils.prompt_compress import completion_budget
+from src.utils.workflow_models import StepResult, StepStatus, WorkflowMemory, copy_data
 
 logger = logging.getLogger(__name__)
 
+# ```json ... ``` (or bare ```) around the payload; lazy so it stops at the first closing fence
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.+?)\s*```", re.DOTALL)
+
+_API_KEY_ENV = {"openai": "OPENAI_API_KEY", "anthropic": "ANTHROPIC_API_KEY"}
+_HTTP_TIMEOUT_S = 60.0
+_HTTP_MAX_CONNECTIONS = 32
+_HTTP_MAX_KEEPALIVE = 16
+
+_MAX_COMPLETION_TOKENS = 2000
+_AGENT_CACHE_SIZE = 1024
+
+# Transient-failure retries (rate limits, overloaded or unreachable provider)
+_RETRY_ATTEMPTS = 5
+_RETRY_INITIAL_S = 0.5
+_RETRY_MAX_S = 16.0
+_RETRY_AFTER_MAX_S = 60.0
+_RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+_RETRYABLE_ERRORS = frozenset({"APIConnectionError", "APITimeoutError"})
+
+_clients_lock = threading.Lock()
+_sync_clients: dict[str, Any] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _has_h2() -> bool:
+    try:
+        import h2  # noqa: F401 — httpx needs it for http2=True
+        return True
+    except ImportError:
+        return False
+
+
+def _http_options() -> dict:
+    import httpx
+    return dict(
+        http2=_has_h2(),
+        timeout=_HTTP_TIMEOUT_S,
+        limits=httpx.Limits(
+            max_connections=_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=_HTTP_MAX_KEEPALIVE,
+        ),
+    )
+
+
+@functools.lru_cache(maxsize=4)
+def _get_sdk(provider: str) -> Optional[tuple[type, type]]:
+    """
+    (sync_cls, async_cls) for `provider`, imported once per process.
+
+    The SDKs pull in httpx, pydantic and dozens of submodules; importing
+    lazily keeps `import src.agents` cheap for tests and dry runs, and the
+    cache means a missing SDK is only probed once.
+    """
+    try:
+        if provider == "openai":
+            from openai import AsyncOpenAI, OpenAI
+            return OpenAI, AsyncOpenAI
+        if provider == "anthropic":
+            import anthropic
+            return anthropic.Anthropic, anthropic.AsyncAnthropic
+    except ImportError:
+        logger.debug(f"{provider} SDK not installed")
+    return None
+
+
+def _build_client(provider: str, asynchronous: bool):
+    """Instantiate a provider SDK client on a pooled httpx client, or None."""
+    key = os.getenv(_API_KEY_ENV.get(provider, ""), "")
+    if not key:
+        return None
+    sdk = _get_sdk(provider)
+    if sdk is None:
+        return None
+    try:
+        import httpx
+        http_client = httpx.AsyncClient(**_http_options()) if asynchronous \
+            else httpx.Client(**_http_options())
+        cls = sdk[1] if asynchronous else sdk[0]
+        # Retries are ours (_retry_delay) — SDK retries would multiply them
+        return cls(api_key=key, http_client=http_client, max_retries=0)
+    except ImportError:
+        return None
+
+
+def _is_transient(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in _RETRYABLE_STATUS
+    # Both SDKs name their network errors alike (APITimeoutError subclasses
+    # APIConnectionError); match by name so neither SDK has to be importable
+    return any(c.__name__ in _RETRYABLE_ERRORS for c in type(exc).__mro__) \
+        or isinstance(exc, (TimeoutError, ConnectionError))
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds form only)."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return min(float(headers.get("retry-after")), _RETRY_AFTER_MAX_S)
+    except (TypeError, ValueError):
+        return None
+
+
+def _retry_delay(exc: Exception, attempt: int) -> Optional[float]:
+    """
+    Seconds to wait before retrying after `exc`, or None to give up.
+
+    Exponential backoff with jitter (so concurrent agents hitting the same
+    rate limit don't retry in lockstep), overridden by Retry-After when
+    the provider sends one.
+    """
+    if attempt + 1 >= _RETRY_ATTEMPTS or not _is_transient(exc):
+        return None
+    delay = _retry_after(exc)
+    if delay is None:
+        delay = min(_RETRY_INITIAL_S * 2 ** attempt + random.uniform(0, _RETRY_INITIAL_S), _RETRY_MAX_S)
+    logger.warning(
+        f"LLM call failed ({type(exc).__name__}: {exc}) — "
+        f"retry {attempt + 1}/{_RETRY_ATTEMPTS - 1} in {delay:.2f}s"
+    )
+    return delay
+
+
+def _shared_client(provider: str):
+    """Process-wide sync SDK client for `provider` (None if unavailable)."""
+    with _clients_lock:
+        client = _sync_clients.get(provider)
+        if client is None:
+            client = _build_client(provider, asynchronous=False)
+            if client is not None:
+                _sync_clients[provider] = client
+        return client
+
+
+def _shared_async_client(provider: str):
+    """Async SDK client for `provider` bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    per_loop = _async_clients.setdefault(loop, {})
+    client = per_loop.get(provider)
+    if client is None:
+        client = _build_client(provider, asynchronous=True)
+        if client is not None:
+            per_loop[provider] = client
+    return client
+
+
+async def aclose_loop_clients() -> None:
+    """Close the async SDK clients bound to the running event loop."""
+    per_loop = _async_clients.pop(asyncio.get_running_loop(), {})
+    for provider, client in per_loop.items():
+        try:
+            await client.close()  # also closes the pooled httpx.AsyncClient
+        except Exception as e:
+            logger.debug(f"closing {provider} async client failed: {e}")
+
+
+def run_sync(coro):
+    """
+    asyncio.run(coro), closing the loop's SDK clients before it shuts down.
+
+    Every asyncio.run gets a fresh loop, and _shared_async_client builds a
+    new pooled client for each; without this every sync batch call would
+    leave its connections open until garbage collection.
+    """
+    async def main():
+        try:
+            return await coro
+        finally:
+            await aclose_loop_clients()
+
+    return asyncio.run(main())
+
+
+# A prompt is either plain text or a list of provider content blocks
+# ({"type": "text", "text": ..., "cache_control": ...}).
+PromptContent = Union[str, list[dict]]
+
+
+def cached_block(text: str) -> dict:
+    """Text block marked as a prompt-cache checkpoint (Anthropic cache_control)."""
+    return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+
+def cached_system(text: str) -> list[dict]:
+    """
+    Static system prompt as cacheable content blocks.
+
+    Anthropic reuses the KV cache for everything up to the marker, so every
+    call of the same agent (any case) only pays full price for the user
+    message. OpenAI receives the flattened text and caches the identical
+    prefix on its own.
+    """
+    return [cached_block(text)]
+
+
+def prompt_text(content: PromptContent) -> str:
+    """Flatten prompt content to plain text (for OpenAI and cache keys)."""
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content)
+
+
+class LLMStreamInterrupted(RuntimeError):
+    """A streamed response failed after some of its fields were yielded."""
+
 
 class LLMCallStats:
     """Tracks LLM usage for a single agent execution."""
@@ -57,90 +311,296 @@ class AgentLLMClient:
     - JSON mode when supported
     - Usage tracking
     - Error handling with structured fallback
+    - Optional response cache (any MutableMapping, see src.utils.llm_cache)
     """
 
-    def __init__(self, provider: str = "openai", model: str = "gpt-4o-mini"):
+    def __init__(
+        self,
+        provider: str = "openai",
+        model: str = "gpt-4o-mini",
+        cache: Optional[MutableMapping] = None,
+    ):
         self.provider = provider
         self.model = model
+        self.cache = cache
         self._client = self._init_client()
+        self._aclient = None  # Resolved per event loop, see _async_client()
 
     def _init_client(self):
-        import os
+        return _shared_client(self.provider)
+
+    def _async_client(self):
+        """Explicit async client if one was injected, else the shared one for this loop."""
+        if self._aclient is not None:
+            return self._aclient
+        return _shared_async_client(self.provider)
+
+    def _max_tokens(self, system: str, user: str) -> int:
+        return completion_budget(system, user, self.model, cap=_MAX_COMPLETION_TOKENS)
+
+    def _openai_kwargs(self, system: PromptContent, user: PromptContent) -> dict:
+        # OpenAI caches identical prefixes automatically — flatten the blocks
+        system, user = prompt_text(system), prompt_text(user)
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            temperature=0.0,
+            max_tokens=self._max_tokens(system, user),
+            response_format={"type": "json_object"},
+        )
+
+    def _anthropic_kwargs(self, system: PromptContent, user: PromptContent) -> dict:
+        # Content blocks (with their cache_control markers) pass through as-is
+        if isinstance(system, str):
+            system = system + "\n\nRespond ONLY with valid JSON."
+        else:
+            system = [*system, {"type": "text", "text": "Respond ONLY with valid JSON."}]
+        return dict(
+            model=self.model,
+            max_tokens=self._max_tokens(prompt_text(system), prompt_text(user)),
+            temperature=0.0,
+            system=system,
+            messages=[{"role": "user", "content": user}],
+        )
+
+    def _request(self, client: Any, system: PromptContent, user: PromptContent) -> Any:
+        """One provider call; returns an awaitable when `client` is async."""
         if self.provider == "openai":
+            return client.chat.completions.create(**self._openai_kwargs(system, user))
+        return client.messages.create(**self._anthropic_kwargs(system, user))
+
+    def _handle_response(self, resp: Any, stats: Optional[LLMCallStats]) -> tuple[dict, int]:
+        """Extract content and usage from a provider response and parse the JSON."""
+        if self.provider == "openai":
+            content = resp.choices[0].message.content
+            tokens = resp.usage.total_tokens
+        else:
+            content = resp.content[0].text
+            tokens = resp.usage.input_tokens + resp.usage.output_tokens
+
+        if stats:
+            stats.calls += 1
+            stats.tokens_used += tokens
+
+        # Parse JSON, unwrapping a markdown fence if the model added one
+        match = _FENCE_RE.search(content)
+        payload = match.group(1) if match else content
+        return json_utils.loads(payload), tokens
+
+    def _cache_lookup(self, system: PromptContent, user: PromptContent) -> tuple[Optional[str], Optional[dict]]:
+        """Return (key, cached_dict); both None when caching is disabled."""
+        if self.cache is None:
+            return None, None
+        key = prompt_key(self.model, prompt_text(system), prompt_text(user))
+        try:
+            cached = self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return key, None
+        if cached is None:
+            return key, None
+        logger.debug(f"LLM cache hit ({key})")
+        return key, copy_data(cached)
+
+    def _cache_store(self, key: Optional[str], response: tuple[dict, int]) -> tuple[dict, int]:
+        parsed, _ = response
+        if key is not None and parsed:
             try:
-                from openai import OpenAI
-                key = os.getenv("OPENAI_API_KEY")
-                return OpenAI(api_key=key) if key else None
-            except ImportError:
-                return None
-        elif self.provider == "anthropic":
-            try:
-                import anthropic
-                key = os.getenv("ANTHROPIC_API_KEY")
-                return anthropic.Anthropic(api_key=key) if key else None
-            except ImportError:
-                return None
-        return None
+                self.cache[key] = copy_data(parsed)
+            except Exception as e:
+                logger.warning(f"LLM cache write failed: {e}")
+        return response
 
     def complete_json(
         self,
-        system: str,
-        user: str,
+        system: PromptContent,
+        user: PromptContent,
         stats: Optional[LLMCallStats] = None,
     ) -> tuple[dict, int]:
         """
         Get a JSON response from the LLM.
 
         Returns (parsed_dict, tokens_used).
-        Returns ({}, 0) on failure.
+        Returns ({}, 0) on failure (transient errors are retried first).
+        Returns (cached_dict, 0) on a cache hit.
         """
+        key, cached = self._cache_lookup(system, user)
+        if cached is not None:
+            return cached, 0
+
         if self._client is None:
             logger.warning("No LLM client — returning empty dict")
             return {}, 0
+        if self.provider not in _API_KEY_ENV:
+            return {}, 0
 
-        try:
-            if self.provider == "openai":
-                resp = self._client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system},
-                        {"role": "user", "content": user},
-                    ],
-                    temperature=0.0,
-                    max_tokens=2000,
-                    response_format={"type": "json_object"},
-                )
-                content = resp.choices[0].message.content
-                tokens = resp.usage.total_tokens
-            elif self.provider == "anthropic":
-                resp = self._client.messages.create(
-                    model=self.model,
-                    max_tokens=2000,
-                    temperature=0.0,
-                    system=system + "\n\nRespond ONLY with valid JSON.",
-                    messages=[{"role": "user", "content": user}],
-                )
-                content = resp.content[0].text
-                tokens = resp.usage.input_tokens + resp.usage.output_tokens
-            else:
-                return {}, 0
-
-            if stats:
-                stats.calls += 1
-                stats.tokens_used += tokens
-
-            # Parse JSON
-            content = content.strip()
-            if content.startswith("```"):
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-            return json.loads(content.strip()), tokens
+        for attempt in range(_RETRY_ATTEMPTS):
+            try:
+                resp = self._request(self._client, system, user)
+                return self._cache_store(key, self._handle_response(resp, stats))
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None:
+                    logger.error(f"LLM call failed: {e}")
+                    return {}, 0
+                time.sleep(delay)
+        return {}, 0
+
+    async def acomplete_json(
+        self,
+        system: PromptContent,
+        user: PromptContent,
+        stats: Optional[LLMCallStats] = None,
+    ) -> tuple[dict, int]:
+        """
+        Async counterpart of complete_json.
 
-        except Exception as e:
-            logger.error(f"LLM call failed: {e}")
+        Awaits the provider's async SDK so the event loop is free while
+        the HTTP request is in flight. Same return contract.
+        """
+        key, cached = self._cache_lookup(system, user)
+        if cached is not None:
+            return cached, 0
+
+        aclient = self._async_client()
+        if aclient is None:
+            logger.warning("No async LLM client — returning empty dict")
+            return {}, 0
+        if self.provider not in _API_KEY_ENV:
             return {}, 0
 
+        for attempt in range(_RETRY_ATTEMPTS):
+            try:
+                resp = await self._request(aclient, system, user)
+                return self._cache_store(key, self._handle_response(resp, stats))
+            except Exception as e:
+                delay = _retry_delay(e, attempt)
+                if delay is None:
+                    logger.error(f"LLM call failed: {e}")
+                    return {}, 0
+                await asyncio.sleep(delay)
+        return {}, 0
+
+    async def acomplete_json_stream(
+        self,
+        system: PromptContent,
+        user: PromptContent,
+        stats: Optional[LLMCallStats] = None,
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """
+        Stream the LLM response, yielding (key, value) per top-level field.
+
+        Fields are yielded as soon as their value closes in the token
+        stream. Usage is added to `stats` once the stream ends. Yields
+        nothing on failure before the first field (caller sees an empty
+        result, as with acomplete_json). A failure after fields were
+        yielded, or a stream that ends before the object closes, raises
+        LLMStreamInterrupted — the fields seen so far are not a result,
+        and nothing is cached.
+        """
+        key, cached = self._cache_lookup(system, user)
+        if cached is not None:
+            for item in cached.items():
+                yield item
+            return
+
+        aclient = self._async_client()
+        if aclient is None:
+            logger.warning("No async LLM client — returning empty dict")
+            return
+
+        fields: dict = {}
+        tokens = 0
+        for attempt in range(_RETRY_ATTEMPTS):
+            parser = TopLevelJSONStream()
+            try:
+                if self.provider == "openai":
+                    stream = await aclient.chat.completions.create(
+                        **self._openai_kwargs(system, user),
+                        stream=True,
+                        stream_options={"include_usage": True},
+                    )
+                    async for chunk in stream:
+                        if chunk.usage:
+                            tokens = chunk.usage.total_tokens
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            for field in parser.feed(chunk.choices[0].delta.content):
+                                fields[field[0]] = field[1]
+                                yield field
+                elif self.provider == "anthropic":
+                    async with aclient.messages.stream(**self._anthropic_kwargs(system, user)) as stream:
+                        async for text in stream.text_stream:
+                            for field in parser.feed(text):
+                                fields[field[0]] = field[1]
+                                yield field
+                        final = await stream.get_final_message()
+                        tokens = final.usage.input_tokens + final.usage.output_tokens
+                else:
+                    return
+                break
+            except Exception as e:
+                # Fields already yielded can't be taken back — only retry clean starts
+                if fields:
+                    logger.error(f"LLM stream failed after {len(fields)} fields: {e}")
+                    raise LLMStreamInterrupted(str(e)) from e
+                delay = _retry_delay(e, attempt)
+                if delay is None:
+                    logger.error(f"LLM stream failed: {e}")
+                    return
+                await asyncio.sleep(delay)
+
+        if fields and not parser.done:
+            raise LLMStreamInterrupted("stream ended before the JSON object closed")
+
+        if stats:
+            stats.calls += 1
+            stats.tokens_used += tokens
+        self._cache_store(key, (fields, tokens))
+
+    async def acomplete_many_json(
+        self,
+        prompts: list[tuple[PromptContent, PromptContent]],
+        stats: Optional[LLMCallStats] = None,
+        max_concurrent: Optional[int] = None,
+    ) -> list[tuple[dict, int]]:
+        """
+        Send several independent (system, user) prompts concurrently.
+
+        All requests go out over the same async client (one connection
+        pool), so they share keep-alive connections instead of paying a
+        handshake each. Results keep the order of `prompts`; a failed
+        prompt yields ({}, 0) like complete_json.
+
+        Args:
+            prompts: list of (system, user) pairs.
+            stats: accumulates calls/tokens across all prompts.
+            max_concurrent: cap on in-flight requests (None = no cap).
+        """
+        if max_concurrent is None:
+            return list(await asyncio.gather(
+                *(self.acomplete_json(system, user, stats) for system, user in prompts)
+            ))
+
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        async def bounded(system: PromptContent, user: PromptContent) -> tuple[dict, int]:
+            async with semaphore:
+                return await self.acomplete_json(system, user, stats)
+
+        return list(await asyncio.gather(*(bounded(s, u) for s, u in prompts)))
+
+    def complete_many_json(
+        self,
+        prompts: list[tuple[PromptContent, PromptContent]],
+        stats: Optional[LLMCallStats] = None,
+        max_concurrent: Optional[int] = None,
+    ) -> list[tuple[dict, int]]:
+        """Blocking wrapper around acomplete_many_json for sync callers."""
+        return run_sync(self.acomplete_many_json(prompts, stats, max_concurrent))
+
 
 class BaseAgent(ABC):
     """
@@ -151,28 +611,48 @@ class BaseAgent(ABC):
         self,
         llm_client: Optional[AgentLLMClient] = None,
         model: str = "gpt-4o-mini",
+        cache: Optional[MutableMapping] = None,
+        cache_size: int = _AGENT_CACHE_SIZE,
     ):
+        """
+        Args:
+            llm_client: Client to use; a default AgentLLMClient(model) if None.
+            model: Model for the default client.
+            cache: Mapping for parsed results (e.g. a shared LRUCache or a
+                   SQLiteCache). Defaults to a private LRUCache(cache_size).
+            cache_size: Size of the default cache; 0 disables caching.
+        """
         self._llm = llm_client or AgentLLMClient(model=model)
+        if cache is None and cache_size > 0:
+            cache = LRUCache(cache_size)
+        self._cache = cache
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
-    @property
-    @abstractmethod
-    def name(self) -> str:
-        """Unique agent identifier."""
-        ...
+    # Subclasses set these as plain class attributes, so agent metadata is
+    # readable without instantiation and costs no descriptor call per access.
+    name: ClassVar[str]          # Unique agent identifier
+    description: ClassVar[str]   # What this agent does
+    version: ClassVar[str] = "1"  # Bump when prompts or parsing change (invalidates engine memo)
+
+    def __init_subclass__(cls, abstract: bool = False, **kwargs):
+        """Require concrete agents to declare `name` and `description`."""
+        super().__init_subclass__(**kwargs)
+        if abstract:
+            return
+        for attr in ("name", "description"):
+            if not isinstance(getattr(cls, attr, None), str):
+                raise TypeError(f"{cls.__name__} must define class attribute {attr!r} (str)")
+        # Every StepResult/StepTrace of this agent references the one name
+        # object; interning also covers names built at runtime (f-strings)
+        cls.name = sys.intern(cls.name)
 
-    @property
     @abstractmethod
-    def description(self) -> str:
-        """What this agent does."""
-        ...
-
-    @abstractmethod
-    def _build_prompt(self, memory: WorkflowMemory) -> tuple[str, str]:
+    def _build_prompt(self, memory: WorkflowMemory) -> tuple[PromptContent, PromptContent]:
         """
         Build system and user prompts from memory.
 
-        Returns (system_prompt, user_prompt).
+        Returns (system_prompt, user_prompt). Either may be a plain string
+        or a list of content blocks (see cached_system).
         """
         ...
 
@@ -185,6 +665,29 @@ class BaseAgent(ABC):
         """
         ...
 
+    def prefetch(self, memory: WorkflowMemory) -> None:
+        """
+        Start I/O this agent will need, before its step begins.
+
+        Called by the async engine (inside the running event loop) once
+        the previous wave has finished. Default: nothing. Agents that do
+        slow lookups override this to schedule them as asyncio tasks and
+        collect the result in _aprepare.
+        """
+
+    async def _aprepare(self, memory: WorkflowMemory) -> None:
+        """Await prefetched or async-only inputs before _build_prompt (aexecute only)."""
+
+    def _merge_output(self, output: dict, memory: WorkflowMemory) -> dict:
+        """
+        Combine the parsed output with earlier results from memory.
+
+        Default: output unchanged. Agents that refine a previous step's
+        result (e.g. a second drafting pass) override this to carry the
+        earlier sections into their own output.
+        """
+        return output
+
     def execute(self, step_id: str, memory: WorkflowMemory) -> StepResult:
         """
         Execute this agent and return a StepResult.
@@ -193,7 +696,7 @@ class BaseAgent(ABC):
         _build_prompt and _parse_output instead.
         """
         stats = LLMCallStats()
-        started_at = time.time()
+        started_ns = time.perf_counter_ns()
 
         self.logger.info(f"Executing {self.name} for step {step_id}")
 
@@ -201,46 +704,162 @@ class BaseAgent(ABC):
         try:
             system_prompt, user_prompt = self._build_prompt(memory)
         except Exception as e:
-            return self._fail(step_id, f"Prompt building failed: {e}", stats, started_at)
+            return self._fail(step_id, f"Prompt building failed: {e}", stats, started_ns)
+
+        key, cached = self._cache_lookup(system_prompt, user_prompt)
+        if cached is not None:
+            return self._complete(step_id, *cached, stats, started_ns, memory)
 
         # Call LLM
         raw_output, tokens = self._llm.complete_json(system_prompt, user_prompt, stats)
 
+        return self._finish(step_id, raw_output, stats, started_ns, memory, key)
+
+    async def aexecute(
+        self,
+        step_id: str,
+        memory: WorkflowMemory,
+        on_field: Optional[Callable[[str, Any], None]] = None,
+    ) -> StepResult:
+        """
+        Async counterpart of execute.
+
+        Awaits the LLM call instead of blocking the thread, so the engine
+        can run independent agents concurrently on one event loop.
+
+        If `on_field` is given, the response is streamed and
+        on_field(key, raw_value) fires as each top-level JSON field of the
+        raw LLM output completes — e.g. the drafter's "dos_fatos" can be
+        shown while "dos_pedidos" is still being generated. The returned
+        StepResult is the same as without streaming.
+        """
+        stats = LLMCallStats()
+        started_ns = time.perf_counter_ns()
+
+        self.logger.info(f"Executing {self.name} for step {step_id} (async)")
+
+        try:
+            await self._aprepare(memory)
+            system_prompt, user_prompt = self._build_prompt(memory)
+        except Exception as e:
+            return self._fail(step_id, f"Prompt building failed: {e}", stats, started_ns)
+
+        key, cached = self._cache_lookup(system_prompt, user_prompt)
+        if cached is not None:
+            if on_field is not None:
+                for field_key, value in cached[0].items():
+                    on_field(field_key, value)
+            return self._complete(step_id, *cached, stats, started_ns, memory)
+
+        if on_field is None:
+            raw_output, tokens = await self._llm.acomplete_json(system_prompt, user_prompt, stats)
+        else:
+            raw_output = {}
+            try:
+                async for field_key, value in self._llm.acomplete_json_stream(system_prompt, user_prompt, stats):
+                    raw_output[field_key] = value
+                    on_field(field_key, value)
+            except LLMStreamInterrupted as e:
+                # Partial output would parse into defaults — fail, don't cache
+                return self._fail(step_id, f"LLM stream interrupted: {e}", stats, started_ns)
+
+        return self._finish(step_id, raw_output, stats, started_ns, memory, key)
+
+    def _finish(
+        self,
+        step_id: str,
+        raw_output: dict,
+        stats: LLMCallStats,
+        started_ns: int,
+        memory: WorkflowMemory,
+        cache_key: Optional[str] = None,
+    ) -> StepResult:
+        """Validate the raw LLM output and build the final StepResult."""
         if not raw_output:
-            return self._fail(step_id, "LLM returned empty response", stats, started_at)
+            return self._fail(step_id, "LLM returned empty response", stats, started_ns)
 
         # Parse and validate
         try:
             output, confidence = self._parse_output(raw_output)
         except Exception as e:
-            return self._fail(step_id, f"Output parsing failed: {e}", stats, started_at)
+            return self._fail(step_id, f"Output parsing failed: {e}", stats, started_ns)
 
-        duration_ms = (time.time() - started_at) * 1000
+        self._cache_store(cache_key, output, confidence)
+        return self._complete(step_id, output, confidence, stats, started_ns, memory)
+
+    def _complete(
+        self,
+        step_id: str,
+        output: dict,
+        confidence: float,
+        stats: LLMCallStats,
+        started_ns: int,
+        memory: WorkflowMemory,
+    ) -> StepResult:
+        """Merge a parsed output with memory and build the COMPLETED StepResult."""
+        try:
+            output = self._merge_output(dict(output), memory)
+        except Exception as e:
+            return self._fail(step_id, f"Output parsing failed: {e}", stats, started_ns)
+
+        duration_ns = time.perf_counter_ns() - started_ns
 
         return StepResult(
             step_id=step_id,
             status=StepStatus.COMPLETED,
             output=output,
             confidence=confidence,
-            duration_ms=duration_ms,
+            duration_ms=duration_ns / 1_000_000,
+            duration_ns=duration_ns,
             llm_calls=stats.calls,
             tokens_used=stats.tokens_used,
             agent_name=self.name,
         )
 
+    def _cache_lookup(
+        self,
+        system: PromptContent,
+        user: PromptContent,
+    ) -> tuple[Optional[str], Optional[tuple[dict, float]]]:
+        """Return (key, (output, confidence)); both None when caching is disabled."""
+        if self._cache is None:
+            return None, None
+        model = getattr(self._llm, "model", "")
+        key = prompt_key(f"{self.name}|{model}", prompt_text(system), prompt_text(user))
+        try:
+            cached = self._cache.get(key)
+        except Exception as e:
+            self.logger.warning(f"Agent cache read failed: {e}")
+            return key, None
+        if cached is None:
+            return key, None
+        self.logger.debug(f"Agent cache hit ({key}) — skipping LLM call")
+        # A copy per hit: the output ends up in the run's memory and result
+        return key, (copy_data(cached[0]), cached[1])
+
+    def _cache_store(self, key: Optional[str], output: dict, confidence: float) -> None:
+        if key is None:
+            return
+        try:
+            self._cache[key] = (copy_data(output), confidence)
+        except Exception as e:
+            self.logger.warning(f"Agent cache write failed: {e}")
+
     def _fail(
         self,
         step_id: str,
         error: str,
         stats: LLMCallStats,
-        started_at: float,
+        started_ns: int,
     ) -> StepResult:
         self.logger.error(f"{self.name} failed: {error}")
+        duration_ns = time.perf_counter_ns() - started_ns
         return StepResult(
             step_id=step_id,
             status=StepStatus.FAILED,
             error=error,
-            duration_ms=(time.time() - started_at) * 1000,
+            duration_ms=duration_ns / 1_000_000,
+            duration_ns=duration_ns,
             llm_calls=stats.calls,
             tokens_used=stats.tokens_used,
             agent_name=self.name,
@@ -35,34 +35,28 @@ Urgency rules encoded in the prompt:
 """
 from __future__ import annotations
 
-from src.agents.base_agent import BaseAgent
+from src.agents.base_agent import BaseAgent, cached_system
 from src.utils.workflow_models import WorkflowMemory
 
-VALID_AREAS = {
+VALID_AREAS = frozenset({
     "trabalhista", "civil", "penal", "tributario",
     "administrativo", "consumidor", "previdenciario", "familiar", "outros"
-}
-VALID_URGENCIAS = {"urgente", "media", "baixa"}
-VALID_COMPLEXIDADES = {"simples", "medio", "complexo"}
-VALID_PROCEDIMENTOS = {
+})
+VALID_URGENCIAS = frozenset({"urgente", "media", "baixa"})
+VALID_COMPLEXIDADES = frozenset({"simples", "medio", "complexo"})
+VALID_PROCEDIMENTOS = frozenset({
     "rito_sumario", "rito_sumarissimo", "rito_ordinario",
     "especial", "habeas_corpus", "mandado_seguranca", "a_definir"
-}
+})
 
+# Identity maps: one .get() both validates a value and supplies the default
+_AREAS = {v: v for v in VALID_AREAS}
+_URGENCIAS = {v: v for v in VALID_URGENCIAS}
+_COMPLEXIDADES = {v: v for v in VALID_COMPLEXIDADES}
+_PROCEDIMENTOS = {v: v for v in VALID_PROCEDIMENTOS}
 
-class ClassifierAgent(BaseAgent):
-    """Classifies legal case type, urgency, and procedural route."""
 
-    @property
-    def name(self) -> str:
-        return "ClassifierAgent"
-
-    @property
-    def description(self) -> str:
-        return "Classifica área, subárea, urgência e complexidade do caso jurídico."
-
-    def _build_prompt(self, memory: WorkflowMemory) -> tuple[str, str]:
-        system = """\
+CLASSIFIER_SYSTEM_PROMPT = """\
 Você é um especialista em triagem jurídica brasileira. Analise o caso e classifique-o.
 
 Retorne JSON com exatamente este schema:
@@ -92,43 +86,47 @@ Regras de complexidade:
 - MÉDIO: múltiplos pedidos OU fatos com divergência jurisprudencial
 - COMPLEXO: fatos muito específicos, pluralidade de partes, tese inédita
 """
-        caso = memory.get("caso", "")
-        cliente = memory.get("cliente", "")
-        parte_contraria = memory.get("parte_contraria", "")
-        informacoes_adicionais = memory.get("informacoes_adicionais", "")
 
-        user = f"""CASO:
+CLASSIFIER_USER_TEMPLATE = """CASO:
 {caso}
 
-CLIENTE: {cliente or 'não informado'}
-PARTE CONTRÁRIA: {parte_contraria or 'não informada'}
-INFORMAÇÕES ADICIONAIS: {informacoes_adicionais or 'nenhuma'}
+CLIENTE: {cliente}
+PARTE CONTRÁRIA: {parte_contraria}
+INFORMAÇÕES ADICIONAIS: {informacoes_adicionais}
 
 Classifique este caso."""
 
-        return system, user
+
+class ClassifierAgent(BaseAgent):
+    """Classifies legal case type, urgency, and procedural route."""
+
+    name = "ClassifierAgent"
+    description = "Classifica área, subárea, urgência e complexidade do caso jurídico."
+
+    def _build_prompt(self, memory: WorkflowMemory) -> tuple[list[dict], str]:
+        m = memory.view()
+        user = CLASSIFIER_USER_TEMPLATE.format_map({
+            "caso": m.get("caso", ""),
+            "cliente": m.get("cliente", "") or "não informado",
+            "parte_contraria": m.get("parte_contraria", "") or "não informada",
+            "informacoes_adicionais": m.get("informacoes_adicionais", "") or "nenhuma",
+        })
+
+        return cached_system(CLASSIFIER_SYSTEM_PROMPT), user
 
     def _parse_output(self, raw: dict) -> tuple[dict, float]:
         confidence = float(raw.get("confidence", 0.7))
         confidence = max(0.0, min(1.0, confidence))
 
-        # Validate and normalize
-        area = raw.get("area", "outros")
-        if area not in VALID_AREAS:
+        # Validate and normalize (invalid values fall back to the default)
+        area = _AREAS.get(raw.get("area", "outros"))
+        if area is None:
             area = "outros"
             confidence *= 0.7
 
-        urgencia = raw.get("urgencia", "media")
-        if urgencia not in VALID_URGENCIAS:
-            urgencia = "media"
-
-        complexidade = raw.get("complexidade", "medio")
-        if complexidade not in VALID_COMPLEXIDADES:
-            complexidade = "medio"
-
-        procedimento = raw.get("procedimento", "a_definir")
-        if procedimento not in VALID_PROCEDIMENTOS:
-            procedimento = "a_definir"
+        urgencia = _URGENCIAS.get(raw.get("urgencia"), "media")
+        complexidade = _COMPLEXIDADES.get(raw.get("complexidade"), "medio")
+        procedimento = _PROCEDIMENTOS.get(raw.get("procedimento"), "a_definir")
 
         output = {
             "area": area,
@@ -24,8 +24,18 @@ Design choice: two-pass drafting.
 
 Two passes avoid the common problem of pedidos that don't match
 the direito section (the model forgets what it argued).
-In this implementation we do a single-pass for brevity,
-but the two-pass approach is documented for production use.
+DrafterAgent does a single pass for brevity.
+
+Split drafting (DrafterFatosAgent → DrafterDireitoAgent):
+  Qualificação and dos fatos only need the classification and the case,
+  so DrafterFatosAgent can start as soon as classification is done —
+  in parallel with research. DrafterDireitoAgent then receives the
+  drafted fatos (written to memory as 'minuta_fatos') together with
+  research and analysis, writes the remaining sections without
+  re-generating the fatos, and emits the same 'minuta' contract.
+  If the fatos pass failed or came back empty, DrafterDireitoAgent
+  falls back to the single-pass DrafterAgent prompt and output, so the
+  minuta still gets the case, the parties and its fatos.
 
 Output contract (written to memory as 'minuta'):
   {
@@ -41,47 +51,15 @@ Output contract (written to memory as 'minuta'):
 """
 from __future__ import annotations
 
-from src.agents.base_agent import BaseAgent
+from src.agents.base_agent import BaseAgent, cached_system
+from src.utils.prompt_compress import clip_by_tokens, dedupe_ordered
+from src.utils.prompt_utils import bulletize, joined, numbered
 from src.utils.workflow_models import WorkflowMemory
 
+CASO_MAX_TOKENS = 500  # ≈ 2000 characters of case text
 
-class DrafterAgent(BaseAgent):
-    """Drafts legal briefs (petições, recursos) based on research and analysis."""
-
-    @property
-    def name(self) -> str:
-        return "DrafterAgent"
-
-    @property
-    def description(self) -> str:
-        return "Redige a minuta da peça processual com base na pesquisa e análise."
-
-    def _build_prompt(self, memory: WorkflowMemory) -> tuple[str, str]:
-        classification = memory.get("classification", {})
-        pesquisa = memory.get("pesquisa", {})
-        analise = memory.get("analise", {})
-        caso = memory.get("caso", "")
-        cliente = memory.get("cliente", "")
-        parte_contraria = memory.get("parte_contraria", "")
-
-        area = classification.get("area", "")
-        procedimento = classification.get("procedimento", "rito_ordinario")
-        partes = classification.get("partes", {})
-        fatos = classification.get("fatos_principais", [])
-
-        pedidos = analise.get("pedidos_sugeridos", [])
-        estrategia = analise.get("estrategia", "")
-        valor_causa = analise.get("valor_causa_estimado", "a ser arbitrado pelo juízo")
-
-        legislacao = pesquisa.get("legislacao_principal", [])
-        sumulas = pesquisa.get("sumulas", [])
-        fund_favor = pesquisa.get("fundamentos_favor", [])
-        observacoes_pesquisa = pesquisa.get("observacoes", "")
 
-        requerente = partes.get("requerente") or cliente or "REQUERENTE"
-        requerido = partes.get("requerido") or parte_contraria or "REQUERIDO"
-
-        system = """\
+DRAFTER_SYSTEM_PROMPT = """\
 Você é um advogado experiente especializado em redação processual brasileira.
 Redija a peça processual seguindo o padrão forense brasileiro.
 
@@ -119,43 +97,181 @@ INSTRUÇÕES PARA DOS PEDIDOS:
 - Inclua condenação em honorários e custas
 - Requeira produção de provas
 """
-        user = f"""ÁREA: {area}
+
+DRAFTER_USER_TEMPLATE = """ÁREA: {area}
 PROCEDIMENTO: {procedimento}
 REQUERENTE: {requerente}
 REQUERIDO: {requerido}
 
 FATOS DO CASO:
-{caso[:2000]}
+{caso}
 
-FATOS PRINCIPAIS IDENTIFICADOS: {', '.join(fatos)}
+FATOS PRINCIPAIS IDENTIFICADOS: {fatos}
 
 ESTRATÉGIA PROCESSUAL: {estrategia}
 
-LEGISLAÇÃO APLICÁVEL: {', '.join(legislacao[:8])}
-SÚMULAS: {', '.join(sumulas[:5])}
+LEGISLAÇÃO APLICÁVEL: {legislacao}
+SÚMULAS: {sumulas}
 
 FUNDAMENTOS FAVORÁVEIS:
-{chr(10).join('- ' + f for f in fund_favor[:5])}
+{fund_favor}
 
 PEDIDOS SUGERIDOS:
-{chr(10).join(f'{i+1}. {p}' for i, p in enumerate(pedidos))}
+{pedidos}
 
 VALOR DA CAUSA: {valor_causa}
-{('OBSERVAÇÕES: ' + observacoes_pesquisa) if observacoes_pesquisa else ''}
+{observacoes}
 
 Redija a peça processual."""
 
-        return system, user
 
-    def _parse_output(self, raw: dict) -> tuple[dict, float]:
-        confidence = float(raw.get("confidence", 0.75))
-        confidence = max(0.0, min(1.0, confidence))
+DRAFTER_FATOS_SYSTEM_PROMPT = """\
+Você é um advogado experiente especializado em redação processual brasileira.
+Redija a qualificação das partes e a seção DOS FATOS da peça processual.
+
+LINGUAGEM: formal, técnica, em português do Brasil
+TOM: objetivo, fundamentado, sem exageros
+
+Retorne JSON com este schema:
+{
+  "qualificacao": "texto de qualificação das partes",
+  "dos_fatos": "narrativa dos fatos (mínimo 3 parágrafos)",
+  "confidence": 0.0
+}
+
+INSTRUÇÕES PARA DOS FATOS:
+- Narrativa cronológica dos fatos
+- Linguagem objetiva, sem adjetivos desnecessários
+- Destaque fatos que fundamentam os pedidos
+"""
+
+DRAFTER_FATOS_USER_TEMPLATE = """ÁREA: {area}
+REQUERENTE: {requerente}
+REQUERIDO: {requerido}
 
+FATOS DO CASO:
+{caso}
+
+FATOS PRINCIPAIS IDENTIFICADOS: {fatos}
+
+Redija a qualificação e os fatos."""
+
+DRAFTER_DIREITO_SYSTEM_PROMPT = """\
+Você é um advogado experiente especializado em redação processual brasileira.
+A qualificação e a seção DOS FATOS já foram redigidas. Redija as demais
+seções da peça processual, coerentes com os fatos apresentados.
+
+LINGUAGEM: formal, técnica, em português do Brasil
+FORMATO: cada seção separada, citações em negrito implícito
+TOM: objetivo, fundamentado, sem exageros
+
+Retorne JSON com este schema:
+{
+  "do_direito": "argumentação jurídica com citações (mínimo 4 parágrafos)",
+  "dos_pedidos": "pedidos numerados em formato processual",
+  "valor_causa": "R$ X.XXX,00",
+  "tipo_peca": "peticao_inicial|recurso_ordinario|contestacao|recurso_de_revista|etc.",
+  "juizo_competente": "Juízo ou Tribunal competente",
+  "observacoes_redacao": "notas sobre pontos que merecem atenção do revisor",
+  "confidence": 0.0
+}
+
+INSTRUÇÕES PARA DO DIREITO:
+- Cite artigos de lei com número e legislação
+- Cite súmulas com número e tribunal
+- Conecte cada fundamento a um pedido específico
+- Refute previsíveis argumentos contrários
+
+INSTRUÇÕES PARA DOS PEDIDOS:
+- Pedido principal em primeiro
+- Pedidos subsidiários numerados
+- Inclua condenação em honorários e custas
+- Requeira produção de provas
+"""
+
+DRAFTER_DIREITO_USER_TEMPLATE = """ÁREA: {area}
+PROCEDIMENTO: {procedimento}
+
+DOS FATOS (já redigido):
+{dos_fatos}
+
+ESTRATÉGIA PROCESSUAL: {estrategia}
+
+LEGISLAÇÃO APLICÁVEL: {legislacao}
+SÚMULAS: {sumulas}
+
+FUNDAMENTOS FAVORÁVEIS:
+{fund_favor}
+
+PEDIDOS SUGERIDOS:
+{pedidos}
+
+VALOR DA CAUSA: {valor_causa}
+{observacoes}
+
+Redija o direito e os pedidos."""
+
+
+def _partes(m, classification: dict) -> tuple[str, str]:
+    partes = classification.get("partes", {})
+    return (
+        partes.get("requerente") or m.get("cliente", "") or "REQUERENTE",
+        partes.get("requerido") or m.get("parte_contraria", "") or "REQUERIDO",
+    )
+
+
+def _direito_fields(pesquisa: dict, analise: dict) -> dict:
+    """Template fields shared by the single-pass and the direito drafters."""
+    observacoes_pesquisa = pesquisa.get("observacoes", "")
+    legislacao = dedupe_ordered(pesquisa.get("legislacao_principal", []))
+    return {
+        "estrategia": analise.get("estrategia", ""),
+        "legislacao": joined(legislacao, 8),
+        "sumulas": joined(dedupe_ordered(pesquisa.get("sumulas", []), exclude=legislacao), 5),
+        "fund_favor": bulletize(dedupe_ordered(pesquisa.get("fundamentos_favor", [])), 5),
+        "pedidos": numbered(dedupe_ordered(analise.get("pedidos_sugeridos", []))),
+        "valor_causa": analise.get("valor_causa_estimado", "a ser arbitrado pelo juízo"),
+        "observacoes": f"OBSERVAÇÕES: {observacoes_pesquisa}" if observacoes_pesquisa else "",
+    }
+
+
+def _confidence(raw: dict, default: float, required_sections: tuple[str, ...]) -> float:
+    confidence = float(raw.get("confidence", default))
+    confidence = max(0.0, min(1.0, confidence))
+    for section in required_sections:
+        if not raw.get(section, "").strip():
+            confidence *= 0.5  # Penalize missing sections
+    return confidence
+
+
+class DrafterAgent(BaseAgent):
+    """Drafts legal briefs (petições, recursos) based on research and analysis."""
+
+    name = "DrafterAgent"
+    description = "Redige a minuta da peça processual com base na pesquisa e análise."
+
+    def _build_prompt(self, memory: WorkflowMemory) -> tuple[list[dict], str]:
+        m = memory.view()
+        classification = m.get("classification", {})
+        pesquisa = m.get("pesquisa", {})
+        analise = m.get("analise", {})
+        requerente, requerido = _partes(m, classification)
+
+        user = DRAFTER_USER_TEMPLATE.format_map({
+            "area": classification.get("area", ""),
+            "procedimento": classification.get("procedimento", "rito_ordinario"),
+            "requerente": requerente,
+            "requerido": requerido,
+            "caso": clip_by_tokens(m.get("caso", ""), CASO_MAX_TOKENS),
+            "fatos": joined(dedupe_ordered(classification.get("fatos_principais", []))),
+            **_direito_fields(pesquisa, analise),
+        })
+
+        return cached_system(DRAFTER_SYSTEM_PROMPT), user
+
+    def _parse_output(self, raw: dict) -> tuple[dict, float]:
         # Validate that major sections are present and non-empty
-        required_sections = ["dos_fatos", "do_direito", "dos_pedidos"]
-        for section in required_sections:
-            if not raw.get(section, "").strip():
-                confidence *= 0.5  # Penalize missing sections
+        confidence = _confidence(raw, 0.75, ("dos_fatos", "do_direito", "dos_pedidos"))
 
         output = {
             "qualificacao": raw.get("qualificacao", ""),
@@ -169,3 +285,80 @@ Redija a peça processual."""
         }
 
         return output, confidence
+
+
+class DrafterFatosAgent(BaseAgent):
+    """First drafting pass: qualificação and dos fatos, from classification only."""
+
+    name = "DrafterFatosAgent"
+    description = "Redige a qualificação e os fatos da peça a partir da classificação."
+
+    def _build_prompt(self, memory: WorkflowMemory) -> tuple[list[dict], str]:
+        m = memory.view()
+        classification = m.get("classification", {})
+        requerente, requerido = _partes(m, classification)
+
+        user = DRAFTER_FATOS_USER_TEMPLATE.format_map({
+            "area": classification.get("area", ""),
+            "requerente": requerente,
+            "requerido": requerido,
+            "caso": clip_by_tokens(m.get("caso", ""), CASO_MAX_TOKENS),
+            "fatos": joined(dedupe_ordered(classification.get("fatos_principais", []))),
+        })
+
+        return cached_system(DRAFTER_FATOS_SYSTEM_PROMPT), user
+
+    def _parse_output(self, raw: dict) -> tuple[dict, float]:
+        output = {
+            "qualificacao": raw.get("qualificacao", ""),
+            "dos_fatos": raw.get("dos_fatos", ""),
+        }
+        return output, _confidence(raw, 0.75, ("dos_fatos",))
+
+
+def _fatos_drafted(memory) -> bool:
+    return bool(memory.get("minuta_fatos", {}).get("dos_fatos", "").strip())
+
+
+class DrafterDireitoAgent(DrafterAgent):
+    """Second drafting pass: direito and pedidos on top of 'minuta_fatos'."""
+
+    name = "DrafterDireitoAgent"
+    description = "Completa a minuta (direito e pedidos) sobre os fatos já redigidos."
+
+    def _build_prompt(self, memory: WorkflowMemory) -> tuple[list[dict], str]:
+        if not _fatos_drafted(memory):
+            return super()._build_prompt(memory)  # single pass: fatos included
+        m = memory.view()
+        classification = m.get("classification", {})
+
+        user = DRAFTER_DIREITO_USER_TEMPLATE.format_map({
+            "area": classification.get("area", ""),
+            "procedimento": classification.get("procedimento", "rito_ordinario"),
+            "dos_fatos": m.get("minuta_fatos", {}).get("dos_fatos", ""),
+            **_direito_fields(m.get("pesquisa", {}), m.get("analise", {})),
+        })
+
+        return cached_system(DRAFTER_DIREITO_SYSTEM_PROMPT), user
+
+    def _parse_output(self, raw: dict) -> tuple[dict, float]:
+        if "dos_fatos" in raw:  # answer to the single-pass prompt
+            return super()._parse_output(raw)
+        output = {
+            "do_direito": raw.get("do_direito", ""),
+            "dos_pedidos": raw.get("dos_pedidos", ""),
+            "valor_causa": raw.get("valor_causa", ""),
+            "tipo_peca": raw.get("tipo_peca", "peticao_inicial"),
+            "juizo_competente": raw.get("juizo_competente", ""),
+            "observacoes_redacao": raw.get("observacoes_redacao", ""),
+        }
+        return output, _confidence(raw, 0.75, ("do_direito", "dos_pedidos"))
+
+    def _merge_output(self, output: dict, memory: WorkflowMemory) -> dict:
+        # Same 'minuta' contract as DrafterAgent: fatos come from pass 1
+        merged = {"qualificacao": "", "dos_fatos": "", **output}
+        if _fatos_drafted(memory):
+            fatos = memory.get("minuta_fatos")
+            merged["qualificacao"] = fatos.get("qualificacao", "")
+            merged["dos_fatos"] = fatos["dos_fatos"]
+        return merged
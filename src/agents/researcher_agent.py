@@ -18,6 +18,13 @@ For production, extend this agent to call a real retrieval system:
   - Call it with the case subarea and key terms
   - Append results to the context before the LLM call
 
+Async retrieval:
+  With `retrieval_fn_async`, the async engine calls prefetch() as soon as
+  the classification is in memory, so the lookup runs while the previous
+  wave's bookkeeping and the other steps of this wave proceed. aexecute()
+  awaits the task; without prefetch it awaits the lookup directly. The
+  sync path (execute) keeps calling `retrieval_fn`.
+
 Output contract (written to memory as 'pesquisa'):
   {
     "legislacao_principal": ["art. 483 CLT", "art. 7° CF/88"],
@@ -32,50 +39,13 @@ Output contract (written to memory as 'pesquisa'):
 """
 from __future__ import annotations
 
-from typing import Optional, Callable
-from src.agents.base_agent import BaseAgent
+import asyncio
+from typing import Awaitable, Optional, Callable
+from src.agents.base_agent import BaseAgent, cached_system
 from src.utils.workflow_models import WorkflowMemory
 
 
-class ResearcherAgent(BaseAgent):
-    """Researches applicable law, súmulas, and jurisprudence for the case."""
-
-    def __init__(self, retrieval_fn: Optional[Callable] = None, **kwargs):
-        """
-        Args:
-            retrieval_fn: Optional callable(query: str) -> list[str].
-                          If provided, called before LLM to add real retrieved docs.
-        """
-        super().__init__(**kwargs)
-        self._retrieval_fn = retrieval_fn
-
-    @property
-    def name(self) -> str:
-        return "ResearcherAgent"
-
-    @property
-    def description(self) -> str:
-        return "Pesquisa legislação, súmulas e jurisprudência aplicável ao caso."
-
-    def _build_prompt(self, memory: WorkflowMemory) -> tuple[str, str]:
-        classification = memory.get("classification", {})
-        area = classification.get("area", "desconhecida")
-        subarea = classification.get("subarea", "")
-        fatos = classification.get("fatos_principais", [])
-        caso = memory.get("caso", "")
-
-        # Optionally enrich with retrieved documents
-        retrieved_context = ""
-        if self._retrieval_fn:
-            query = f"{area} {subarea} {' '.join(fatos[:3])}"
-            try:
-                docs = self._retrieval_fn(query)
-                if docs:
-                    retrieved_context = "\n\nDOCUMENTOS RECUPERADOS:\n" + "\n---\n".join(docs[:5])
-            except Exception as e:
-                self.logger.warning(f"Retrieval failed: {e}")
-
-        system = """\
+RESEARCHER_SYSTEM_PROMPT = """\
 Você é um especialista em pesquisa jurídica brasileira. Identifique os fundamentos legais aplicáveis.
 
 Retorne JSON com este schema:
@@ -97,22 +67,118 @@ REGRAS:
 - jurisprudencia_dominante: avalie a tendência predominante dos tribunais
 - confidence: sua confiança na pesquisa (considere se a subárea é bem definida)
 """
-        user = f"""ÁREA: {area}
+
+RESEARCHER_USER_TEMPLATE = """ÁREA: {area}
 SUBÁREA: {subarea}
-FATOS PRINCIPAIS: {', '.join(fatos) if fatos else caso[:500]}
-CASO COMPLETO: {caso[:1000]}
+FATOS PRINCIPAIS: {fatos}
+CASO COMPLETO: {caso}
 {retrieved_context}
 
 Pesquise os fundamentos legais aplicáveis."""
 
-        return system, user
+VALID_JURISPRUDENCIA = frozenset({"favoravel", "desfavoravel", "controvertida"})
+
+# WorkflowMemory.scratch keys: pending task, then its documents
+_RETRIEVAL_TASK = "research_retrieval_task"
+_RETRIEVAL_DOCS = "research_retrieval_docs"
+
+
+class ResearcherAgent(BaseAgent):
+    """Researches applicable law, súmulas, and jurisprudence for the case."""
+
+    name = "ResearcherAgent"
+    description = "Pesquisa legislação, súmulas e jurisprudência aplicável ao caso."
+
+    def __init__(
+        self,
+        retrieval_fn: Optional[Callable] = None,
+        retrieval_fn_async: Optional[Callable[[str], Awaitable[list[str]]]] = None,
+        **kwargs,
+    ):
+        """
+        Args:
+            retrieval_fn: Optional callable(query: str) -> list[str].
+                          If provided, called before LLM to add real retrieved docs.
+            retrieval_fn_async: Optional async callable(query: str) -> list[str],
+                          used by aexecute() and started early by prefetch().
+        """
+        super().__init__(**kwargs)
+        self._retrieval_fn = retrieval_fn
+        self._retrieval_fn_async = retrieval_fn_async
+
+    @staticmethod
+    def _query(classification: dict) -> str:
+        area = classification.get("area", "desconhecida")
+        subarea = classification.get("subarea", "")
+        fatos = classification.get("fatos_principais", [])
+        return f"{area} {subarea} {' '.join(fatos[:3])}"
+
+    def prefetch(self, memory: WorkflowMemory) -> None:
+        """Start async retrieval once the classification is available."""
+        if self._retrieval_fn_async is None or _RETRIEVAL_TASK in memory.scratch:
+            return
+        classification = memory.get("classification")
+        if not classification:
+            return
+        memory.scratch[_RETRIEVAL_TASK] = asyncio.ensure_future(
+            self._retrieval_fn_async(self._query(classification))
+        )
+
+    async def _aprepare(self, memory: WorkflowMemory) -> None:
+        if self._retrieval_fn_async is None:
+            return
+        task = memory.scratch.pop(_RETRIEVAL_TASK, None)
+        try:
+            if task is None:
+                docs = await self._retrieval_fn_async(self._query(memory.get("classification", {})))
+            else:
+                docs = await task
+        except Exception as e:
+            self.logger.warning(f"Retrieval failed: {e}")
+            docs = []
+        memory.scratch[_RETRIEVAL_DOCS] = docs
+
+    def _retrieve(self, query: str, memory: WorkflowMemory) -> list[str]:
+        """Documents awaited by _aprepare, else a blocking retrieval_fn call."""
+        if _RETRIEVAL_DOCS in memory.scratch:
+            return memory.scratch.pop(_RETRIEVAL_DOCS)
+        if not self._retrieval_fn:
+            return []
+        try:
+            return self._retrieval_fn(query)
+        except Exception as e:
+            self.logger.warning(f"Retrieval failed: {e}")
+            return []
+
+    def _build_prompt(self, memory: WorkflowMemory) -> tuple[list[dict], str]:
+        classification = memory.get("classification", {})
+        area = classification.get("area", "desconhecida")
+        subarea = classification.get("subarea", "")
+        fatos = classification.get("fatos_principais", [])
+        caso = memory.get("caso", "")
+
+        # Optionally enrich with retrieved documents
+        retrieved_context = ""
+        docs = self._retrieve(self._query(classification), memory)
+        if docs:
+            retrieved_context = "\n\nDOCUMENTOS RECUPERADOS:\n" + "\n---\n".join(docs[:5])
+
+        user = RESEARCHER_USER_TEMPLATE.format_map({
+            "area": area,
+            "subarea": subarea,
+            "fatos": ", ".join(fatos) if fatos else caso[:500],
+            "caso": caso[:1000],
+            "retrieved_context": retrieved_context,
+        })
+
+        return cached_system(RESEARCHER_SYSTEM_PROMPT), user
 
     def _parse_output(self, raw: dict) -> tuple[dict, float]:
         confidence = float(raw.get("confidence", 0.7))
         confidence = max(0.0, min(1.0, confidence))
 
         jurisprudencia = raw.get("jurisprudencia_dominante", "controvertida")
-        if jurisprudencia not in ("favoravel", "desfavoravel", "controvertida"):
+        if jurisprudencia not in VALID_JURISPRUDENCIA:
             jurisprudencia = "controvertida"
 
         output = {
@@ -40,29 +40,24 @@ Routing rules (used by WorkflowEngine):
 """
 from __future__ import annotations
 
-from src.agents.base_agent import BaseAgent
+from src.agents.base_agent import BaseAgent, cached_system
+from src.utils import json_utils
 from src.utils.workflow_models import WorkflowMemory
 
+MINUTA_SECTIONS = ("qualificacao", "dos_fatos", "do_direito", "dos_pedidos", "valor_causa")
+VALID_RECOMENDACOES = frozenset({"aprovar", "revisar", "rejeitar"})
+VALID_SEVERIDADES = frozenset({"alta", "media", "baixa"})
 
-class ReviewerAgent(BaseAgent):
-    """Reviews drafted legal briefs for quality, consistency, and completeness."""
-
-    @property
-    def name(self) -> str:
-        return "ReviewerAgent"
-
-    @property
-    def description(self) -> str:
-        return "Revisa a minuta processual verificando consistência, citações e completude."
-
-    def _build_prompt(self, memory: WorkflowMemory) -> tuple[str, str]:
-        minuta = memory.get("minuta", {})
-        analise = memory.get("analise", {})
-        pesquisa = memory.get("pesquisa", {})
 
-        system = """\
+REVIEWER_SYSTEM_PROMPT = """\
 Você é um revisor jurídico experiente. Revise criticamente a peça processual a seguir.
 
+ENTRADA: um objeto JSON com as chaves
+  "qualificacao", "dos_fatos", "do_direito", "dos_pedidos", "valor_causa"
+    → as seções da peça a revisar ("(não informado)" se ausente)
+  "pedidos_sugeridos" → pedidos recomendados pela análise de mérito
+  "legislacao"        → legislação identificada na pesquisa
+
 Retorne JSON com este schema:
 {
   "aprovado": true,
@@ -113,33 +108,31 @@ RECOMENDAÇÃO:
   aprovado false + issues alta → "rejeitar"
   aprovado false + apenas issues media/baixa → "revisar"
 """
-        pedidos_analise = analise.get("pedidos_sugeridos", [])
-        legislacao = pesquisa.get("legislacao_principal", [])
-
-        user = f"""PEÇA A REVISAR:
-
-QUALIFICAÇÃO:
-{minuta.get('qualificacao', '(não informado)')}
 
-DOS FATOS:
-{minuta.get('dos_fatos', '(não informado)')}
 
-DO DIREITO:
-{minuta.get('do_direito', '(não informado)')}
+class ReviewerAgent(BaseAgent):
+    """Reviews drafted legal briefs for quality, consistency, and completeness."""
 
-DOS PEDIDOS:
-{minuta.get('dos_pedidos', '(não informado)')}
+    name = "ReviewerAgent"
+    description = "Revisa a minuta processual verificando consistência, citações e completude."
 
-VALOR DA CAUSA: {minuta.get('valor_causa', '(não informado)')}
+    def _build_prompt(self, memory: WorkflowMemory) -> tuple[list[dict], str]:
+        minuta = memory.get("minuta", {})
+        analise = memory.get("analise", {})
+        pesquisa = memory.get("pesquisa", {})
 
----
-CONTEXTO PARA REVISÃO:
-Pedidos sugeridos pela análise: {', '.join(pedidos_analise) if pedidos_analise else 'não disponível'}
-Legislação identificada na pesquisa: {', '.join(legislacao[:6]) if legislacao else 'não disponível'}
+        pedidos_analise = analise.get("pedidos_sugeridos", [])
+        legislacao = pesquisa.get("legislacao_principal", [])
 
-Revise a peça e produza o relatório de revisão."""
+        # Static instructions live in the system prompt (cacheable prefix);
+        # the user turn is only this case's content, in a fixed key order
+        user = json_utils.dumps({
+            **{section: minuta.get(section, "(não informado)") for section in MINUTA_SECTIONS},
+            "pedidos_sugeridos": pedidos_analise,
+            "legislacao": legislacao[:6],
+        })
 
-        return system, user
+        return cached_system(REVIEWER_SYSTEM_PROMPT), user
 
     def _parse_output(self, raw: dict) -> tuple[dict, float]:
         confidence = float(raw.get("confidence", 0.8))
@@ -152,16 +145,19 @@ Revise a peça e produza o relatório de revisão."""
 
         # Validate recomendacao
         recomendacao = raw.get("recomendacao", "revisar")
-        if recomendacao not in ("aprovar", "revisar", "rejeitar"):
+        if recomendacao not in VALID_RECOMENDACOES:
             recomendacao = "revisar"
 
-        # Normalize issues
+        # Normalize issues, noting high-severity ones in the same pass
         issues = []
+        has_alta = False
         for issue in raw.get("issues", []):
             if isinstance(issue, dict) and "descricao" in issue:
                 sev = issue.get("severidade", "baixa")
-                if sev not in ("alta", "media", "baixa"):
+                if sev not in VALID_SEVERIDADES:
                     sev = "baixa"
+                elif sev == "alta":
+                    has_alta = True
                 issues.append({
                     "tipo": issue.get("tipo", "geral"),
                     "descricao": issue["descricao"],
@@ -169,10 +165,12 @@ Revise a peça e produza o relatório de revisão."""
                 })
 
         # Consistency: if high-severity issues, force não aprovado
-        has_alta = any(i["severidade"] == "alta" for i in issues)
         if has_alta and aprovado:
             aprovado = False
             recomendacao = "rejeitar" if score < 0.6 else "revisar"
+        elif not aprovado and recomendacao == "aprovar":
+            # A rejected piece can't be recommended for approval
+            recomendacao = "rejeitar" if has_alta else "revisar"
 
         output = {
             "aprovado": aprovado,
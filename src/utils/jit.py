@@ -0,0 +1,55 @@
+"""
+JIT opt-in — Numba only where a helper is compute-bound.
+
+The orchestration code (engine, steps, models) is glue around network
+calls: a workflow spends seconds waiting on the LLM and microseconds in
+Python. Compiling any of it would add cold-start latency and buy nothing,
+so none of it is decorated.
+
+maybe_njit is the one place to opt in, for scalar or array helpers kept
+free of dicts and strings — today the analyst's probability/confidence
+normalization (analyst_agent._normalize_numeric):
+  - LWO_JIT unset or numba missing → the function is returned unchanged
+  - LWO_JIT=1 and numba installed  → numba.njit(cache=True)(fn)
+
+Compiled functions are built on their first call. Servers should call
+warmup() at startup with one sample call per helper so that cost never
+lands on a request; LWO_JIT_WARMUP=0 skips it.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import Any, Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numba
+except ImportError:  # pragma: no cover - numba is an optional dependency
+    numba = None
+
+JIT_ENABLED = numba is not None and os.environ.get("LWO_JIT", "") not in ("", "0")
+
+
+def maybe_njit(fn: Callable) -> Callable:
+    """numba.njit(cache=True)(fn) when JIT is enabled, else fn itself."""
+    if not JIT_ENABLED:
+        return fn
+    return numba.njit(cache=True)(fn)
+
+
+def warmup(calls: Iterable[tuple[Callable, tuple[Any, ...]]]) -> None:
+    """
+    Call each (fn, args) once to trigger compilation ahead of traffic.
+
+    No-op when JIT is disabled or LWO_JIT_WARMUP=0. Failures are logged,
+    not raised — a helper that fails to compile still runs when called.
+    """
+    if not JIT_ENABLED or os.environ.get("LWO_JIT_WARMUP", "1") == "0":
+        return
+    for fn, args in calls:
+        try:
+            fn(*args)
+        except Exception as e:
+            logger.warning(f"JIT warm-up of {getattr(fn, '__name__', fn)} failed: {e}")
@@ -0,0 +1,89 @@
+"""
+Incremental JSON Field Stream — Parse top-level fields while bytes arrive.
+
+Agents ask the LLM for a single flat-ish JSON object. When the response is
+streamed, each top-level field becomes usable as soon as its value closes,
+long before the full object is complete (e.g. the drafter's "dos_fatos"
+arrives seconds before "dos_pedidos").
+
+TopLevelJSONStream is a small character scanner — not a general JSON
+parser. It tracks string/escape state and nesting depth, cuts the buffer at
+each top-level ',' or closing '}', and json.loads just that field. Anything
+before the first '{' (e.g. a ```json fence) and after the closing '}' is
+ignored.
+
+Usage:
+  stream = TopLevelJSONStream()
+  for chunk in chunks:
+      for key, value in stream.feed(chunk):
+          ...
+"""
+from __future__ import annotations
+
+import json
+from typing import Any
+
+
+class TopLevelJSONStream:
+    """Emits (key, value) for each top-level field as soon as it is complete."""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0            # Next character to scan
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._field_start = -1   # Buffer index where the current field begins
+        self.done = False        # True once the top-level object closed
+
+    def feed(self, text: str) -> list[tuple[str, Any]]:
+        """Consume a chunk; return fields completed by it, in order."""
+        if self.done or not text:
+            return []
+        self._buf += text
+        fields: list[tuple[str, Any]] = []
+        buf = self._buf
+
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._field_start = i + 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buf[self._field_start:i], fields)
+                    self.done = True
+                    self._pos = i + 1
+                    return fields
+            elif ch == "," and self._depth == 1:
+                self._emit(buf[self._field_start:i], fields)
+                self._field_start = i + 1
+
+        self._pos = len(buf)
+        return fields
+
+    @staticmethod
+    def _emit(segment: str, fields: list[tuple[str, Any]]) -> None:
+        if not segment.strip():
+            return
+        try:
+            fields.extend(json.loads("{" + segment + "}").items())
+        except json.JSONDecodeError:
+            pass  # Malformed field — the final full parse decides
@@ -0,0 +1,52 @@
+"""
+JSON helpers — orjson when installed, stdlib json otherwise.
+
+LLM responses (the drafter's piece especially) and saved traces are the
+largest JSON documents this project handles. orjson parses and
+serializes them several times faster and writes UTF-8 bytes directly,
+so file output skips the separate encode step.
+
+For plain JSON data (str-keyed dicts, lists, str, numbers, bool, None)
+both backends produce the same documents: non-ASCII text is kept as-is
+(ensure_ascii=False) and pretty output uses a 2-space indent, the only
+indent orjson supports. Beyond that they differ: orjson also serializes
+dates, dataclasses, enums, UUIDs and non-str keys (OPT_NON_STR_KEYS),
+where stdlib json raises TypeError on all but enums and int keys.
+Neither round-trip is a faithful copy of such values.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None
+
+# True when the fast backend is active
+HAVE_ORJSON = orjson is not None
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse a JSON document from str or UTF-8 bytes."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumpb(obj: Any, pretty: bool = False) -> bytes:
+    """Serialize to UTF-8 bytes (2-space indent when pretty)."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option)
+    return dumps(obj, pretty).encode("utf-8")
+
+
+def dumps(obj: Any, pretty: bool = False) -> str:
+    """Serialize to str (2-space indent when pretty)."""
+    if orjson is not None:
+        return dumpb(obj, pretty).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, indent=2 if pretty else None)
@@ -0,0 +1,135 @@
+"""
+LLM Response Cache — Skip provider calls for prompts already answered.
+
+Agents call the LLM with temperature=0, so the same (model, system, user)
+triple yields the same JSON. AgentLLMClient accepts any MutableMapping as
+a cache; keys come from prompt_key() and values are the parsed JSON dicts.
+
+Key normalization:
+  Whitespace runs are collapsed before hashing, so prompts that differ
+  only in indentation or blank lines (common in case descriptions pasted
+  from different sources) share one entry.
+
+Backends:
+  - dict: in-process, lost at exit
+  - LRUCache: in-process and bounded, safe to share between threads
+  - SQLiteCache: persistent, stdlib only, safe to share between threads
+
+BaseAgent keeps its own LRUCache of parsed (output, confidence) pairs,
+keyed on the agent name as well, so a hit also skips _parse_output.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Iterator
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def prompt_key(model: str, system: str, user: str) -> str:
+    """Stable cache key for a prompt (blake2b over normalized text)."""
+    payload = "\x1f".join((model, _normalize(system), _normalize(user)))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class LRUCache(MutableMapping):
+    """
+    In-memory mapping that evicts the least recently used key past `maxsize`.
+
+    Reads count as use. All operations hold a lock, so one instance can
+    back agents running in several threads.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict[str, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key: str) -> Any:
+        with self._lock:
+            value = self._data[key]
+            self._data.move_to_end(key)
+            return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock:
+            del self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            return iter(list(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return f"LRUCache(maxsize={self.maxsize}, size={len(self)})"
+
+
+class SQLiteCache(MutableMapping):
+    """
+    Disk-backed str → dict mapping stored in a single SQLite table.
+
+    Values are stored as JSON text, so only JSON-serializable dicts
+    (which is all the LLM client ever caches) round-trip.
+    """
+
+    def __init__(self, path: str = ".llm_cache.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+    def __getitem__(self, key: str) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key: str, value: dict) -> None:
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value) VALUES (?, ?)", (key, encoded)
+            )
+
+    def __delitem__(self, key: str) -> None:
+        with self._lock, self._conn:
+            cur = self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        if cur.rowcount == 0:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            keys = [row[0] for row in self._conn.execute("SELECT key FROM llm_cache")]
+        return iter(keys)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __repr__(self) -> str:
+        return f"SQLiteCache(path={self.path!r})"
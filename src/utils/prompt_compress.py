@@ -0,0 +1,124 @@
+"""
+Prompt Compression — Keep agent prompts within a token budget.
+
+Tokens are the dominant cost and latency factor of every agent call, and
+prompt sections built from memory repeat themselves: the researcher often
+lists the same súmula twice, and fatos_principais may echo the legislação.
+
+Helpers:
+  dedupe_ordered  — drop repeated items, keep first-seen order
+  clip_by_tokens  — cut text to a token budget (BPE-accurate when
+                    `tiktoken` is installed, ~4 chars/token otherwise)
+  estimate_tokens — token count with the same fallback
+  static_tokens   — memoized count for fixed text (system prompts)
+  completion_budget — max_tokens that still fits the model's context
+
+tiktoken is optional; without it the heuristic keeps budgets equivalent to
+the character limits the agents used before (e.g. 375 tokens ≈ 1500 chars).
+"""
+from __future__ import annotations
+
+import functools
+import logging
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+CHARS_PER_TOKEN = 4  # Heuristic when tiktoken is unavailable
+DEFAULT_CONTEXT_TOKENS = 128_000
+CONTEXT_TOKENS = {
+    "gpt-4o-mini": 128_000,
+    "gpt-4o": 128_000,
+    "claude-3-5-sonnet-20241022": 200_000,
+    "claude-3-haiku-20240307": 200_000,
+}
+
+
+@functools.lru_cache(maxsize=8)
+def _encoding(model: str):
+    """tiktoken encoding for `model`, or None if tiktoken can't provide one."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+
+
+def estimate_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Number of tokens in `text` (exact with tiktoken, estimated otherwise)."""
+    enc = _encoding(model)
+    if enc is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(enc.encode(text))
+
+
+@functools.lru_cache(maxsize=64)
+def static_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """estimate_tokens for text that repeats across calls (encoded once)."""
+    return estimate_tokens(text, model)
+
+
+def completion_budget(
+    system: str,
+    user: str,
+    model: str = DEFAULT_MODEL,
+    cap: int = 2000,
+) -> int:
+    """
+    max_tokens for a completion: `cap`, reduced if the prompt leaves less
+    room than that in the model's context window.
+
+    The system prompt is static per agent, so its count is memoized;
+    only the user part is encoded per call.
+    """
+    limit = CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+    room = limit - static_tokens(system, model) - estimate_tokens(user, model)
+    return max(1, min(cap, room))
+
+
+def clip_by_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    """Return the longest prefix of `text` that fits in `max_tokens`."""
+    enc = _encoding(model)
+    if enc is None:
+        clipped = text[:max_tokens * CHARS_PER_TOKEN]
+    else:
+        tokens = enc.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        clipped = enc.decode(tokens[:max_tokens])
+
+    if len(clipped) < len(text):
+        logger.debug(
+            f"Clipped prompt text: ~{estimate_tokens(text, model)} → {max_tokens} tokens"
+        )
+    return clipped
+
+
+def dedupe_ordered(items: Iterable[str], exclude: Optional[Iterable[str]] = None) -> list[str]:
+    """
+    Remove duplicates (case/whitespace-insensitive), keeping first-seen order.
+
+    Items whose normalized form appears in `exclude` are dropped too, which
+    removes cross-section repeats (e.g. a súmula already cited as legislação).
+    """
+    seen = {_norm(x) for x in exclude} if exclude else set()
+    out = []
+    for item in items:
+        if not isinstance(item, str):
+            continue
+        key = _norm(item)
+        if key and key not in seen:
+            seen.add(key)
+            out.append(item)
+    return out
+
+
+def _norm(text: str) -> str:
+    return " ".join(text.split()).casefold()
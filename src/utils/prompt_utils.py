@@ -0,0 +1,32 @@
+"""
+Prompt Utilities — Small helpers shared by agent prompt builders.
+
+Agents keep their system prompts as module-level constants and fill a
+user template with str.format_map. The helpers here render the list
+slots of those templates (bullets, numbered pedidos) without building
+intermediate lists for every call.
+
+str.join materializes any iterable into a sequence before sizing the
+result, so the helpers hand it a list comprehension directly — one
+list, one output allocation — rather than a generator it would have to
+drain into a list first.
+"""
+from __future__ import annotations
+
+from itertools import islice
+from typing import Iterable, Optional
+
+
+def bulletize(items: Iterable[str], limit: Optional[int] = None) -> str:
+    """Render up to `limit` items as '- item' lines."""
+    return "\n".join([f"- {item}" for item in islice(items, limit)])
+
+
+def numbered(items: Iterable[str], limit: Optional[int] = None) -> str:
+    """Render up to `limit` items as '1. item' lines."""
+    return "\n".join([f"{i}. {item}" for i, item in enumerate(islice(items, limit), 1)])
+
+
+def joined(items: Iterable[str], limit: Optional[int] = None, sep: str = ", ") -> str:
+    """Join up to `limit` items with `sep`."""
+    return sep.join(islice(items, limit))
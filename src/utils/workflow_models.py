@@ -8,6 +8,8 @@ Design principles:
   3. Trace captures every decision for auditability
   4. StepResult carries both the output and execution metadata
      (duration, tokens, confidence) so the engine can make routing decisions
+  5. All models are slotted dataclasses (no per-instance __dict__): batch
+     runs create many results and traces, and attribute access is faster
 
 Step execution states:
   PENDING   → not yet executed
@@ -26,13 +28,54 @@ Workflow terminal states:
 """
 from __future__ import annotations
 
+import copy
+import pickle
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Any, Optional
-from datetime import datetime
-import json
+from types import MappingProxyType
+from collections.abc import Mapping
+from typing import Any, Iterator, Optional
+from datetime import datetime, timezone
+import threading
+import time
 import uuid
 
+from src.utils import json_utils
+
+
+_UTC = timezone.utc
+
+# Change-log marker for "key did not exist before this write"
+_MISSING = object()
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=_UTC).isoformat()
+
+
+def utc_now_iso() -> str:
+    """Current wall-clock time as an ISO 8601 UTC string."""
+    return _iso(time.time())
+
+
+def copy_data(data: dict) -> dict:
+    """
+    Independent copy of a dict of agent data (see WorkflowMemory.snapshot).
+
+    Also used by the agent and step caches, so a cached output never
+    shares nested lists or dicts with a run's memory.
+
+    A pickle round-trip (~4× faster than deepcopy on agent outputs) keeps
+    every value's type; deepcopy is the fallback for values pickle can't
+    handle. A JSON round-trip is not used even with orjson: it would turn
+    int keys, enums, dates, tuples and NaN into their JSON forms without
+    raising.
+    """
+    try:
+        return pickle.loads(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return copy.deepcopy(data)
+
 
 class StepStatus(str, Enum):
     PENDING = "pending"
@@ -52,7 +95,7 @@ class WorkflowStatus(str, Enum):
     WAITING_HUMAN = "waiting_human"
 
 
-@dataclass
+@dataclass(slots=True)
 class StepResult:
     """
     Output of a single workflow step execution.
@@ -60,6 +103,16 @@ class StepResult:
     Carries both the functional output and execution metadata.
     The engine uses metadata for routing decisions (retry on failure,
     skip next step if confidence is too low, etc.)
+
+    Results are built when the step finishes, so wall-clock time is read
+    once (completed_ts, epoch seconds) and the start is derived from the
+    monotonic duration_ns — immune to NTP jumps during the step. The ISO
+    started_at/completed_at strings (UTC) are formatted only on access.
+    Results that only set duration_ms (duration_ns == 0) derive the start
+    from it instead.
+
+    started_at/completed_at are read-only: pass completed_ts (and a
+    duration) to set them. completed_at is always a timestamp, never None.
     """
     step_id: str
     status: StepStatus
@@ -67,14 +120,23 @@ class StepResult:
     error: Optional[str] = None
     confidence: float = 1.0
     duration_ms: float = 0.0
+    duration_ns: int = 0  # monotonic (perf_counter_ns); duration_ms is derived from it
     llm_calls: int = 0
     tokens_used: int = 0
     agent_name: str = ""
-    started_at: str = field(default_factory=lambda: datetime.now().isoformat())
-    completed_at: Optional[str] = None
+    completed_ts: float = field(default_factory=time.time)
     retry_count: int = 0
     metadata: dict = field(default_factory=dict)
 
+    @property
+    def started_at(self) -> str:
+        elapsed_s = self.duration_ns / 1e9 if self.duration_ns else self.duration_ms / 1e3
+        return _iso(self.completed_ts - elapsed_s)
+
+    @property
+    def completed_at(self) -> str:
+        return _iso(self.completed_ts)
+
     @property
     def succeeded(self) -> bool:
         return self.status == StepStatus.COMPLETED
@@ -91,6 +153,7 @@ class StepResult:
             "error": self.error,
             "confidence": round(self.confidence, 4),
             "duration_ms": round(self.duration_ms, 1),
+            "duration_ns": self.duration_ns,
             "llm_calls": self.llm_calls,
             "tokens_used": self.tokens_used,
             "agent_name": self.agent_name,
@@ -100,7 +163,51 @@ class StepResult:
         }
 
 
-@dataclass
+class LazySnapshot(Mapping):
+    """
+    A step's delta input snapshot, copied only when read.
+
+    Reads as {"base_step": ..., "changed": {...}} (see StepTrace). It
+    holds the memory and two versions until first accessed; the values
+    are then copied via WorkflowMemory.delta_between and the memory is
+    released. Runs whose traces are never read or serialized pay no
+    snapshot copies at all. Always truthy, without resolving.
+    """
+    __slots__ = ("_memory", "_since", "_until", "_base_step", "_value")
+
+    def __init__(self, memory: WorkflowMemory, since: Optional[int], until: int, base_step: Optional[str]):
+        self._memory = memory
+        self._since = since
+        self._until = until
+        self._base_step = base_step
+        self._value: Optional[dict] = None
+
+    def materialize(self) -> dict:
+        if self._value is None:
+            changed = self._memory.delta_between(self._since, self._until)
+            self._value = {"base_step": self._base_step, "changed": changed}
+            self._memory = None
+        return self._value
+
+    def __getitem__(self, key: str) -> Any:
+        return self.materialize()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.materialize())
+
+    def __len__(self) -> int:
+        return len(self.materialize())
+
+    def __bool__(self) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        if self._value is None:
+            return f"LazySnapshot(base_step={self._base_step!r}, versions=({self._since}, {self._until}])"
+        return repr(self._value)
+
+
+@dataclass(slots=True, weakref_slot=True)
 class WorkflowMemory:
     """
     Shared state store across all workflow steps.
@@ -108,34 +215,152 @@ class WorkflowMemory:
     Provides a dict-like interface with:
       - get/set with dot notation for nested access
       - snapshot for trace capture
+      - view for cheap read-only access (prompt building)
       - typed access helpers
 
     The memory persists for the lifetime of a workflow execution.
     Each step can read all previous outputs and write its own.
+
+    Writes and snapshots hold a lock, so steps of a ParallelStep running
+    in worker threads can write while another thread takes a snapshot.
+
+    `scratch` holds per-run runtime objects (e.g. a pending retrieval
+    task started ahead of its step). It is never snapshotted or
+    serialized and is not part of the workflow's results.
+
+    Versioning: every write bumps `version` and appends (version, key,
+    previous value) to an append-only change log. Values are replaced,
+    never copied, so the log costs one tuple per write; copy_at(v)
+    rebuilds the state as of version v and snapshot_delta() reads the
+    keys written since its previous call straight from the log;
+    delta_handle() defers even that copy (see LazySnapshot).
     """
     _store: dict = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+    scratch: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    _version: int = field(default=0, init=False, repr=False, compare=False)
+    # _log[i] is the write that produced version i + 1
+    _log: list = field(default_factory=list, init=False, repr=False, compare=False)
+    # Version at the last snapshot_delta(); None means "never taken"
+    _delta_version: Optional[int] = field(default=None, init=False, repr=False, compare=False)
 
-    def set(self, key: str, value: Any) -> None:
+    @property
+    def version(self) -> int:
+        """Number of writes so far (0 = the initial store)."""
+        return self._version
+
+    def _write(self, key: str, value: Any) -> None:
+        # Caller holds the lock
+        self._version += 1
+        self._log.append((self._version, key, self._store.get(key, _MISSING)))
         self._store[key] = value
 
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._write(key, value)
+
     def get(self, key: str, default: Any = None) -> Any:
         return self._store.get(key, default)
 
     def update(self, data: dict) -> None:
-        self._store.update(data)
+        with self._lock:
+            for key, value in data.items():
+                self._write(key, value)
+
+    def view(self) -> MappingProxyType:
+        """Read-only live view of the store (no copy; reflects later writes)."""
+        return MappingProxyType(self._store)
+
+    def fork(self) -> "WorkflowMemory":
+        """
+        Memory for one step of a parallel wave.
+
+        Starts from the current keys (values are shared, not copied) and
+        shares `scratch`; writes to the fork stay in the fork until the
+        engine merges the step's output back.
+        """
+        with self._lock:
+            forked = WorkflowMemory(_store=dict(self._store))
+        forked.scratch = self.scratch
+        return forked
 
     def snapshot(self) -> dict:
-        """Return a deep copy of current state for trace capture."""
-        import copy
-        return copy.deepcopy(self._store)
+        """
+        Return an independent copy of current state for trace capture.
+
+        Values keep their types (see copy_data); use snapshot_bytes() for
+        the JSON form the trace serializes.
+        """
+        with self._lock:
+            return copy_data(self._store)
+
+    def snapshot_delta(self) -> dict:
+        """
+        Copy of the keys written since the previous call (all keys on the first).
+
+        Writes are tracked through set()/update(); values mutated in place
+        are not seen, which matches how steps use memory (one set() of
+        their output).
+        """
+        return self.delta_handle()["changed"]
+
+    def delta_handle(self, base_step: Optional[str] = None) -> LazySnapshot:
+        """
+        Lazy form of snapshot_delta() for trace input snapshots.
+
+        Advances the same cursor, but only records version numbers; the
+        changed values are copied when the handle is first read.
+        """
+        with self._lock:
+            since, self._delta_version = self._delta_version, self._version
+            return LazySnapshot(self, since, self._version, base_step)
+
+    def delta_between(self, since: Optional[int], until: int) -> dict:
+        """Copy of the keys written in (since, until], valued as of `until` (since=None: all keys)."""
+        with self._lock:
+            state = self._state_at(until)
+            if since is None:
+                return copy_data(state)
+            keys = dict.fromkeys(key for _, key, _ in self._log[since:until])
+            return copy_data({k: state[k] for k in keys if k in state})
+
+    def copy_at(self, version: int) -> dict:
+        """
+        Independent copy of the state as it was at `version`.
+
+        Walks the change log back from the current state, undoing writes
+        newer than `version`; cost is proportional to those writes, not
+        to the number of snapshots taken.
+        """
+        with self._lock:
+            return copy_data(self._state_at(version))
+
+    def _state_at(self, version: int) -> dict:
+        # Caller holds the lock; values are shared with the store
+        if not 0 <= version <= self._version:
+            raise ValueError(f"Unknown memory version {version} (current: {self._version})")
+        state = dict(self._store)
+        for _, key, previous in reversed(self._log[version:]):
+            if previous is _MISSING:
+                del state[key]
+            else:
+                state[key] = previous
+        return state
+
+    def snapshot_bytes(self) -> bytes:
+        """Current state as UTF-8 JSON, for callers that only archive it."""
+        with self._lock:
+            return json_utils.dumpb(self._store)
 
     def get_nested(self, *keys: str, default: Any = None) -> Any:
         """Access nested dict values: memory.get_nested('step1', 'output', 'tipo')"""
+        # EAFP: conditions call this on every step and nearly always hit
         current = self._store
-        for key in keys:
-            if not isinstance(current, dict) or key not in current:
-                return default
-            current = current[key]
+        try:
+            for key in keys:
+                current = current[key]
+        except (KeyError, TypeError, IndexError):
+            return default
         return current
 
     def to_dict(self) -> dict:
@@ -149,13 +374,21 @@ class WorkflowMemory:
         return f"WorkflowMemory({keys})"
 
 
-@dataclass
+@dataclass(slots=True)
 class StepTrace:
-    """Trace record for a single step execution."""
+    """
+    Trace record for a single step execution.
+
+    input_snapshot holds only what changed since the previous snapshot:
+    {"base_step": <step_id or None>, "changed": {key: value}}, usually as
+    a LazySnapshot that copies the values on first read. Skipped steps
+    record {}. Use WorkflowTrace.materialize_snapshot for the full memory
+    a step saw.
+    """
     step_id: str
     agent_name: str
     status: StepStatus
-    input_snapshot: dict
+    input_snapshot: Mapping
     output: dict
     confidence: float
     duration_ms: float
@@ -166,16 +399,46 @@ class StepTrace:
     completed_at: Optional[str]
     retry_count: int = 0
     notes: str = ""
+    duration_ns: int = 0
+
+    @classmethod
+    def from_result(
+        cls,
+        step_id: str,
+        agent_name: str,
+        input_snapshot: Mapping,
+        result: StepResult,
+        notes: str = "",
+    ) -> StepTrace:
+        """Trace record of an agent step's final StepResult."""
+        return cls(
+            step_id=step_id,
+            agent_name=agent_name,
+            status=result.status,
+            input_snapshot=input_snapshot,
+            output=result.output,
+            confidence=result.confidence,
+            duration_ms=result.duration_ms,
+            duration_ns=result.duration_ns,
+            llm_calls=result.llm_calls,
+            tokens_used=result.tokens_used,
+            error=result.error,
+            started_at=result.started_at,
+            completed_at=result.completed_at,
+            retry_count=result.retry_count,
+            notes=notes,
+        )
 
     def to_dict(self) -> dict:
         return {
             "step_id": self.step_id,
             "agent_name": self.agent_name,
             "status": self.status.value,
-            "input_snapshot": self.input_snapshot,
+            "input_snapshot": dict(self.input_snapshot),
             "output": self.output,
             "confidence": round(self.confidence, 4),
             "duration_ms": round(self.duration_ms, 1),
+            "duration_ns": self.duration_ns,
             "llm_calls": self.llm_calls,
             "tokens_used": self.tokens_used,
             "error": self.error,
@@ -186,7 +449,7 @@ class StepTrace:
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class WorkflowTrace:
     """
     Complete execution trace for a workflow run.
@@ -194,11 +457,23 @@ class WorkflowTrace:
     Provides full auditability: what each agent decided,
     why, with what confidence, and how long it took.
     Essential for debugging, compliance, and model improvement.
+
+    Each step's serialized row is built once, on the first to_dict()
+    that includes it (step traces are final when recorded), so repeated
+    to_dict() calls on a long trace are a list copy rather than a getattr
+    walk over every step. Building a row resolves the step's
+    LazySnapshot, so input snapshots are copied only for traces that are
+    actually serialized.
+
+    During a run the engine calls record() with the raw StepResult; the
+    StepTrace objects (and their ISO timestamps) are built in one pass
+    when the trace completes, or earlier if `steps` is needed (add_step,
+    to_dict, materialize_snapshot). Totals are kept current.
     """
     workflow_id: str = field(default_factory=lambda: str(uuid.uuid4())[:8])
     workflow_name: str = ""
     status: WorkflowStatus = WorkflowStatus.RUNNING
-    started_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: str = field(default_factory=utc_now_iso)
     completed_at: Optional[str] = None
     steps: list[StepTrace] = field(default_factory=list)
     human_gates_encountered: int = 0
@@ -207,16 +482,69 @@ class WorkflowTrace:
     total_tokens_used: int = 0
     total_duration_ms: float = 0.0
     error: Optional[str] = None
+    _step_rows: list[dict] = field(default_factory=list, init=False, repr=False, compare=False)
+    # (step_id, agent_name, input_snapshot, StepResult, notes) not yet in `steps`
+    _pending: list[tuple] = field(default_factory=list, init=False, repr=False, compare=False)
 
     def add_step(self, step_trace: StepTrace) -> None:
+        self._materialize()
         self.steps.append(step_trace)
         self.total_llm_calls += step_trace.llm_calls
         self.total_tokens_used += step_trace.tokens_used
         self.total_duration_ms += step_trace.duration_ms
 
+    def record(
+        self,
+        step_id: str,
+        agent_name: str,
+        input_snapshot: dict,
+        result: StepResult,
+        notes: str = "",
+    ) -> None:
+        """Buffer an agent step's result; its StepTrace is built later."""
+        self._pending.append((step_id, agent_name, input_snapshot, result, notes))
+        self.total_llm_calls += result.llm_calls
+        self.total_tokens_used += result.tokens_used
+        self.total_duration_ms += result.duration_ms
+
+    def _materialize(self) -> None:
+        if not self._pending:
+            return
+        built = [StepTrace.from_result(*raw) for raw in self._pending]
+        self._pending.clear()
+        self.steps.extend(built)
+
+    def last_snapshot_step(self) -> Optional[str]:
+        """step_id of the most recent step that recorded an input snapshot."""
+        for step_id, _, input_snapshot, _, _ in reversed(self._pending):
+            if input_snapshot:
+                return step_id
+        for step in reversed(self.steps):
+            if step.input_snapshot:
+                return step.step_id
+        return None
+
+    def materialize_snapshot(self, step_idx: int) -> dict:
+        """
+        Full memory as seen by steps[step_idx], replaying deltas forward.
+
+        A non-delta snapshot (a full dict, e.g. from an older trace)
+        replaces the view instead of being merged into it.
+        """
+        self._materialize()
+        view: dict = {}
+        for step in self.steps[:step_idx + 1]:
+            snapshot = step.input_snapshot
+            if "changed" in snapshot and "base_step" in snapshot:
+                view.update(snapshot["changed"])
+            elif snapshot:
+                view = dict(snapshot)
+        return view
+
     def complete(self, status: WorkflowStatus, error: Optional[str] = None) -> None:
+        self._materialize()
         self.status = status
-        self.completed_at = datetime.now().isoformat()
+        self.completed_at = utc_now_iso()
         self.error = error
 
     def to_dict(self) -> dict:
@@ -226,7 +554,7 @@ class WorkflowTrace:
             "status": self.status.value,
             "started_at": self.started_at,
             "completed_at": self.completed_at,
-            "steps": [s.to_dict() for s in self.steps],
+            "steps": self._steps_as_dicts(),
             "human_gates_encountered": self.human_gates_encountered,
             "human_gates_approved": self.human_gates_approved,
             "total_llm_calls": self.total_llm_calls,
@@ -235,11 +563,25 @@ class WorkflowTrace:
             "error": self.error,
         }
 
-    def to_json(self, indent: int = 2) -> str:
-        return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent)
+    def _steps_as_dicts(self) -> list[dict]:
+        self._materialize()
+        # Rows are only trusted while `steps` is append-only (add_step/record)
+        if len(self._step_rows) > len(self.steps):
+            self._step_rows = []
+        self._step_rows.extend(map(StepTrace.to_dict, self.steps[len(self._step_rows):]))
+        return list(self._step_rows)
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """
+        Serialize the trace (orjson when installed, see json_utils).
+
+        Any truthy `indent` gives the 2-space layout (the only one orjson
+        supports); None or 0 gives compact output.
+        """
+        return json_utils.dumps(self.to_dict(), pretty=bool(indent))
 
 
-@dataclass
+@dataclass(slots=True)
 class WorkflowResult:
     """
     Final result of a workflow execution.
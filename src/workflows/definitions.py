@@ -11,10 +11,15 @@ Three workflows of increasing complexity:
    Classify → Research → Analyze → Draft → Done
    Use case: standard labor law appeal drafting
 
-3. peticao_inicial (5 agents + human gate)
-   Classify → Research → Analyze → Draft → Review
+3. peticao_inicial (6 agents + human gate)
+   Classify → Research ∥ Draft fatos → Analyze → Draft direito → Review
    → Human gate → Done
    Use case: full initial petition workflow with quality control
+   The fatos pass needs only the classification, so research and
+   draft_fatos are grouped in a ParallelStep and run concurrently in
+   both run() and arun(). The pass is speculative — it runs before the
+   viability check, so non-viable cases still pay for one drafter call —
+   and optional: if it fails, draft direito proceeds without fatos.
 
 Conditional routing examples:
   - Research step only runs if classification confidence > 0.6
@@ -22,22 +27,102 @@ Conditional routing examples:
   - Human gate activates when case is urgent OR complexity is high
   - Reviewer can trigger re-draft (via condition on retry logic)
 
+Declared reads:
+  Each AgentStep lists the memory keys its agent and condition read, so
+  WorkflowEngine.arun(parallel=True) can run independent steps together.
+  Steps known to be independent are also grouped explicitly with
+  ParallelStep. In recurso_ordinario every step reads the previous one's
+  output (analyze reads pesquisa), so it stays sequential.
+
+Shared agents and steps:
+  Agents are built once per process (_agent) and shared by every
+  definition; classify, research and analyze come from small step
+  factories, so only their descriptions and conditions appear below.
+
 Human gate prompt functions:
   Summarize classification + analysis for the reviewing lawyer.
   Include: area, urgência, probabilidade de êxito, pedidos, alertas de prazo.
 """
 from __future__ import annotations
 
+import functools
+import io
+from typing import Optional
+
+from src.agents.base_agent import BaseAgent
 from src.agents.classifier_agent import ClassifierAgent
 from src.agents.researcher_agent import ResearcherAgent
 from src.agents.analyst_agent import AnalystAgent
-from src.agents.drafter_agent import DrafterAgent
+from src.agents.drafter_agent import DrafterAgent, DrafterDireitoAgent, DrafterFatosAgent
 from src.agents.reviewer_agent import ReviewerAgent
 from src.utils.workflow_models import WorkflowMemory
 from src.workflows.workflow_steps import (
-    AgentStep, HumanGateStep, WorkflowDefinition
+    AgentStep, Condition, HumanGateStep, ParallelStep, WorkflowDefinition
 )
 
+# Memory keys read by each agent's prompt (see the agents' _build_prompt)
+CLASSIFY_READS = ("caso", "cliente", "parte_contraria", "informacoes_adicionais")
+RESEARCH_READS = ("classification", "caso")
+ANALYZE_READS = ("classification", "pesquisa", "caso", "cliente")
+DRAFT_READS = ("classification", "pesquisa", "analise", "caso", "cliente", "parte_contraria")
+REVIEW_READS = ("minuta", "analise", "pesquisa")
+DRAFT_FATOS_READS = ("classification", "caso", "cliente", "parte_contraria")
+# Falls back to DrafterAgent's prompt (DRAFT_READS) when minuta_fatos is missing
+DRAFT_DIREITO_READS = ("minuta_fatos",) + DRAFT_READS
+
+
+@functools.cache
+def _agent(cls: type[BaseAgent]) -> BaseAgent:
+    """
+    Process-wide agent instance for `cls`.
+
+    Agents hold no per-run state, so every workflow definition can share
+    them; building a definition per request then costs no agent init and
+    reuses each agent's result cache.
+    """
+    return cls()
+
+
+# Steps shared by several workflows; only the description (and, for
+# research and analyze, the condition) differs between them.
+
+def _classify_step(description: str) -> AgentStep:
+    return AgentStep(
+        step_id="classify",
+        agent=_agent(ClassifierAgent),
+        memory_key="classification",
+        reads=CLASSIFY_READS,
+        description=description,
+        max_retries=2,
+        required=True,
+    )
+
+
+def _research_step(description: str, condition: Optional[Condition] = None) -> AgentStep:
+    return AgentStep(
+        step_id="research",
+        agent=_agent(ResearcherAgent),
+        memory_key="pesquisa",
+        reads=RESEARCH_READS,
+        description=description,
+        max_retries=2,
+        required=True,
+        condition=condition,
+    )
+
+
+def _analyze_step(description: str, condition: Optional[Condition] = None) -> AgentStep:
+    return AgentStep(
+        step_id="analyze",
+        agent=_agent(AnalystAgent),
+        memory_key="analise",
+        reads=ANALYZE_READS,
+        description=description,
+        max_retries=1,
+        required=True,
+        condition=condition,
+    )
+
 
 def _human_gate_prompt(memory: WorkflowMemory) -> str:
     """Build human-readable summary for gate review."""
@@ -46,67 +131,69 @@ def _human_gate_prompt(memory: WorkflowMemory) -> str:
     revisao = memory.get("revisao", {})
     minuta = memory.get("minuta", {})
 
-    lines = []
+    # Every line is written with its newline; the trailing one is dropped at the end
+    buf = io.StringIO()
+    write = buf.write
 
     # Header
     area = classification.get("area", "?").upper()
     subarea = classification.get("subarea", "?")
     urgencia = classification.get("urgencia", "?").upper()
-    lines.append(f"ÁREA: {area} / {subarea}")
-    lines.append(f"URGÊNCIA: {urgencia}")
+    write(f"ÁREA: {area} / {subarea}\n")
+    write(f"URGÊNCIA: {urgencia}\n")
 
     # Parties
     partes = classification.get("partes", {})
     if partes:
-        lines.append(f"REQUERENTE: {partes.get('requerente', '?')}")
-        lines.append(f"REQUERIDO:  {partes.get('requerido', '?')}")
+        write(f"REQUERENTE: {partes.get('requerente', '?')}\n")
+        write(f"REQUERIDO:  {partes.get('requerido', '?')}\n")
 
-    lines.append("")
+    write("\n")
 
     # Analysis
     prob = analise.get("probabilidade_exito", 0)
     cat = analise.get("categoria_exito", "?")
-    lines.append(f"PROBABILIDADE DE ÊXITO: {prob:.0%} ({cat})")
+    write(f"PROBABILIDADE DE ÊXITO: {prob:.0%} ({cat})\n")
 
     estrategia = analise.get("estrategia", "")
     if estrategia:
-        lines.append(f"ESTRATÉGIA: {estrategia}")
+        write(f"ESTRATÉGIA: {estrategia}\n")
 
     # Alerts
     alertas = analise.get("alertas_prazo", [])
     if alertas:
-        lines.append("\n⚠️  ALERTAS DE PRAZO:")
+        write("\n⚠️  ALERTAS DE PRAZO:\n")
         for a in alertas:
-            lines.append(f"  • {a}")
+            write(f"  • {a}\n")
 
     # Risks
     riscos = analise.get("riscos", [])
     altos = [r for r in riscos if r.get("severidade") == "alta"]
     if altos:
-        lines.append("\n🔴 RISCOS ALTOS:")
+        write("\n🔴 RISCOS ALTOS:\n")
         for r in altos:
-            lines.append(f"  • {r.get('descricao', '')}")
+            write(f"  • {r.get('descricao', '')}\n")
 
     # Review result
     if revisao:
         score = revisao.get("score_qualidade", 0)
         rec = revisao.get("recomendacao", "?")
-        lines.append(f"\nREVISÃO DA MINUTA: score={score:.0%}, recomendação={rec.upper()}")
+        write(f"\nREVISÃO DA MINUTA: score={score:.0%}, recomendação={rec.upper()}\n")
         issues = [i for i in revisao.get("issues", []) if i.get("severidade") == "alta"]
         if issues:
-            lines.append("Issues altos:")
+            write("Issues altos:\n")
             for i in issues:
-                lines.append(f"  • {i.get('descricao', '')}")
+                write(f"  • {i.get('descricao', '')}\n")
 
     # Draft summary
     tipo_peca = minuta.get("tipo_peca", "")
     valor = minuta.get("valor_causa", "")
     if tipo_peca:
-        lines.append(f"\nPEÇA: {tipo_peca.upper()}")
+        write(f"\nPEÇA: {tipo_peca.upper()}\n")
     if valor:
-        lines.append(f"VALOR DA CAUSA: {valor}")
+        write(f"VALOR DA CAUSA: {valor}\n")
 
-    return "\n".join(lines)
+    return buf.getvalue()[:-1]
 
 
 def triagem_rapida_workflow() -> WorkflowDefinition:
@@ -114,30 +201,15 @@ def triagem_rapida_workflow() -> WorkflowDefinition:
     Triagem rápida: classifica o caso e avalia viabilidade.
     Use quando precisa de uma resposta rápida ao cliente antes de pesquisa completa.
     """
-    classifier = ClassifierAgent()
-    analyst = AnalystAgent()
-
     return WorkflowDefinition(
         name="triagem_rapida",
         description="Triagem: classificação + análise de viabilidade sem pesquisa aprofundada",
         steps=[
-            AgentStep(
-                step_id="classify",
-                agent=classifier,
-                memory_key="classification",
-                description="Classificar tipo, urgência e complexidade do caso",
-                max_retries=2,
-                required=True,
-            ),
-            AgentStep(
-                step_id="analyze",
-                agent=analyst,
-                memory_key="analise",
-                description="Avaliar viabilidade e riscos do caso",
-                max_retries=1,
-                required=True,
-                # Only analyze if classification was confident enough
-                condition=lambda m: (m.get_nested("classification", "confidence") or 0) >= 0.5,
+            _classify_step("Classificar tipo, urgência e complexidade do caso"),
+            # Only analyze if classification was confident enough
+            _analyze_step(
+                "Avaliar viabilidade e riscos do caso",
+                condition=Condition.nested_gte(("classification", "confidence"), 0.5),
             ),
         ],
     )
@@ -148,49 +220,26 @@ def recurso_ordinario_workflow() -> WorkflowDefinition:
     Workflow de recurso ordinário: classificação → pesquisa → análise → minuta.
     Sem revisão automática e sem human gate — para uso em batch.
     """
-    classifier = ClassifierAgent()
-    researcher = ResearcherAgent()
-    analyst = AnalystAgent()
-    drafter = DrafterAgent()
-
     return WorkflowDefinition(
         name="recurso_ordinario",
         description="Recurso ordinário: classificação → pesquisa → análise → minuta",
         steps=[
-            AgentStep(
-                step_id="classify",
-                agent=classifier,
-                memory_key="classification",
-                description="Classificar o caso",
-                max_retries=2,
-                required=True,
-            ),
-            AgentStep(
-                step_id="research",
-                agent=researcher,
-                memory_key="pesquisa",
-                description="Pesquisar legislação e jurisprudência",
-                max_retries=2,
-                required=True,
-                condition=lambda m: (m.get_nested("classification", "confidence") or 0) >= 0.5,
-            ),
-            AgentStep(
-                step_id="analyze",
-                agent=analyst,
-                memory_key="analise",
-                description="Analisar mérito e estratégia",
-                max_retries=1,
-                required=True,
+            _classify_step("Classificar o caso"),
+            _research_step(
+                "Pesquisar legislação e jurisprudência",
+                condition=Condition.nested_gte(("classification", "confidence"), 0.5),
             ),
+            _analyze_step("Analisar mérito e estratégia"),
             AgentStep(
                 step_id="draft",
-                agent=drafter,
+                agent=_agent(DrafterAgent),
                 memory_key="minuta",
+                reads=DRAFT_READS,
                 description="Redigir a minuta do recurso",
                 max_retries=2,
                 required=True,
                 # Only draft if case has some viability
-                condition=lambda m: (m.get_nested("analise", "probabilidade_exito") or 0) >= 0.2,
+                condition=Condition.nested_gte(("analise", "probabilidade_exito"), 0.2),
             ),
         ],
     )
@@ -200,81 +249,70 @@ def peticao_inicial_workflow() -> WorkflowDefinition:
     """
     Workflow completo de petição inicial com revisão e human gate.
     Use quando o caso requer máxima qualidade e aprovação de advogado.
+
+    draft_fatos roda especulativamente, antes da análise de viabilidade:
+    casos inviáveis (draft pulado) ainda pagam essa chamada ao LLM, em
+    troca de a redação dos fatos não esperar pela pesquisa. Por isso ela é
+    opcional — uma falha não cancela a petição, e o draft segue sem os
+    fatos redigidos: sem minuta_fatos, DrafterDireitoAgent redige a peça
+    inteira em uma passada, como o DrafterAgent.
     """
-    classifier = ClassifierAgent()
-    researcher = ResearcherAgent()
-    analyst = AnalystAgent()
-    drafter = DrafterAgent()
-    reviewer = ReviewerAgent()
-
-    def is_case_viable(m: WorkflowMemory) -> bool:
-        return (m.get_nested("analise", "probabilidade_exito") or 0) >= 0.2
-
-    def needs_human_gate(m: WorkflowMemory) -> bool:
-        """
-        Trigger human gate when:
-        - Case is urgent
-        - Complexity is high
-        - Review recommends revision or rejection
-        - Any high-severity issues found
-        """
-        urgencia = m.get_nested("classification", "urgencia") or ""
-        complexidade = m.get_nested("classification", "complexidade") or ""
-        recomendacao = m.get_nested("revisao", "recomendacao") or "aprovar"
-        score = m.get_nested("revisao", "score_qualidade") or 1.0
-
-        return (
-            urgencia == "urgente"
-            or complexidade == "complexo"
-            or recomendacao in ("revisar", "rejeitar")
-            or score < 0.8
-        )
+    is_case_viable = Condition.nested_gte(("analise", "probabilidade_exito"), 0.2)
+
+    # Trigger human gate when:
+    # - Case is urgent
+    # - Complexity is high
+    # - Review recommends revision or rejection
+    # - Review score is below 0.8 (no review counts as approved, score 1.0)
+    needs_human_gate = Condition.any_of(
+        Condition.nested_eq(("classification", "urgencia"), "urgente"),
+        Condition.nested_eq(("classification", "complexidade"), "complexo"),
+        Condition.nested_in(("revisao", "recomendacao"), ("revisar", "rejeitar")),
+        Condition.nested_lt(("revisao", "score_qualidade"), 0.8, default=1.0),
+    )
 
     return WorkflowDefinition(
         name="peticao_inicial",
         description="Petição inicial completa: classificação → pesquisa → análise → minuta → revisão → aprovação",
         steps=[
-            AgentStep(
-                step_id="classify",
-                agent=classifier,
-                memory_key="classification",
-                description="Classificar o caso jurídico",
-                max_retries=2,
-                required=True,
-            ),
-            AgentStep(
-                step_id="research",
-                agent=researcher,
-                memory_key="pesquisa",
-                description="Pesquisar fundamentos jurídicos",
-                max_retries=2,
-                required=True,
-            ),
-            AgentStep(
-                step_id="analyze",
-                agent=analyst,
-                memory_key="analise",
-                description="Analisar mérito e definir estratégia",
-                max_retries=1,
-                required=True,
+            _classify_step("Classificar o caso jurídico"),
+            # Neither step reads the other's output: run them together
+            ParallelStep(
+                step_id="research_and_fatos",
+                description="Pesquisa e redação dos fatos em paralelo",
+                steps=[
+                    _research_step("Pesquisar fundamentos jurídicos"),
+                    AgentStep(
+                        step_id="draft_fatos",
+                        agent=_agent(DrafterFatosAgent),
+                        memory_key="minuta_fatos",
+                        reads=DRAFT_FATOS_READS,
+                        description="Redigir qualificação e fatos (em paralelo com a pesquisa)",
+                        max_retries=2,
+                        required=False,  # speculative: runs before is_case_viable is known
+                    ),
+                ],
             ),
+            _analyze_step("Analisar mérito e definir estratégia"),
             AgentStep(
                 step_id="draft",
-                agent=drafter,
+                agent=_agent(DrafterDireitoAgent),
                 memory_key="minuta",
-                description="Redigir a petição inicial",
+                reads=DRAFT_DIREITO_READS,
+                description="Redigir direito e pedidos da petição inicial",
                 max_retries=2,
                 required=True,
                 condition=is_case_viable,
             ),
             AgentStep(
                 step_id="review",
-                agent=reviewer,
+                agent=_agent(ReviewerAgent),
                 memory_key="revisao",
+                reads=REVIEW_READS,
                 description="Revisar a minuta produzida",
                 max_retries=1,
                 required=False,  # Workflow continues even if review fails
-                condition=lambda m: "minuta" in m,
+                condition=Condition.has("minuta"),
             ),
             HumanGateStep(
                 step_id="human_approval",
@@ -13,6 +13,7 @@ The engine is responsible for:
 
 Execution loop:
   for each step in workflow.steps:
+    if step is ParallelStep → run its ready substeps concurrently, then continue
     if step.should_run(memory) is False → SKIPPED
     if step is HumanGateStep → pause, get human input, continue
     if step is AgentStep:
@@ -28,40 +29,353 @@ Memory contract:
   Each step writes output to memory[step.memory_key].
   The engine also writes execution metadata to memory['_meta'][step_id].
 
+Input snapshots:
+  A step's trace stores only the memory keys written since the previous
+  snapshot ({"base_step": ..., "changed": {...}}), not a full copy, so
+  trace size grows linearly with the run. The copy itself is deferred
+  until the trace is read or serialized (LazySnapshot).
+  WorkflowTrace.materialize_snapshot(i) rebuilds the full memory a step saw.
+
+Retries:
+  A failed attempt is retried up to max_retries total attempts, waiting
+  retry_backoff · 2^(n-1) seconds (capped at retry_backoff_cap, ±50%
+  jitter) before retry n. The LLM client already retries transient HTTP
+  errors itself; engine retries cover empty or unparseable output.
+
 Interactive mode:
   HumanGateStep: prints the prompt_fn(memory) result and asks for approval.
   User types 'yes'/'no'. 'no' cancels the workflow.
   Can be bypassed with interactive=False for batch processing.
+  Answers are read by the engine's daemon stdin thread, so in arun() an
+  open gate does not stall other workflows on the same event loop.
+  A gate left unanswered for timeout_seconds (default 1h) counts as a
+  rejection. The pending stdin read can't be interrupted, but the daemon
+  thread never holds the process at exit; a line typed after the
+  timeout answers the next open gate, or is dropped if none is open.
+
+Async / parallel mode:
+  arun() awaits agent.aexecute() instead of blocking on execute().
+  With parallel=True, consecutive AgentSteps that declare their `reads`
+  and do not touch each other's memory keys are grouped into a wave
+  at register time and launched together with asyncio.gather
+  (fan-out/fan-in). Wall-clock per wave ≈ max(step) instead of sum(step).
+  Steps without declared reads and HumanGateSteps always run alone.
+  Each step of a multi-step wave (in run() too) works on memory.fork(),
+  so siblings never see each other's writes mid-wave; successful
+  outputs are merged back when the wave ends.
+  After each wave, agents of the next wave get a prefetch(memory) call
+  so slow lookups (e.g. ResearcherAgent's async retrieval) can start
+  before their step does.
+
+Streaming:
+  arun(streaming_callback=cb) streams agent responses: cb(agent_name,
+  chunk, False) fires as each top-level JSON field of the LLM output
+  completes (chunk is that field as a JSON object text, e.g.
+  '{"recomendacao": "revisar"}'), then cb(agent_name, "", True) once the
+  agent's attempt is done. A UI can render the review while the rest of
+  the payload is still being generated. Sync-only agents report only the
+  final call.
+
+Step memoization:
+  WorkflowEngine(memo=...) takes any MutableMapping (dict, LRUCache,
+  SQLiteCache). Before running an AgentStep the engine hashes the step id,
+  agent name and version and the memory values the step reads (all of
+  memory when `reads` is undeclared); on a hit the stored output is
+  written to memory without calling the agent and the trace notes say
+  "memoized". Only successful results are stored. clear_memo() drops
+  entries for one step or all of them.
+
+Batch mode:
+  arun_batch()/run_batch() run one workflow over many cases concurrently
+  (bounded), isolating failures per case — for bulk triagem_rapida runs.
+  Passing one workflow name per case mixes workflows in the same batch.
+  Optionally cases are binned by length so each group in flight is
+  homogeneous.
+
+The engine is pure orchestration around I/O and is deliberately not
+JIT-compiled; see src/utils/jit.py for when maybe_njit applies.
 """
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import inspect
+import itertools
+import json
 import logging
+import os
+import queue
+import random
+import sys
+import threading
 import time
-from typing import Optional
+from collections import Counter, deque
+from collections.abc import Mapping, MutableMapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
 
 from src.workflows.workflow_steps import (
-    WorkflowDefinition, AgentStep, HumanGateStep, StepType
+    WorkflowDefinition, AgentStep, HumanGateStep, ParallelStep, StepType
 )
+from src.agents.base_agent import run_sync
+from src.utils import json_utils
+from src.utils.llm_cache import LRUCache
+from src.utils.prompt_compress import CHARS_PER_TOKEN
 from src.utils.workflow_models import (
     WorkflowMemory, WorkflowTrace, WorkflowResult, StepTrace,
-    StepResult, StepStatus, WorkflowStatus
+    StepResult, StepStatus, WorkflowStatus, copy_data, utc_now_iso
 )
 
 logger = logging.getLogger(__name__)
 
+# Default cases in flight at once in arun_batch()
+_BATCH_CONCURRENCY = 64
+
+# Memory keys copied to WorkflowResult.final_output; a workflow may override
+# them with metadata={"final_output_keys": (...)}
+_KEY_OUTPUTS: tuple[str, ...] = ("classification", "pesquisa", "analise", "minuta", "revisao")
+
+# Seconds a human gate waits for an answer before rejecting (HumanGateStep.timeout_seconds overrides)
+_GATE_TIMEOUT_S = 3600.0
+
+# Human gate summaries kept by the engine
+_SUMMARY_CACHE_SIZE = 64
+
+_GATE_QUESTION = "\nAprovar e continuar? [sim/nao]: "
+
+# streaming_callback(agent_name, chunk, is_final)
+StreamingCallback = Callable[[str, str, bool], None]
+
+
+def _backoff(step: AgentStep, attempt: int) -> float:
+    """
+    Seconds to wait before retry `attempt` (1 = first retry).
+
+    Capped exponential with jitter, so retries of steps that failed
+    together (e.g. a provider overload hitting a whole wave) spread out.
+    """
+    delay = min(step.retry_backoff * 2 ** (attempt - 1), step.retry_backoff_cap)
+    return delay * (0.5 + random.random())
+
+
+def _log_crash(kind: str, name: Any, error: Exception) -> None:
+    """
+    Log a crash from inside its except block.
+
+    The traceback is only formatted at DEBUG: during a provider outage
+    every case fails, and formatting each traceback costs more than the
+    failed run itself.
+    """
+    logger.error("%s %s crashed: %s", kind, name, error)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s %s traceback", kind, name, exc_info=True)
+
+
+def _intern(name: Any) -> Any:
+    """
+    Interned agent name for trace records.
+
+    BaseAgent names are interned per class; duck-typed agents may build
+    theirs per instance, and without this every trace of a batch would
+    hold its own copy.
+    """
+    return sys.intern(name) if type(name) is str else name
+
+
+def _read_line(prompt: str) -> Optional[str]:
+    """
+    One line of stdin for the gate reader thread; None at end of input.
+
+    Reads the file descriptor directly, one byte at a time: a daemon
+    thread left blocked inside sys.stdin's buffered reader makes
+    interpreter shutdown abort on that buffer's lock, and reading byte by
+    byte leaves later lines for later gates.
+    """
+    print(prompt, end="", flush=True)
+    try:
+        fd = sys.stdin.fileno()
+    except (AttributeError, ValueError, OSError):  # stdin replaced by a non-file
+        line = sys.stdin.readline()
+        return line.rstrip("\r\n") if line else None
+    data = bytearray()
+    while True:
+        byte = os.read(fd, 1)
+        if not byte:
+            if not data:
+                return None
+            break
+        if byte == b"\n":
+            break
+        data += byte
+    return data.decode(sys.stdin.encoding or "utf-8", errors="replace").rstrip("\r")
+
+
+class _GateReader:
+    """
+    Reads human gate answers on one daemon thread.
+
+    Open gates queue up in FIFO order and each line read answers the
+    oldest one, so concurrent interactive arun() calls on one engine are
+    answered in the order they asked. A blocking read can't be
+    interrupted, so a question that timed out stays pending in the
+    thread. Being a daemon, it never holds the process at exit. The line
+    it eventually reads goes to the oldest gate still waiting at that
+    moment, or is dropped if none is; a late answer can't be queued up
+    for a gate that hasn't been asked yet.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._tickets = itertools.count(1)
+        # (ticket, prompt, deliver) of each open gate, oldest first
+        self._waiting: deque[tuple[int, str, Callable[[Optional[str]], None]]] = deque()
+        self._shown = 0  # ticket whose prompt was printed last
+        self._reading = False  # thread is inside _read_line()
+        self._thread: Optional[threading.Thread] = None
+
+    def ask(self, prompt: str, timeout: float) -> Optional[str]:
+        """The answer line, or None after `timeout` seconds."""
+        answers: queue.SimpleQueue = queue.SimpleQueue()
+        ticket = self._post(prompt, answers.put)
+        try:
+            line = answers.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        finally:
+            self._withdraw(ticket)
+        return self._checked(line)
+
+    async def aask(self, prompt: str, timeout: float) -> Optional[str]:
+        """Async ask(): awaits the answer without tying up an executor thread."""
+        loop = asyncio.get_running_loop()
+        answer = loop.create_future()
+
+        def deliver(line: Optional[str]) -> None:
+            loop.call_soon_threadsafe(lambda: answer.done() or answer.set_result(line))
+
+        ticket = self._post(prompt, deliver)
+        try:
+            line = await asyncio.wait_for(answer, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._withdraw(ticket)
+        return self._checked(line)
+
+    @staticmethod
+    def _checked(line: Optional[str]) -> str:
+        if line is None:
+            raise EOFError("stdin closed while a human gate was open")
+        return line
+
+    def _post(self, prompt: str, deliver: Callable[[Optional[str]], None]) -> int:
+        with self._cond:
+            ticket = next(self._tickets)
+            self._waiting.append((ticket, prompt, deliver))
+            self._show_next()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="human-gate", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return ticket
+
+    def _withdraw(self, ticket: int) -> None:
+        with self._cond:
+            for waiter in self._waiting:
+                if waiter[0] == ticket:
+                    self._waiting.remove(waiter)
+                    break
+            self._show_next()
+
+    def _show_next(self) -> None:
+        # A read in flight answers the oldest gate; if that gate changed
+        # (the asker timed out), show the new one's prompt. Caller holds _cond.
+        if self._reading and self._waiting and self._waiting[0][0] != self._shown:
+            self._shown = self._waiting[0][0]
+            print(self._waiting[0][1], end="", flush=True)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._waiting:
+                    self._cond.wait()
+                ticket, prompt = self._waiting[0][:2]
+                if ticket == self._shown:
+                    prompt = ""
+                self._shown = ticket
+                self._reading = True
+            line = _read_line(prompt)
+            with self._cond:
+                self._reading = False
+                if line is None:  # EOF answers every open gate
+                    waiters = list(self._waiting)
+                    self._waiting.clear()
+                else:
+                    waiters = [self._waiting.popleft()] if self._waiting else []
+            for waiter in waiters:
+                try:
+                    waiter[2](line)
+                except RuntimeError:  # the asking event loop is gone
+                    pass
+            if line is None:
+                return
+
 
 class WorkflowEngine:
     """
     Executes registered workflow definitions.
     """
 
-    def __init__(self):
+    def __init__(self, memo: Optional[MutableMapping] = None):
+        """
+        Args:
+            memo: Mapping for memoized step outputs (see module docstring);
+                  None disables step memoization.
+        """
         self._workflows: dict[str, WorkflowDefinition] = {}
+        self._waves: dict[str, list[list[AgentStep | HumanGateStep]]] = {}
+        self._memo = memo
+        self._gate_stdin: Optional[_GateReader] = None
+        # Human gate summaries: (step_id, id(memory), version) → (memory, text)
+        self._summaries = LRUCache(_SUMMARY_CACHE_SIZE)
+        # Wave handlers by step type; each returns a final status or None to go on
+        self._dispatch = {
+            StepType.AGENT: self._run_agent_wave,
+            StepType.HUMAN_GATE: self._run_gate_wave,
+        }
+        self._adispatch = {
+            StepType.AGENT: self._arun_agent_wave,
+            StepType.HUMAN_GATE: self._arun_gate_wave,
+        }
+
+    def clear_memo(self, step_id: Optional[str] = None) -> None:
+        """Drop memoized outputs of `step_id`, or all of them if None."""
+        if self._memo is None:
+            return
+        if step_id is None:
+            self._memo.clear()
+            return
+        prefix = f"{step_id}:"
+        for key in [k for k in self._memo if k.startswith(prefix)]:
+            del self._memo[key]
 
     def register(self, workflow: WorkflowDefinition) -> None:
-        """Register a workflow definition."""
+        """
+        Register a workflow definition.
+
+        The definition is frozen first (steps become tuples, see
+        WorkflowDefinition.freeze), which also rejects duplicate step ids.
+        Raises ValueError if two agent steps write the same memory_key (one
+        output would silently overwrite the other).
+        """
+        workflow.freeze()
+        keys = [s.memory_key for s in workflow.iter_steps() if s.step_type is StepType.AGENT]
+        duplicates = sorted(key for key, count in Counter(keys).items() if count > 1)
+        if duplicates:
+            raise ValueError(f"Workflow '{workflow.name}' has duplicate memory keys: {duplicates}")
         self._workflows[workflow.name] = workflow
-        logger.debug(f"Registered workflow: {workflow.name} ({len(workflow.steps)} steps)")
+        self._waves[workflow.name] = self._plan_waves(workflow)
+        logger.debug(f"Registered workflow: {workflow.name} ({len(workflow.step_ids())} steps)")
 
     def run(
         self,
@@ -80,6 +394,205 @@ class WorkflowEngine:
         Returns:
             WorkflowResult with status, memory, and trace.
         """
+        workflow, memory, trace = self._start(workflow_name, initial_input)
+
+        try:
+            status = self._execute_workflow(workflow, memory, trace, interactive)
+        except Exception as e:
+            _log_crash("Workflow", workflow_name, e)
+            trace.complete(WorkflowStatus.FAILED, error=str(e))
+            status = WorkflowStatus.FAILED
+
+        return self._build_result(workflow_name, status, memory, trace)
+
+    async def arun(
+        self,
+        workflow_name: str,
+        initial_input: dict,
+        interactive: bool = False,
+        parallel: bool = False,
+        streaming_callback: Optional[StreamingCallback] = None,
+    ) -> WorkflowResult:
+        """
+        Async counterpart of run().
+
+        Args:
+            workflow_name: Name of registered workflow to run.
+            initial_input: Initial data to populate WorkflowMemory.
+            interactive: If True, pause at HumanGateSteps for approval.
+            parallel: If True, run independent steps of each wave concurrently.
+            streaming_callback: Optional cb(agent_name, chunk, is_final) fed
+                with each agent's output fields as they stream in.
+
+        Returns:
+            WorkflowResult with status, memory, and trace.
+        """
+        workflow, memory, trace = self._start(workflow_name, initial_input)
+
+        try:
+            status = await self._aexecute_workflow(
+                workflow, memory, trace, interactive, parallel, streaming_callback
+            )
+        except Exception as e:
+            _log_crash("Workflow", workflow_name, e)
+            trace.complete(WorkflowStatus.FAILED, error=str(e))
+            status = WorkflowStatus.FAILED
+        finally:
+            # Prefetched work whose step never ran (skipped, or run stopped early)
+            for pending in memory.scratch.values():
+                if isinstance(pending, asyncio.Future) and not pending.done():
+                    pending.cancel()
+            memory.scratch.clear()
+
+        return self._build_result(workflow_name, status, memory, trace)
+
+    async def arun_batch(
+        self,
+        workflow_name: str | Sequence[str],
+        inputs: list[dict],
+        max_concurrent: int = _BATCH_CONCURRENCY,
+        parallel: bool = False,
+        on_result: Optional[Callable[[int, WorkflowResult], Any]] = None,
+        length_bins: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+    ) -> list[WorkflowResult]:
+        """
+        Run a workflow over many cases concurrently (non-interactive).
+
+        Up to `max_concurrent` runs are in flight at once. Their LLM calls
+        share the pooled async client, so the provider sees a steady stream
+        of concurrent requests it can batch server-side, instead of one
+        case at a time. Agents (and their result caches) are shared across
+        cases.
+
+        Errors are isolated per case: a run that crashes becomes a FAILED
+        WorkflowResult and the rest of the batch continues. An `on_result`
+        callback that raises is logged; its case's result is still returned.
+
+        Multi-bin batching: with `length_bins`, cases are sorted by
+        estimated prompt size and split into that many quantile bins, run
+        one bin after another. Each bin holds cases of similar length, so
+        a few long cases don't hold up a bin of short ones.
+        `max_batch_tokens` further splits bins so the estimated tokens in
+        flight per group stay under the cap.
+
+        Args:
+            workflow_name: Name of registered workflow to run, or a sequence
+                           with one name per input (independent workflows
+                           sharing the batch, client pool and agents).
+            inputs: One initial_input dict per case.
+            max_concurrent: Cases in flight at once.
+            parallel: Passed to arun() for each case.
+            on_result: Optional callback(index, result), sync or async,
+                       called as each case finishes.
+            length_bins: Number of length bins (None: one group, input order).
+            max_batch_tokens: Cap on estimated case tokens per dispatched group.
+
+        Returns:
+            One WorkflowResult per input, in input order.
+        """
+        if isinstance(workflow_name, str):
+            names = [workflow_name] * len(inputs)
+        else:
+            names = list(workflow_name)
+            if len(names) != len(inputs):
+                raise ValueError(f"Got {len(names)} workflow names for {len(inputs)} inputs")
+        for name in dict.fromkeys(names):
+            if name not in self._workflows:
+                raise ValueError(f"Workflow '{name}' not registered. "
+                                 f"Available: {list(self._workflows.keys())}")
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrent))
+
+        async def run_one(index: int, initial_input: dict) -> WorkflowResult:
+            async with semaphore:
+                try:
+                    result = await self.arun(names[index], initial_input, parallel=parallel)
+                except Exception as e:
+                    _log_crash("Batch case", index, e)
+                    result = self._crashed_result(names[index], initial_input, e)
+            if on_result is not None:
+                try:
+                    callback_result = on_result(index, result)
+                    if inspect.isawaitable(callback_result):
+                        await callback_result
+                except Exception as e:
+                    _log_crash("Batch on_result callback for case", index, e)
+            return result
+
+        results: list[Optional[WorkflowResult]] = [None] * len(inputs)
+        for group in self._plan_batch(inputs, length_bins, max_batch_tokens):
+            group_results = await asyncio.gather(*(run_one(i, inputs[i]) for i in group))
+            for i, result in zip(group, group_results):
+                results[i] = result
+        return results
+
+    @staticmethod
+    def _plan_batch(
+        inputs: list[dict],
+        length_bins: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+    ) -> list[list[int]]:
+        """Group case indices for arun_batch (see multi-bin batching there)."""
+        order = list(range(len(inputs)))
+        if not order or (length_bins is None and max_batch_tokens is None):
+            return [order] if order else []
+
+        tokens = [
+            len(str(c.get("caso", ""))) // CHARS_PER_TOKEN if isinstance(c, dict) else 0
+            for c in inputs
+        ]
+        order.sort(key=tokens.__getitem__)
+        bins = max(1, min(length_bins or 1, len(order)))
+        groups = [order[b * len(order) // bins:(b + 1) * len(order) // bins] for b in range(bins)]
+
+        if max_batch_tokens:
+            split: list[list[int]] = []
+            for group in groups:
+                current, total = [], 0
+                for i in group:
+                    if current and total + tokens[i] > max_batch_tokens:
+                        split.append(current)
+                        current, total = [], 0
+                    current.append(i)
+                    total += tokens[i]
+                split.append(current)
+            groups = split
+        return groups
+
+    def run_batch(
+        self,
+        workflow_name: str | Sequence[str],
+        inputs: list[dict],
+        max_concurrent: int = _BATCH_CONCURRENCY,
+        parallel: bool = False,
+        length_bins: Optional[int] = None,
+        max_batch_tokens: Optional[int] = None,
+    ) -> list[WorkflowResult]:
+        """Blocking wrapper around arun_batch for sync callers."""
+        return run_sync(self.arun_batch(
+            workflow_name, inputs, max_concurrent, parallel,
+            length_bins=length_bins, max_batch_tokens=max_batch_tokens,
+        ))
+
+    def _crashed_result(
+        self,
+        workflow_name: str,
+        initial_input: dict,
+        error: Exception,
+    ) -> WorkflowResult:
+        memory = WorkflowMemory()
+        memory.update(initial_input if isinstance(initial_input, dict) else {})
+        trace = WorkflowTrace(workflow_name=workflow_name)
+        trace.complete(WorkflowStatus.FAILED, error=str(error))
+        return self._build_result(workflow_name, WorkflowStatus.FAILED, memory, trace)
+
+    def _start(
+        self,
+        workflow_name: str,
+        initial_input: dict,
+    ) -> tuple[WorkflowDefinition, WorkflowMemory, WorkflowTrace]:
+        """Resolve the workflow and set up fresh memory + trace for a run."""
         if workflow_name not in self._workflows:
             raise ValueError(f"Workflow '{workflow_name}' not registered. "
                              f"Available: {list(self._workflows.keys())}")
@@ -91,16 +604,19 @@ class WorkflowEngine:
         trace = WorkflowTrace(workflow_name=workflow_name)
 
         logger.info(f"Starting workflow: {workflow_name} (id={trace.workflow_id})")
+        return workflow, memory, trace
 
-        try:
-            status = self._execute_workflow(workflow, memory, trace, interactive)
-        except Exception as e:
-            logger.error(f"Workflow {workflow_name} crashed: {e}", exc_info=True)
-            trace.complete(WorkflowStatus.FAILED, error=str(e))
-            status = WorkflowStatus.FAILED
-
+    def _build_result(
+        self,
+        workflow_name: str,
+        status: WorkflowStatus,
+        memory: WorkflowMemory,
+        trace: WorkflowTrace,
+    ) -> WorkflowResult:
         # Build final output from memory
-        final_output = self._build_final_output(memory)
+        workflow = self._workflows.get(workflow_name)
+        keys = workflow.metadata.get("final_output_keys", _KEY_OUTPUTS) if workflow else _KEY_OUTPUTS
+        final_output = self._build_final_output(memory, keys)
 
         return WorkflowResult(
             workflow_id=trace.workflow_id,
@@ -111,6 +627,63 @@ class WorkflowEngine:
             final_output=final_output,
         )
 
+    @staticmethod
+    def _explicit_waves(workflow: WorkflowDefinition) -> list[list[AgentStep | HumanGateStep]]:
+        """One wave per top-level step; a ParallelStep's substeps share one."""
+        return [
+            list(step.steps) if step.step_type is StepType.PARALLEL else [step]
+            for step in workflow.steps
+        ]
+
+    @staticmethod
+    def _plan_waves(workflow: WorkflowDefinition) -> list[list[AgentStep | HumanGateStep]]:
+        """
+        Group consecutive independent AgentSteps into waves.
+
+        A step joins the current wave only if it declares `reads` and
+        neither reads nor writes any key written by the wave, and does not
+        overwrite a key the wave reads. Order of steps is preserved.
+        A ParallelStep becomes exactly one wave of its substeps.
+        """
+        waves: list[list[AgentStep | HumanGateStep]] = []
+        current: list[AgentStep] = []
+        written: set[str] = set()
+        read: set[str] = set()
+
+        for step in workflow.steps:
+            if step.step_type is StepType.PARALLEL:
+                # Explicit groups always form a wave of their own
+                if current:
+                    waves.append(current)
+                waves.append(list(step.steps))
+                current, written, read = [], set(), set()
+                continue
+
+            independent = step.step_type is StepType.AGENT and step.reads is not None
+            if (
+                independent and current
+                and not (set(step.reads) & written)
+                and step.memory_key not in written | read
+            ):
+                current.append(step)
+                written.add(step.memory_key)
+                read.update(step.reads)
+                continue
+
+            if current:
+                waves.append(current)
+            if independent:
+                current = [step]
+                written = {step.memory_key}
+                read = set(step.reads)
+            else:
+                waves.append([step])
+                current, written, read = [], set(), set()
+
+        if current:
+            waves.append(current)
+        return waves
+
     def _execute_workflow(
         self,
         workflow: WorkflowDefinition,
@@ -120,25 +693,191 @@ class WorkflowEngine:
     ) -> WorkflowStatus:
         """Execute all steps in order. Returns final workflow status."""
 
-        for step in workflow.steps:
-            # ── Check condition ───────────────────────────────────────────────
+        for wave in self._explicit_waves(workflow):
+            # ── Check conditions ──────────────────────────────────────────────
+            ready = self._ready_steps(wave, memory, trace)
+            if not ready:
+                continue
+
+            # ── Dispatch on the wave's step type (a wave never mixes types) ───
+            status = self._dispatch[ready[0].step_type](ready, memory, trace, interactive)
+            if status is not None:
+                return status
+
+        trace.complete(WorkflowStatus.COMPLETED)
+        return WorkflowStatus.COMPLETED
+
+    def _run_gate_wave(
+        self,
+        ready: list[HumanGateStep],
+        memory: WorkflowMemory,
+        trace: WorkflowTrace,
+        interactive: bool,
+    ) -> Optional[WorkflowStatus]:
+        step = ready[0]
+        if self._handle_human_gate(step, memory, trace, interactive):
+            return None
+        return self._cancel_at_gate(step, trace)
+
+    def _run_agent_wave(
+        self,
+        ready: list[AgentStep],
+        memory: WorkflowMemory,
+        trace: WorkflowTrace,
+        interactive: bool,
+    ) -> Optional[WorkflowStatus]:
+        inputs = self._input_snapshots(ready, memory, trace)
+        if len(ready) == 1:
+            results = [self._run_agent_step(ready[0], memory)]
+        else:
+            # ParallelStep: LLM calls are I/O-bound, threads overlap them
+            logger.info(f"Running {len(ready)} steps in parallel: {[s.step_id for s in ready]}")
+            forks = [memory.fork() for _ in ready]
+            with ThreadPoolExecutor(max_workers=len(ready)) as pool:
+                results = list(pool.map(self._run_agent_step, ready, forks))
+            self._merge_wave(ready, results, memory)
+        return self._finish_wave(ready, results, inputs, trace)
+
+    @staticmethod
+    def _cancel_at_gate(step: HumanGateStep, trace: WorkflowTrace) -> WorkflowStatus:
+        logger.info(f"Workflow cancelled at human gate {step.step_id}")
+        trace.complete(WorkflowStatus.CANCELLED)
+        return WorkflowStatus.CANCELLED
+
+    async def _aexecute_workflow(
+        self,
+        workflow: WorkflowDefinition,
+        memory: WorkflowMemory,
+        trace: WorkflowTrace,
+        interactive: bool,
+        parallel: bool,
+        streaming_callback: Optional[StreamingCallback] = None,
+    ) -> WorkflowStatus:
+        """Async execution loop. Returns final workflow status."""
+        if parallel:
+            waves = self._waves[workflow.name]
+        else:
+            waves = self._explicit_waves(workflow)
+
+        for index, wave in enumerate(waves):
+            # ── Check conditions (all evaluated before the wave starts) ───────
+            ready = self._ready_steps(wave, memory, trace)
+            if not ready:
+                continue
+
+            # ── Dispatch on the wave's step type ──────────────────────────────
+            handler = self._adispatch[ready[0].step_type]
+            status = await handler(ready, memory, trace, interactive, streaming_callback)
+            if status is not None:
+                return status
+
+            # ── Let the next wave's agents start their I/O early ──────────────
+            if index + 1 < len(waves):
+                self._prefetch(waves[index + 1], memory)
+
+        trace.complete(WorkflowStatus.COMPLETED)
+        return WorkflowStatus.COMPLETED
+
+    async def _arun_gate_wave(
+        self,
+        ready: list[HumanGateStep],
+        memory: WorkflowMemory,
+        trace: WorkflowTrace,
+        interactive: bool,
+        streaming_callback: Optional[StreamingCallback],
+    ) -> Optional[WorkflowStatus]:
+        step = ready[0]
+        if await self._ahandle_human_gate(step, memory, trace, interactive):
+            return None
+        return self._cancel_at_gate(step, trace)
+
+    async def _arun_agent_wave(
+        self,
+        ready: list[AgentStep],
+        memory: WorkflowMemory,
+        trace: WorkflowTrace,
+        interactive: bool,
+        streaming_callback: Optional[StreamingCallback],
+    ) -> Optional[WorkflowStatus]:
+        """Fan-out / fan-in of a wave's agent steps."""
+        if len(ready) > 1:
+            logger.info(f"Running {len(ready)} steps in parallel: {[s.step_id for s in ready]}")
+        inputs = self._input_snapshots(ready, memory, trace)
+        if len(ready) == 1:
+            results = [await self._aexecute_agent_step(ready[0], memory, streaming_callback)]
+        else:
+            results = await asyncio.gather(
+                *(self._aexecute_agent_step(step, memory.fork(), streaming_callback)
+                  for step in ready)
+            )
+            self._merge_wave(ready, results, memory)
+        return self._finish_wave(ready, results, inputs, trace)
+
+    @staticmethod
+    def _prefetch(wave: list[AgentStep | HumanGateStep], memory: WorkflowMemory) -> None:
+        """Call prefetch() on the wave's agents that support it (async path only)."""
+        for step in wave:
+            prefetch = getattr(getattr(step, "agent", None), "prefetch", None)
+            if prefetch is None:
+                continue
+            try:
+                prefetch(memory)
+            except Exception as e:
+                logger.warning(f"Prefetch for step {step.step_id} failed: {e}")
+
+    def _ready_steps(
+        self,
+        wave: list[AgentStep | HumanGateStep],
+        memory: WorkflowMemory,
+        trace: WorkflowTrace,
+    ) -> list[AgentStep | HumanGateStep]:
+        """Steps of `wave` whose condition holds; the others are recorded as SKIPPED."""
+        ready = []
+        for step in wave:
             if not step.should_run(memory):
                 logger.info(f"Step {step.step_id} SKIPPED (condition=False)")
                 self._record_skipped(step.step_id, memory, trace)
-                continue
+            else:
+                ready.append(step)
+        return ready
 
-            # ── Human gate ────────────────────────────────────────────────────
-            if isinstance(step, HumanGateStep):
-                approved = self._handle_human_gate(step, memory, trace, interactive)
-                if not approved:
-                    logger.info(f"Workflow cancelled at human gate {step.step_id}")
-                    trace.complete(WorkflowStatus.CANCELLED)
-                    return WorkflowStatus.CANCELLED
-                continue
+    @staticmethod
+    def _input_snapshots(
+        ready: list[AgentStep],
+        memory: WorkflowMemory,
+        trace: WorkflowTrace,
+    ) -> list[Mapping]:
+        """
+        Delta input snapshots for a wave, taken before any of its steps run.
+
+        The first step gets the keys written since the previous snapshot,
+        as a LazySnapshot copied only if the trace is read; the rest of the
+        wave saw the same memory, so their delta is empty and based on the
+        first step. See WorkflowTrace.materialize_snapshot.
+        """
+        first = memory.delta_handle(base_step=trace.last_snapshot_step())
+        rest = [{"base_step": ready[0].step_id, "changed": {}} for _ in ready[1:]]
+        return [first, *rest]
+
+    @staticmethod
+    def _merge_wave(ready: list[AgentStep], results: list[StepResult], memory: WorkflowMemory) -> None:
+        """Write the outputs of a forked wave's successful steps back to memory."""
+        for step, result in zip(ready, results):
+            if result.succeeded:
+                memory.set(step.memory_key, result.output)
 
-            # ── Agent step ────────────────────────────────────────────────────
-            result = self._execute_agent_step(step, memory, trace)
+    def _finish_wave(
+        self,
+        ready: list[AgentStep],
+        results: list[StepResult],
+        inputs: list[Mapping],
+        trace: WorkflowTrace,
+    ) -> Optional[WorkflowStatus]:
+        """Record a wave's traces in definition order; FAILED if a required step failed."""
+        for step, result, input_snapshot in zip(ready, results, inputs):
+            self._record_agent_step(step, input_snapshot, result, trace)
 
+        for step, result in zip(ready, results):
             if result.failed and step.required:
                 error = f"Required step '{step.step_id}' failed: {result.error}"
                 logger.error(error)
@@ -147,60 +886,173 @@ class WorkflowEngine:
 
             if result.failed and not step.required:
                 logger.warning(f"Optional step '{step.step_id}' failed — continuing")
+        return None
 
-        trace.complete(WorkflowStatus.COMPLETED)
-        return WorkflowStatus.COMPLETED
-
-    def _execute_agent_step(
+    def _run_agent_step(
         self,
         step: AgentStep,
         memory: WorkflowMemory,
-        trace: WorkflowTrace,
     ) -> StepResult:
-        """Execute an AgentStep with retry logic."""
+        """
+        Execute an AgentStep with retry logic.
+
+        Returns the last attempt's result; the caller records the trace.
+        """
+        key, cached = self._memo_lookup(step, memory)
+        if cached is not None:
+            self._handle_attempt(step, cached, 0, memory)
+            return cached
 
-        input_snapshot = memory.snapshot()
         last_result = None
 
         for attempt in range(step.max_retries):
             if attempt > 0:
                 logger.info(f"Retrying step {step.step_id} (attempt {attempt + 1}/{step.max_retries})")
+                time.sleep(_backoff(step, attempt))
 
             result = step.agent.execute(step.step_id, memory)
-            result.retry_count = attempt
             last_result = result
+            if self._handle_attempt(step, result, attempt, memory):
+                break
 
-            if result.succeeded:
-                # Write output to memory
-                memory.set(step.memory_key, result.output)
-                logger.info(
-                    f"Step {step.step_id} COMPLETED "
-                    f"(confidence={result.confidence:.2f}, "
-                    f"tokens={result.tokens_used}, "
-                    f"{result.duration_ms:.0f}ms)"
-                )
+        self._memo_store(key, last_result)
+        return last_result
+
+    async def _aexecute_agent_step(
+        self,
+        step: AgentStep,
+        memory: WorkflowMemory,
+        streaming_callback: Optional[StreamingCallback] = None,
+    ) -> StepResult:
+        """
+        Async AgentStep execution with retry logic.
+
+        Returns the last attempt's result so the caller can record traces
+        in definition order even when steps finish out of order.
+        """
+        key, cached = self._memo_lookup(step, memory)
+        if cached is not None:
+            self._handle_attempt(step, cached, 0, memory)
+            return cached
+
+        last_result = None
+
+        for attempt in range(step.max_retries):
+            if attempt > 0:
+                logger.info(f"Retrying step {step.step_id} (attempt {attempt + 1}/{step.max_retries})")
+                await asyncio.sleep(_backoff(step, attempt))
+
+            result = await self._acall_agent(step, memory, streaming_callback)
+            last_result = result
+            if self._handle_attempt(step, result, attempt, memory):
                 break
 
-            logger.warning(f"Step {step.step_id} failed (attempt {attempt + 1}): {result.error}")
+        self._memo_store(key, last_result)
+        return last_result
 
-        # Record in trace
-        trace.add_step(StepTrace(
+    @staticmethod
+    async def _acall_agent(
+        step: AgentStep,
+        memory: WorkflowMemory,
+        streaming_callback: Optional[StreamingCallback] = None,
+    ) -> StepResult:
+        """Await agent.aexecute, or run a sync-only agent in a worker thread."""
+        aexecute = getattr(step.agent, "aexecute", None)
+        if streaming_callback is None:
+            if inspect.iscoroutinefunction(aexecute):
+                return await aexecute(step.step_id, memory)
+            return await asyncio.to_thread(step.agent.execute, step.step_id, memory)
+
+        name = getattr(step.agent, "name", step.step_id)
+
+        def on_field(key: str, value: Any) -> None:
+            streaming_callback(name, json_utils.dumps({key: value}), False)
+
+        try:
+            if inspect.iscoroutinefunction(aexecute):
+                return await aexecute(step.step_id, memory, on_field=on_field)
+            return await asyncio.to_thread(step.agent.execute, step.step_id, memory)
+        finally:
+            streaming_callback(name, "", True)
+
+    def _memo_lookup(self, step: AgentStep, memory: WorkflowMemory) -> tuple[Optional[str], Optional[StepResult]]:
+        """(memo key, memoized StepResult or None); (None, None) when memo is off."""
+        if self._memo is None:
+            return None, None
+        agent = step.agent
+        view = memory.view()
+        if step.reads is None:
+            inputs = {k: v for k, v in view.items() if k != step.memory_key}
+        else:
+            inputs = {k: view.get(k) for k in step.reads}
+        payload = json.dumps(
+            {"agent": getattr(agent, "name", ""), "ver": getattr(agent, "version", "0"), "in": inputs},
+            sort_keys=True, default=str, ensure_ascii=False,
+        )
+        key = f"{step.step_id}:{hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()}"
+        try:
+            entry = self._memo.get(key)
+        except Exception as e:
+            logger.warning(f"Step memo read failed: {e}")
+            return key, None
+        if entry is None:
+            return key, None
+        logger.info(f"Step {step.step_id} MEMOIZED")
+        return key, StepResult(
             step_id=step.step_id,
-            agent_name=step.agent.name,
-            status=last_result.status,
-            input_snapshot=input_snapshot,
-            output=last_result.output,
-            confidence=last_result.confidence,
-            duration_ms=last_result.duration_ms,
-            llm_calls=last_result.llm_calls,
-            tokens_used=last_result.tokens_used,
-            error=last_result.error,
-            started_at=last_result.started_at,
-            completed_at=last_result.completed_at,
-            retry_count=last_result.retry_count,
-        ))
+            status=StepStatus.COMPLETED,
+            output=copy_data(entry["output"]),
+            confidence=entry["confidence"],
+            agent_name=getattr(agent, "name", ""),
+            metadata={"memoized": True},
+        )
 
-        return last_result
+    def _memo_store(self, key: Optional[str], result: Optional[StepResult]) -> None:
+        if key is None or result is None or not result.succeeded:
+            return
+        try:
+            self._memo[key] = {"output": copy_data(result.output), "confidence": result.confidence}
+        except Exception as e:
+            logger.warning(f"Step memo write failed: {e}")
+
+    @staticmethod
+    def _handle_attempt(
+        step: AgentStep,
+        result: StepResult,
+        attempt: int,
+        memory: WorkflowMemory,
+    ) -> bool:
+        """Write a successful result to memory. Returns True if the step is done."""
+        result.retry_count = attempt
+
+        if result.succeeded:
+            # Write output to memory
+            memory.set(step.memory_key, result.output)
+            logger.info(
+                f"Step {step.step_id} COMPLETED "
+                f"(confidence={result.confidence:.2f}, "
+                f"tokens={result.tokens_used}, "
+                f"{result.duration_ms:.0f}ms)"
+            )
+            return True
+
+        logger.warning(f"Step {step.step_id} failed (attempt {attempt + 1}): {result.error}")
+        return False
+
+    @staticmethod
+    def _record_agent_step(
+        step: AgentStep,
+        input_snapshot: Mapping,
+        last_result: StepResult,
+        trace: WorkflowTrace,
+    ) -> None:
+        trace.record(
+            step.step_id,
+            _intern(step.agent.name),
+            input_snapshot,
+            last_result,
+            notes="memoized" if last_result.metadata.get("memoized") else "",
+        )
 
     def _handle_human_gate(
         self,
@@ -213,37 +1065,115 @@ class WorkflowEngine:
         Handle human gate step.
         Returns True if approved (proceed), False if rejected (cancel).
         """
+        if not self._open_gate(step, memory, trace, interactive):
+            return True
+
+        timeout = step.timeout_seconds or _GATE_TIMEOUT_S
+        while True:
+            response = self._gate_reader().ask(_GATE_QUESTION, timeout)
+            if response is None:
+                return self._gate_timed_out(step, timeout)
+            decision = self._gate_decision(step, response, trace)
+            if decision is not None:
+                return decision
+
+    async def _ahandle_human_gate(
+        self,
+        step: HumanGateStep,
+        memory: WorkflowMemory,
+        trace: WorkflowTrace,
+        interactive: bool,
+    ) -> bool:
+        """
+        Async counterpart of _handle_human_gate.
+
+        Answers are read on the gate reader thread, so other workflows sharing
+        the event loop keep running while the lawyer decides.
+        """
+        if not self._open_gate(step, memory, trace, interactive):
+            return True
+
+        timeout = step.timeout_seconds or _GATE_TIMEOUT_S
+        while True:
+            response = await self._gate_reader().aask(_GATE_QUESTION, timeout)
+            if response is None:
+                return self._gate_timed_out(step, timeout)
+            decision = self._gate_decision(step, response, trace)
+            if decision is not None:
+                return decision
+
+    def _gate_reader(self) -> _GateReader:
+        """The engine's single stdin reader (created on first use)."""
+        if self._gate_stdin is None:
+            self._gate_stdin = _GateReader()
+        return self._gate_stdin
+
+    @staticmethod
+    def _gate_timed_out(step: HumanGateStep, timeout: float) -> bool:
+        logger.warning(f"Human gate {step.step_id} timed out after {timeout:.0f}s — treated as rejection")
+        return False
+
+    def _open_gate(
+        self,
+        step: HumanGateStep,
+        memory: WorkflowMemory,
+        trace: WorkflowTrace,
+        interactive: bool,
+    ) -> bool:
+        """
+        Count the gate and show its summary.
+
+        Returns False if the gate was auto-approved (no question to ask).
+        """
         trace.human_gates_encountered += 1
 
         if not interactive or not step.require_approval:
             # Auto-approve in non-interactive mode
             trace.human_gates_approved += 1
             logger.info(f"Human gate {step.step_id} AUTO-APPROVED (non-interactive)")
-            return True
+            return False
 
         # Interactive mode: show summary and ask
-        try:
-            summary = step.prompt_fn(memory)
-        except Exception as e:
-            summary = f"[Error building summary: {e}]"
+        summary = self._gate_summary(step, memory)
 
         print("\n" + "=" * 60)
         print(f"HUMAN GATE: {step.description}")
         print("=" * 60)
         print(summary)
         print("=" * 60)
+        return True
 
-        while True:
-            response = input("\nAprovar e continuar? [sim/nao]: ").strip().lower()
-            if response in ("sim", "s", "yes", "y"):
-                trace.human_gates_approved += 1
-                logger.info(f"Human gate {step.step_id} APPROVED by user")
-                return True
-            elif response in ("nao", "não", "n", "no"):
-                logger.info(f"Human gate {step.step_id} REJECTED by user")
-                return False
-            else:
-                print("Por favor, responda 'sim' ou 'nao'")
+    def _gate_summary(self, step: HumanGateStep, memory: WorkflowMemory) -> str:
+        """
+        prompt_fn(memory), reused while memory is unchanged.
+
+        Keyed on the memory object and its version; the entry holds the
+        memory itself, so its id can't be reused by another run while cached.
+        """
+        key = (step.step_id, id(memory), memory.version)
+        cached = self._summaries.get(key)
+        if cached is not None and cached[0] is memory:
+            return cached[1]
+        try:
+            summary = step.prompt_fn(memory)
+        except Exception as e:
+            return f"[Error building summary: {e}]"
+        self._summaries[key] = (memory, summary)
+        return summary
+
+    @staticmethod
+    def _gate_decision(step: HumanGateStep, response: str, trace: WorkflowTrace) -> Optional[bool]:
+        """True/False for an approval/rejection answer; None to ask again."""
+        response = response.strip().lower()
+        if response in ("sim", "s", "yes", "y"):
+            trace.human_gates_approved += 1
+            logger.info(f"Human gate {step.step_id} APPROVED by user")
+            return True
+        elif response in ("nao", "não", "n", "no"):
+            logger.info(f"Human gate {step.step_id} REJECTED by user")
+            return False
+        print("Por favor, responda 'sim' ou 'nao'")
+        return None
 
     def _record_skipped(
         self,
@@ -251,8 +1181,7 @@ class WorkflowEngine:
         memory: WorkflowMemory,
         trace: WorkflowTrace,
     ) -> None:
-        import time
-        from datetime import datetime
+        now = utc_now_iso()
         trace.add_step(StepTrace(
             step_id=step_id,
             agent_name="",
@@ -264,18 +1193,12 @@ class WorkflowEngine:
             llm_calls=0,
             tokens_used=0,
             error=None,
-            started_at=datetime.now().isoformat(),
-            completed_at=datetime.now().isoformat(),
+            started_at=now,
+            completed_at=now,
             notes="Condition evaluated to False",
         ))
 
     @staticmethod
-    def _build_final_output(memory: WorkflowMemory) -> dict:
-        """Extract the final deliverables from memory."""
-        output = {}
-        key_outputs = ["classification", "pesquisa", "analise", "minuta", "revisao"]
-        for key in key_outputs:
-            val = memory.get(key)
-            if val is not None:
-                output[key] = val
-        return output
+    def _build_final_output(memory: WorkflowMemory, keys: tuple[str, ...] = _KEY_OUTPUTS) -> dict:
+        """Extract the final deliverables (the given memory keys that are set)."""
+        return {key: val for key in keys if (val := memory.get(key)) is not None}
@@ -8,33 +8,122 @@ Step types:
   AgentStep      → runs a BaseAgent, writes output to memory key
   ConditionalStep → evaluates a condition from memory, routes to branches
   HumanGateStep  → pauses execution and waits for human input
-  ParallelStep   → runs multiple AgentSteps concurrently
+  ParallelStep   → runs multiple independent AgentSteps concurrently
 
 Execution policy (on each AgentStep):
   max_retries: how many times to re-run on FAILED status
+  retry_backoff / retry_backoff_cap: capped exponential wait between attempts
   required: if True, workflow fails if this step fails after retries
   condition_fn: callable(memory) → bool; step is SKIPPED if returns False
   memory_key: where to write the step output in WorkflowMemory
+  reads: memory keys the agent and its condition read; None = unknown.
+         Declared reads let the engine run independent steps concurrently.
 
 Design: steps are pure data structures — they don't know about other steps.
 The WorkflowEngine resolves execution order and handles routing.
+Steps and definitions are slotted dataclasses: no per-instance __dict__,
+so attributes can't be attached at runtime — declare a field instead.
 
-Step conditions are Python callables that take WorkflowMemory and return bool.
-This keeps conditions testable and composable without a DSL.
+Step conditions are callables that take WorkflowMemory and return bool.
+The common shapes — a nested value compared with a constant, a key being
+present, and any/all combinations — are built as Condition objects:
+plain data that can be printed, compared and inspected (Condition.keys
+lists the memory keys read). Any other callable still works.
 
 Example:
   # Only research if classification confidence is high enough
-  condition=lambda m: m.get_nested('classification', 'confidence') or 0 > 0.7
+  condition=Condition.nested_gte(("classification", "confidence"), 0.7)
 """
 from __future__ import annotations
 
+import logging
+import operator
+import weakref
 from dataclasses import dataclass, field
-from typing import Optional, Callable, Any
+from typing import Iterable, Iterator, Optional, Callable, Any, Sequence
 from enum import Enum
 
 from src.agents.base_agent import BaseAgent
 from src.utils.workflow_models import WorkflowMemory
 
+logger = logging.getLogger(__name__)
+
+_COMPARE = {
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "eq": operator.eq,
+    "in": lambda value, options: value in options,
+}
+
+
+@dataclass(frozen=True)
+class Condition:
+    """
+    Declarative step condition over WorkflowMemory.
+
+    Leaf conditions read memory.get_nested(*path); a missing or None
+    value is replaced by `default` before comparing. Composite conditions
+    ("any"/"all") short-circuit over `terms`. Build them with the
+    classmethods rather than the constructor.
+    """
+    op: str
+    path: tuple[str, ...] = ()
+    value: Any = None
+    default: Any = None
+    terms: tuple["Condition", ...] = ()
+
+    def __post_init__(self):
+        if self.op not in _COMPARE and self.op not in ("has", "any", "all"):
+            raise ValueError(f"Unknown condition op {self.op!r}")
+
+    @classmethod
+    def nested_gte(cls, path: tuple[str, ...], threshold: float, default: float = 0) -> "Condition":
+        return cls("gte", tuple(path), threshold, default)
+
+    @classmethod
+    def nested_lt(cls, path: tuple[str, ...], threshold: float, default: float = 0) -> "Condition":
+        return cls("lt", tuple(path), threshold, default)
+
+    @classmethod
+    def nested_eq(cls, path: tuple[str, ...], value: Any, default: Any = None) -> "Condition":
+        return cls("eq", tuple(path), value, default)
+
+    @classmethod
+    def nested_in(cls, path: tuple[str, ...], values: Iterable, default: Any = None) -> "Condition":
+        return cls("in", tuple(path), frozenset(values), default)
+
+    @classmethod
+    def has(cls, key: str) -> "Condition":
+        return cls("has", (key,))
+
+    @classmethod
+    def any_of(cls, *terms: "Condition") -> "Condition":
+        return cls("any", terms=terms)
+
+    @classmethod
+    def all_of(cls, *terms: "Condition") -> "Condition":
+        return cls("all", terms=terms)
+
+    @property
+    def keys(self) -> frozenset[str]:
+        """Top-level memory keys this condition reads."""
+        if self.terms:
+            return frozenset().union(*(t.keys for t in self.terms))
+        return frozenset(self.path[:1])
+
+    def __call__(self, memory: WorkflowMemory) -> bool:
+        op = self.op
+        if op == "any":
+            return any(t(memory) for t in self.terms)
+        if op == "all":
+            return all(t(memory) for t in self.terms)
+        if op == "has":
+            return self.path[0] in memory
+        value = memory.get_nested(*self.path)
+        if value is None:
+            value = self.default
+        return _COMPARE[op](value, self.value)
+
 
 class StepType(str, Enum):
     AGENT = "agent"
@@ -43,8 +132,37 @@ class StepType(str, Enum):
     PARALLEL = "parallel"
 
 
-@dataclass
-class AgentStep:
+class _Conditional:
+    """
+    should_run() for steps with an optional `condition`.
+
+    The result is kept with a weak reference to the memory and its
+    version, so asking again before memory changes (e.g. the engine and a
+    caller both checking) does not re-run the condition, and a step in a
+    registered workflow does not keep a finished run's memory alive. A
+    condition that raises is logged and counts as True.
+    """
+    __slots__ = ()
+
+    def should_run(self, memory: WorkflowMemory) -> bool:
+        """Evaluate whether this step should run."""
+        if self.condition is None:
+            return True
+        version = memory.version
+        last = self._last
+        if last is not None and last[0]() is memory and last[1] == version:
+            return last[2]
+        try:
+            result = bool(self.condition(memory))
+        except Exception as e:
+            logger.warning(f"Condition of step {self.step_id} failed ({e}) — running the step")
+            result = True  # Default to running if condition errors
+        self._last = (weakref.ref(memory), version, result)
+        return result
+
+
+@dataclass(slots=True)
+class AgentStep(_Conditional):
     """
     A workflow step that executes a BaseAgent.
     """
@@ -53,26 +171,22 @@ class AgentStep:
     memory_key: str                          # Where to write output in WorkflowMemory
     description: str = ""
     max_retries: int = 1                     # Total attempts (1 = no retry)
+    retry_backoff: float = 0.5               # Seconds before the first retry (doubles each time)
+    retry_backoff_cap: float = 30.0          # Upper bound of one backoff wait
     required: bool = True                    # Fail workflow if this step fails?
     condition: Optional[Callable[[WorkflowMemory], bool]] = None
     timeout_seconds: Optional[float] = None
+    reads: Optional[tuple[str, ...]] = None  # Memory keys read (None = depends on everything)
     step_type: StepType = StepType.AGENT
-
-    def should_run(self, memory: WorkflowMemory) -> bool:
-        """Evaluate whether this step should run."""
-        if self.condition is None:
-            return True
-        try:
-            return bool(self.condition(memory))
-        except Exception:
-            return True  # Default to running if condition errors
+    # (weakref to memory, memory.version, result) of the last should_run()
+    _last: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
 
     def __repr__(self) -> str:
         return f"AgentStep(id={self.step_id!r}, agent={self.agent.name!r})"
 
 
-@dataclass
-class HumanGateStep:
+@dataclass(slots=True)
+class HumanGateStep(_Conditional):
     """
     A workflow step that pauses execution for human review/approval.
 
@@ -84,47 +198,92 @@ class HumanGateStep:
     require_approval: bool = True                  # If False, auto-approve
     description: str = "Human review gate"
     condition: Optional[Callable[[WorkflowMemory], bool]] = None
+    timeout_seconds: Optional[float] = None       # Unanswered gate → rejected (engine default: 1h)
     step_type: StepType = StepType.HUMAN_GATE
-
-    def should_run(self, memory: WorkflowMemory) -> bool:
-        if self.condition is None:
-            return True
-        try:
-            return bool(self.condition(memory))
-        except Exception:
-            return True
+    _last: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
 
     def __repr__(self) -> str:
         return f"HumanGateStep(id={self.step_id!r})"
 
 
-@dataclass
+@dataclass(slots=True)
+class ParallelStep:
+    """
+    A group of AgentSteps that do not depend on each other.
+
+    The engine starts all substeps together — asyncio.gather in arun(),
+    a thread pool in run() — and waits for the whole group before moving
+    on. Substeps must not read each other's outputs and each writes its
+    own memory_key; their conditions are evaluated when the group starts.
+    Traces are recorded in substep order, not completion order.
+    """
+    step_id: str
+    steps: Sequence[AgentStep]
+    description: str = ""
+    step_type: StepType = StepType.PARALLEL
+
+    def __repr__(self) -> str:
+        return f"ParallelStep(id={self.step_id!r}, steps={[s.step_id for s in self.steps]})"
+
+
+@dataclass(slots=True)
 class WorkflowDefinition:
     """
     A complete workflow definition: name + ordered list of steps.
 
     Steps are executed in order. Conditional branching is handled
-    via the condition parameter on each step.
+    via the condition parameter on each step. Independent AgentSteps
+    may be wrapped in a ParallelStep to run concurrently.
 
-    The engine can also handle parallel execution if steps are
-    wrapped in ParallelStep (not implemented in this version,
-    but the step_type field is ready for extension).
+    get_step() and step_ids() see through ParallelSteps to the AgentSteps
+    inside; `steps` itself keeps the top-level structure. Both use an
+    id → step index built at construction, which also rejects duplicate
+    step ids (ValueError).
     """
     name: str
-    steps: list[AgentStep | HumanGateStep]
+    steps: Sequence[AgentStep | HumanGateStep | ParallelStep]  # tuple once registered
     description: str = ""
     version: str = "1.0"
     metadata: dict = field(default_factory=dict)
+    _index: dict = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._build_index()
+
+    def _build_index(self) -> None:
+        self._index = {}
+        for step in self.iter_steps():
+            if step.step_id in self._index:
+                raise ValueError(f"Duplicate step id {step.step_id!r} in workflow {self.name!r}")
+            self._index[step.step_id] = step
+
+    def freeze(self) -> None:
+        """
+        Turn `steps` (and ParallelStep groups) into tuples and rebuild the index.
+
+        Called by WorkflowEngine.register: once registered, the step
+        structure can't change under a running workflow.
+        """
+        for step in self.steps:
+            if step.step_type is StepType.PARALLEL:
+                step.steps = tuple(step.steps)
+        self.steps = tuple(self.steps)
+        self._build_index()
+
+    def iter_steps(self) -> Iterator[AgentStep | HumanGateStep]:
+        """Executable steps in order, with ParallelSteps flattened."""
+        for step in self.steps:
+            if step.step_type is StepType.PARALLEL:
+                yield from step.steps
+            else:
+                yield step
 
     def get_step(self, step_id: str) -> Optional[AgentStep | HumanGateStep]:
         """Find a step by its ID."""
-        for step in self.steps:
-            if step.step_id == step_id:
-                return step
-        return None
+        return self._index.get(step_id)
 
     def step_ids(self) -> list[str]:
-        return [s.step_id for s in self.steps]
+        return list(self._index)
 
     def __repr__(self) -> str:
         return f"WorkflowDefinition(name={self.name!r}, steps={self.step_ids()})"
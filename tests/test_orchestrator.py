@@ -9,11 +9,19 @@ Coverage:
   5. ReviewerAgent: issue normalization, approval logic
   6. WorkflowDefinition: step ordering, condition evaluation
   7. WorkflowEngine: full pipeline in mock mode (no LLM)
+
+Tests are plain functions named test_<area>_..., grouped by section;
+select one area with e.g. `pytest -k engine`.
 """
 import sys
 import json
 import time
+import asyncio
+import weakref
+from dataclasses import replace
+from datetime import date, datetime
 from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -24,488 +32,1710 @@ from src.utils.workflow_models import (
     WorkflowMemory, WorkflowTrace, StepTrace, StepResult,
     StepStatus, WorkflowStatus, WorkflowResult
 )
-from src.agents.base_agent import BaseAgent, AgentLLMClient
+from src.agents.base_agent import BaseAgent, AgentLLMClient, cached_system
+from src.utils.json_stream import TopLevelJSONStream
+from src.utils import json_utils, jit
+from src.utils.llm_cache import LRUCache, SQLiteCache, prompt_key
+from src.utils.prompt_compress import clip_by_tokens, dedupe_ordered
 from src.agents.classifier_agent import ClassifierAgent
-from src.agents.analyst_agent import AnalystAgent
+from src.agents.analyst_agent import AnalystAgent, _normalize_numeric
+from src.agents.drafter_agent import DrafterDireitoAgent, DrafterFatosAgent
+from src.agents.researcher_agent import ResearcherAgent
 from src.agents.reviewer_agent import ReviewerAgent
-from src.workflows.workflow_steps import AgentStep, HumanGateStep, WorkflowDefinition
+from src.workflows.workflow_steps import (
+    AgentStep, Condition, HumanGateStep, ParallelStep, WorkflowDefinition
+)
 from src.workflows.workflow_engine import WorkflowEngine
 from src.workflows.definitions import (
     triagem_rapida_workflow, recurso_ordinario_workflow, peticao_inicial_workflow
 )
 
 
+# Trace helpers only seed timestamps; no test asserts on their value.
+_FIXED_TS = datetime(2024, 1, 1).isoformat()
+
+# Agents are stateless between calls; build each once for the whole module.
+CLASSIFIER = ClassifierAgent()
+ANALYST = AnalystAgent()
+REVIEWER = ReviewerAgent()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _warm_jit():
+    """Compile maybe_njit helpers up front (no-op unless LWO_JIT=1 with numba)."""
+    jit.warmup([(_normalize_numeric, (0.5, 0.5))])
+
+
+@pytest.fixture
+def engine() -> WorkflowEngine:
+    """Fresh engine per test, so tests share no state and run under pytest -n auto."""
+    return WorkflowEngine()
+
+
+@pytest.fixture
+def empty_memory() -> WorkflowMemory:
+    return WorkflowMemory()
+
+
+@pytest.fixture(scope="session")
+def workflows() -> dict[str, WorkflowDefinition]:
+    """Built-in definitions, built once; tests only read them."""
+    return {
+        "triagem": triagem_rapida_workflow(),
+        "peticao": peticao_inicial_workflow(),
+        "recurso": recurso_ordinario_workflow(),
+    }
+
+
 # ── WorkflowMemory Tests ──────────────────────────────────────────────────────
 
-class TestWorkflowMemory:
-    def test_set_and_get(self):
-        m = WorkflowMemory()
-        m.set("key", {"value": 42})
-        assert m.get("key") == {"value": 42}
-
-    def test_get_default(self):
-        m = WorkflowMemory()
-        assert m.get("missing", "default") == "default"
-        assert m.get("missing") is None
-
-    def test_update(self):
-        m = WorkflowMemory()
-        m.update({"a": 1, "b": 2})
-        assert m.get("a") == 1
-        assert m.get("b") == 2
-
-    def test_get_nested(self):
-        m = WorkflowMemory()
-        m.set("classification", {"area": "trabalhista", "confidence": 0.92})
-        assert m.get_nested("classification", "area") == "trabalhista"
-        assert m.get_nested("classification", "confidence") == 0.92
-        assert m.get_nested("classification", "missing", default="x") == "x"
-        assert m.get_nested("missing", "key") is None
-
-    def test_snapshot_is_deep_copy(self):
-        m = WorkflowMemory()
-        m.set("data", {"list": [1, 2, 3]})
-        snap = m.snapshot()
-        snap["data"]["list"].append(4)
-        assert m.get("data")["list"] == [1, 2, 3]  # Original unmodified
-
-    def test_contains(self):
-        m = WorkflowMemory()
-        m.set("exists", True)
-        assert "exists" in m
-        assert "missing" not in m
-
-    def test_to_dict(self):
-        m = WorkflowMemory()
-        m.update({"a": 1, "b": 2})
-        d = m.to_dict()
-        assert d == {"a": 1, "b": 2}
+@pytest.mark.parametrize("key,value,path,expected", [
+    ("key", {"value": 42}, ("key",), {"value": 42}),
+    ("classification", {"area": "trabalhista", "confidence": 0.92}, ("classification", "area"), "trabalhista"),
+    ("classification", {"area": "trabalhista", "confidence": 0.92}, ("classification", "confidence"), 0.92),
+])
+def test_memory_set_get(empty_memory, key, value, path, expected):
+    empty_memory.set(key, value)
+    assert empty_memory.get_nested(*path) == expected
+    assert empty_memory.get(key) == value
+
+
+def test_memory_get_default(empty_memory):
+    assert empty_memory.get("missing", "default") == "default"
+    assert empty_memory.get("missing") is None
+
+
+def test_memory_update(empty_memory):
+    m = empty_memory
+    m.update({"a": 1, "b": 2})
+    assert m.get("a") == 1
+    assert m.get("b") == 2
+
+
+def test_memory_get_nested_defaults(empty_memory):
+    m = empty_memory
+    m.set("classification", {"area": "trabalhista", "confidence": 0.92})
+    assert m.get_nested("classification", "missing", default="x") == "x"
+    assert m.get_nested("missing", "key") is None
+    m.set("resumo", "texto")
+    assert m.get_nested("resumo", "area", default="x") == "x"  # not a mapping
+
+
+def test_memory_snapshot_is_deep_copy():
+    m = WorkflowMemory()
+    m.set("data", {"list": [1, 2, 3]})
+    snap = m.snapshot()
+    assert type(snap) is dict
+    snap["data"]["list"].append(4)
+    assert m.get("data")["list"] == [1, 2, 3]  # Original unmodified
+
+
+def test_memory_snapshot_avoids_deepcopy(monkeypatch):
+    from src.utils import workflow_models
+
+    def fail(*args, **kwargs):
+        raise AssertionError("deepcopy called")
+
+    monkeypatch.setattr(workflow_models.copy, "deepcopy", fail)
+    state = {f"k{i}": {"n": i, "tags": ["a"]} for i in range(100)}
+    m = WorkflowMemory(_store=state)
+    snap = m.snapshot()
+    assert snap == state and snap["k0"] is not state["k0"]
+
+
+def test_memory_snapshot_keeps_python_types():
+    state = {"data": {1: "a"}, "status": StepStatus.COMPLETED, "prazo": date(2024, 1, 1),
+             "partes": ("A", "B"), "score": float("inf")}
+    snap = WorkflowMemory(_store=state).snapshot()
+    assert snap == state
+    assert type(snap["status"]) is StepStatus and list(snap["data"]) == [1]
+    m = WorkflowMemory(_store={"data": {"list": [1, 2]}, "fn": lambda: None})
+    assert m.snapshot()["data"] is not m.get("data")  # lambda → deepcopy fallback
+
+
+def test_memory_snapshot_falls_back_for_non_json_values():
+    marker = object()
+    m = WorkflowMemory(_store={"anexos": [marker], "partes": ("A", "B")})
+    snap = m.snapshot()
+    assert snap["anexos"] is not m.get("anexos")
+    assert snap["partes"] == ("A", "B")  # deepcopy keeps the tuple
+
+    m = WorkflowMemory(_store={"partes": ("A", "B")})
+    assert json_utils.loads(m.snapshot_bytes()) == {"partes": ["A", "B"]}
+
+
+def test_memory_contains(empty_memory):
+    m = empty_memory
+    m.set("exists", True)
+    assert "exists" in m
+    assert "missing" not in m
+
+
+def test_memory_to_dict(empty_memory):
+    m = empty_memory
+    m.update({"a": 1, "b": 2})
+    d = m.to_dict()
+    assert d == {"a": 1, "b": 2}
+
+
+def test_memory_view_is_read_only_and_live():
+    mem = WorkflowMemory()
+    mem.set("caso", "x")
+    view = mem.view()
+    with pytest.raises(TypeError):
+        view["caso"] = "y"
+    mem.set("analise", {})
+    assert "analise" in view
+
+
+def test_memory_copy_at_rebuilds_earlier_versions():
+    mem = WorkflowMemory(_store={"caso": "x"})
+    mem.set("classification", {"area": "civil"})
+    v1 = mem.version
+    mem.set("classification", {"area": "trabalhista"})
+    mem.update({"pesquisa": {"sumulas": []}})
+    assert mem.version == 3
+    assert mem.copy_at(0) == {"caso": "x"}
+    assert mem.copy_at(v1) == {"caso": "x", "classification": {"area": "civil"}}
+    assert mem.copy_at(mem.version) == mem.to_dict()
+    with pytest.raises(ValueError):
+        mem.copy_at(4)
+
+
+def test_memory_delta_handle_resolves_lazily_at_its_version():
+    mem = WorkflowMemory(_store={"caso": "x"})
+    first = mem.delta_handle()
+    mem.set("analise", {"p": 0.5})
+    second = mem.delta_handle(base_step="classify")
+    mem.set("analise", {"p": 0.9})  # written after both handles
+    assert "LazySnapshot" in repr(second)
+    assert first == {"base_step": None, "changed": {"caso": "x"}}
+    assert second == {"base_step": "classify", "changed": {"analise": {"p": 0.5}}}
+    assert second["changed"]["analise"] is not mem.get("analise")
+    assert mem.snapshot_delta() == {"analise": {"p": 0.9}}
 
 
 # ── WorkflowTrace Tests ───────────────────────────────────────────────────────
 
-class TestWorkflowTrace:
-    def _make_step_trace(self, step_id: str, llm_calls=1, tokens=100) -> StepTrace:
-        from datetime import datetime
-        return StepTrace(
-            step_id=step_id,
-            agent_name="TestAgent",
-            status=StepStatus.COMPLETED,
-            input_snapshot={},
-            output={"result": "ok"},
-            confidence=0.9,
-            duration_ms=500.0,
-            llm_calls=llm_calls,
-            tokens_used=tokens,
-            error=None,
-            started_at=datetime.now().isoformat(),
-            completed_at=datetime.now().isoformat(),
+def _make_step_trace(step_id: str, llm_calls=1, tokens=100) -> StepTrace:
+    return StepTrace(
+        step_id=step_id,
+        agent_name="TestAgent",
+        status=StepStatus.COMPLETED,
+        input_snapshot={},
+        output={"result": "ok"},
+        confidence=0.9,
+        duration_ms=500.0,
+        llm_calls=llm_calls,
+        tokens_used=tokens,
+        error=None,
+        started_at=_FIXED_TS,
+        completed_at=_FIXED_TS,
+    )
+
+
+def test_trace_add_step_accumulates_totals():
+    trace = WorkflowTrace(workflow_name="test")
+    trace.add_step(_make_step_trace("step1", llm_calls=1, tokens=100))
+    trace.add_step(_make_step_trace("step2", llm_calls=2, tokens=200))
+    assert trace.total_llm_calls == 3
+    assert trace.total_tokens_used == 300
+    assert len(trace.steps) == 2
+
+
+def test_trace_recorded_results_materialize_in_order():
+    trace = WorkflowTrace(workflow_name="test")
+    result = StepResult(step_id="a", status=StepStatus.COMPLETED, output={"x": 1},
+                        llm_calls=1, tokens_used=40, duration_ns=2_000_000, agent_name="A")
+    trace.record("a", "A", {"base_step": None, "changed": {"caso": "x"}}, result)
+    assert trace.steps == [] and trace.total_tokens_used == 40
+    assert trace.last_snapshot_step() == "a"
+    trace.add_step(_make_step_trace("b"))
+    trace.complete(WorkflowStatus.COMPLETED)
+    assert [s.step_id for s in trace.steps] == ["a", "b"]
+    assert trace.steps[0].started_at == result.started_at
+    assert trace.to_dict()["steps"][0]["output"] == {"x": 1}
+
+
+def test_trace_complete_sets_status():
+    trace = WorkflowTrace(workflow_name="test")
+    trace.complete(WorkflowStatus.COMPLETED)
+    assert trace.status == WorkflowStatus.COMPLETED
+    assert trace.completed_at is not None
+
+
+def test_trace_to_json_is_valid_json():
+    trace = WorkflowTrace(workflow_name="test")
+    trace.add_step(_make_step_trace("step1"))
+    json.loads(trace.to_json())
+
+
+def test_trace_structure():
+    trace = WorkflowTrace(workflow_name="test")
+    trace.add_step(_make_step_trace("step1"))
+    trace.complete(WorkflowStatus.COMPLETED)
+    d = trace.to_dict()
+    assert d["workflow_name"] == "test"
+    assert len(d["steps"]) == 1
+    assert d["status"] == "completed"
+
+
+def test_trace_to_dict_rows_follow_steps():
+    trace = WorkflowTrace(workflow_name="test")
+    trace.add_step(_make_step_trace("step1"))
+    trace.steps.append(_make_step_trace("step2"))  # bypasses add_step
+    assert [s["step_id"] for s in trace.to_dict()["steps"]] == ["step1", "step2"]
+
+
+def test_trace_step_times_are_utc_and_derived_from_duration():
+    result = StepResult(step_id="s", status=StepStatus.COMPLETED,
+                        duration_ns=2_500_000_000, completed_ts=1_700_000_000.0)
+    assert result.completed_at == "2023-11-14T22:13:20+00:00"
+    started = datetime.fromisoformat(result.started_at)
+    assert (datetime.fromisoformat(result.completed_at) - started).total_seconds() == 2.5
+    assert WorkflowTrace().started_at.endswith("+00:00")
+    legacy = StepResult(step_id="x", status=StepStatus.COMPLETED,
+                        duration_ms=1500.0, completed_ts=1_700_000_000.0)
+    assert legacy.started_at == "2023-11-14T22:13:18.500000+00:00"
+
+
+# ── Agent _parse_output Tests ─────────────────────────────────────────────────
+
+# Each case: (agent, raw LLM JSON, check(output, confidence) -> bool)
+PARSE_OUTPUT_CASES = {
+    "classifier_valid": (CLASSIFIER, {
+        "area": "trabalhista",
+        "subarea": "rescisao_contratual",
+        "urgencia": "media",
+        "procedimento": "rito_ordinario",
+        "complexidade": "medio",
+        "partes": {"requerente": "João", "requerido": "Empresa"},
+        "fatos_principais": ["demissão sem justa causa"],
+        "confidence": 0.92,
+    }, lambda out, conf: (out["area"], out["urgencia"], conf) == ("trabalhista", "media", 0.92)),
+    "classifier_invalid_area_defaults_to_outros": (CLASSIFIER, {
+        "area": "invalido", "urgencia": "media", "complexidade": "medio",
+        "procedimento": "a_definir", "confidence": 0.9,
+    }, lambda out, conf: out["area"] == "outros" and conf < 0.9),  # Penalized
+    "classifier_invalid_urgencia_defaults_to_media": (CLASSIFIER, {
+        "area": "civil", "urgencia": "xyzzy", "complexidade": "medio",
+        "procedimento": "a_definir", "confidence": 0.8,
+    }, lambda out, conf: out["urgencia"] == "media"),
+    "classifier_confidence_clamped": (CLASSIFIER, {
+        "area": "civil", "urgencia": "media", "complexidade": "medio",
+        "procedimento": "a_definir", "confidence": 1.5,
+    }, lambda out, conf: conf <= 1.0),
+    "classifier_missing_fields_take_defaults_without_penalty": (
+        CLASSIFIER, {"confidence": 0.8, "complexidade": "?"},
+        lambda out, conf: (out["area"], out["urgencia"], out["complexidade"], out["procedimento"])
+        == ("outros", "media", "medio", "a_definir") and conf == pytest.approx(0.8),
+    ),
+    "analyst_high_probability_favoravel": (
+        ANALYST, {"probabilidade_exito": 0.75, "riscos": [], "confidence": 0.85},
+        lambda out, conf: out["categoria_exito"] == "favoravel",
+    ),
+    "analyst_low_probability_desfavoravel": (
+        ANALYST, {"probabilidade_exito": 0.25, "riscos": [], "confidence": 0.8},
+        lambda out, conf: out["categoria_exito"] == "desfavoravel",
+    ),
+    **{
+        f"analyst_categoria_boundary_{prob}": (
+            ANALYST, {"probabilidade_exito": prob, "riscos": []},
+            lambda out, conf, expected=expected: out["categoria_exito"] == expected,
         )
+        for prob, expected in ((0.39, "desfavoravel"), (0.4, "incerto"), (0.59, "incerto"), (0.6, "favoravel"))
+    },
+    "analyst_explicit_categoria_overrides": (
+        ANALYST, {"probabilidade_exito": 0.9, "categoria_exito": "incerto", "riscos": []},
+        lambda out, conf: out["categoria_exito"] == "incerto",
+    ),
+    "analyst_risk_normalization": (ANALYST, {
+        "probabilidade_exito": 0.6,
+        "riscos": [
+            {"tipo": "prescricao", "descricao": "prazo vencendo", "severidade": "INVALIDA"},
+            {"tipo": "prova", "descricao": "falta de documentos", "severidade": "alta"},
+        ],
+        "confidence": 0.8,
+    }, lambda out, conf: [r["severidade"] for r in out["riscos"]] == ["media", "alta"]),  # Invalid → media
+    "reviewer_high_severity_forces_not_approved": (REVIEWER, {
+        "aprovado": True,  # Agent said approved...
+        "score_qualidade": 0.9,
+        "issues": [
+            {"tipo": "citacao", "descricao": "art. 999 não existe", "severidade": "alta"}
+        ],
+        "recomendacao": "aprovar",
+        "confidence": 0.85,
+    }, lambda out, conf: out["aprovado"] is False),  # ...but a high-severity issue overrides it
+    "reviewer_low_score_triggers_revision": (REVIEWER, {
+        "aprovado": False,
+        "score_qualidade": 0.55,
+        "issues": [{"tipo": "completude", "descricao": "falta pedido", "severidade": "media"}],
+        "recomendacao": "aprovar",  # Inconsistent — should be overridden
+        "confidence": 0.8,
+    }, lambda out, conf: out["recomendacao"] in ("revisar", "rejeitar")),
+    "reviewer_clean_review_approved": (REVIEWER, {
+        "aprovado": True,
+        "score_qualidade": 0.88,
+        "issues": [],
+        "sugestoes": ["melhorar introdução"],
+        "secoes_ok": ["dos_fatos", "do_direito", "dos_pedidos"],
+        "secoes_problematicas": [],
+        "recomendacao": "aprovar",
+        "confidence": 0.9,
+    }, lambda out, conf: out["aprovado"] is True and out["recomendacao"] == "aprovar" and conf == 0.9),
+}
+
+
+@pytest.mark.parametrize("agent,raw,check", PARSE_OUTPUT_CASES.values(), ids=PARSE_OUTPUT_CASES.keys())
+def test_parse_output(agent, raw, check):
+    output, confidence = agent._parse_output(raw)
+    assert check(output, confidence), output
+
+
+@pytest.mark.parametrize("prob,conf,expected", [
+    (0.75, 0.85, (2, 0.75, 0.85)),
+    (0.4, 1.5, (1, 0.4, 1.0)),
+    (-0.2, 0.5, (0, 0.0, 0.5)),
+])
+def test_analyst_numeric_kernel(prob, conf, expected):
+    # Same oracle for the plain and LWO_JIT=1 (numba) builds
+    assert _normalize_numeric(prob, conf) == expected
+
+
+def test_analyst_numeric_kernel_compiles():
+    numba = pytest.importorskip("numba")
+    kernel = getattr(_normalize_numeric, "py_func", _normalize_numeric)
+    assert numba.njit(kernel)(0.75, 0.85) == (2, 0.75, 0.85)
+
+
+# ── DrafterAgent Tests ────────────────────────────────────────────────────────
+
+def test_drafter_direito_pass_keeps_drafted_fatos():
+    memory = WorkflowMemory()
+    memory.set("minuta_fatos", {"qualificacao": "q", "dos_fatos": "fatos já redigidos"})
+    agent = DrafterDireitoAgent(llm_client=FakeLLMClient({
+        "do_direito": "direito", "dos_pedidos": "1. pedido", "confidence": 0.9,
+    }))
+    _, user = agent._build_prompt(memory)
+    assert "fatos já redigidos" in user
+
+    result = agent.execute("draft", memory)
+    assert result.output["dos_fatos"] == "fatos já redigidos"
+    assert result.output["do_direito"] == "direito"
+    assert result.confidence == pytest.approx(0.9)
+
+
+def test_drafter_direito_pass_drafts_fatos_when_pass_one_failed():
+    memory = WorkflowMemory()
+    memory.update({"caso": "Demissão sem justa causa após 5 anos",
+                   "classification": {"area": "trabalhista", "partes": {"requerente": "Maria"}}})
+    agent = DrafterDireitoAgent(llm_client=FakeLLMClient({
+        "qualificacao": "Maria, brasileira", "dos_fatos": "A autora foi demitida",
+        "do_direito": "direito", "dos_pedidos": "1. pedido", "confidence": 0.9,
+    }))
+    _, user = agent._build_prompt(memory)
+    assert "Demissão sem justa causa após 5 anos" in user and "Maria" in user
+
+    result = agent.execute("draft", memory)
+    assert result.output["qualificacao"] == "Maria, brasileira"
+    assert result.output["dos_fatos"] == "A autora foi demitida"
+    assert result.output["do_direito"] == "direito"
+
+
+def test_drafter_fatos_pass_only_needs_classification():
+    memory = WorkflowMemory()
+    memory.update({"caso": "Demissão sem justa causa", "classification": {"area": "trabalhista"}})
+    _, user = DrafterFatosAgent()._build_prompt(memory)
+    assert "Demissão sem justa causa" in user
+    assert "ESTRATÉGIA" not in user
+
+
+# ── Prompt Compression Tests ──────────────────────────────────────────────────
+
+def test_compress_completion_budget_caps_and_shrinks():
+    from src.utils.prompt_compress import completion_budget, CONTEXT_TOKENS
+    assert completion_budget("sys", "caso curto", cap=2000) == 2000
+    limit = CONTEXT_TOKENS["gpt-4o-mini"]
+    huge = "palavra " * limit
+    assert completion_budget("sys", huge, cap=2000) == 1
+
+
+def test_compress_dedupe_keeps_first_seen_order():
+    items = ["Súmula 331 TST", "art. 7° CF/88", "súmula  331 tst", "art. 483 CLT"]
+    assert dedupe_ordered(items) == ["Súmula 331 TST", "art. 7° CF/88", "art. 483 CLT"]
+
+
+def test_compress_dedupe_excludes_other_section():
+    assert dedupe_ordered(["Súmula 85 TST", "OJ 394"], exclude=["súmula 85 tst"]) == ["OJ 394"]
+
+
+def test_compress_clip_by_tokens_short_text_untouched():
+    assert clip_by_tokens("texto curto", 100) == "texto curto"
+
 
-    def test_add_step_accumulates_totals(self):
-        trace = WorkflowTrace(workflow_name="test")
-        trace.add_step(self._make_step_trace("step1", llm_calls=1, tokens=100))
-        trace.add_step(self._make_step_trace("step2", llm_calls=2, tokens=200))
-        assert trace.total_llm_calls == 3
-        assert trace.total_tokens_used == 300
-        assert len(trace.steps) == 2
-
-    def test_complete_sets_status(self):
-        trace = WorkflowTrace(workflow_name="test")
-        trace.complete(WorkflowStatus.COMPLETED)
-        assert trace.status == WorkflowStatus.COMPLETED
-        assert trace.completed_at is not None
-
-    def test_to_json_valid(self):
-        trace = WorkflowTrace(workflow_name="test")
-        trace.add_step(self._make_step_trace("step1"))
-        trace.complete(WorkflowStatus.COMPLETED)
-        parsed = json.loads(trace.to_json())
-        assert parsed["workflow_name"] == "test"
-        assert len(parsed["steps"]) == 1
-        assert parsed["status"] == "completed"
-
-
-# ── ClassifierAgent Tests ─────────────────────────────────────────────────────
-
-class TestClassifierAgent:
-    def setup_method(self):
-        self.agent = ClassifierAgent()
-
-    def test_parse_valid_output(self):
-        raw = {
-            "area": "trabalhista",
-            "subarea": "rescisao_contratual",
-            "urgencia": "media",
-            "procedimento": "rito_ordinario",
-            "complexidade": "medio",
-            "partes": {"requerente": "João", "requerido": "Empresa"},
-            "fatos_principais": ["demissão sem justa causa"],
-            "confidence": 0.92,
-        }
-        output, confidence = self.agent._parse_output(raw)
-        assert output["area"] == "trabalhista"
-        assert output["urgencia"] == "media"
-        assert confidence == 0.92
-
-    def test_invalid_area_defaults_to_outros(self):
-        raw = {"area": "invalido", "urgencia": "media", "complexidade": "medio",
-               "procedimento": "a_definir", "confidence": 0.9}
-        output, confidence = self.agent._parse_output(raw)
-        assert output["area"] == "outros"
-        assert confidence < 0.9  # Penalized
-
-    def test_invalid_urgencia_defaults_to_media(self):
-        raw = {"area": "civil", "urgencia": "xyzzy", "complexidade": "medio",
-               "procedimento": "a_definir", "confidence": 0.8}
-        output, confidence = self.agent._parse_output(raw)
-        assert output["urgencia"] == "media"
-
-    def test_confidence_clamped(self):
-        raw = {"area": "civil", "urgencia": "media", "complexidade": "medio",
-               "procedimento": "a_definir", "confidence": 1.5}
-        _, confidence = self.agent._parse_output(raw)
-        assert confidence <= 1.0
-
-
-# ── AnalystAgent Tests ────────────────────────────────────────────────────────
-
-class TestAnalystAgent:
-    def setup_method(self):
-        self.agent = AnalystAgent()
-
-    def test_parse_probability_to_categoria(self):
-        # High probability → favoravel
-        raw = {"probabilidade_exito": 0.75, "riscos": [], "confidence": 0.85}
-        output, _ = self.agent._parse_output(raw)
-        assert output["categoria_exito"] == "favoravel"
-
-    def test_low_probability_categoria(self):
-        raw = {"probabilidade_exito": 0.25, "riscos": [], "confidence": 0.8}
-        output, _ = self.agent._parse_output(raw)
-        assert output["categoria_exito"] == "desfavoravel"
-
-    def test_risk_normalization(self):
-        raw = {
-            "probabilidade_exito": 0.6,
-            "riscos": [
-                {"tipo": "prescricao", "descricao": "prazo vencendo", "severidade": "INVALIDA"},
-                {"tipo": "prova", "descricao": "falta de documentos", "severidade": "alta"},
-            ],
-            "confidence": 0.8,
-        }
-        output, _ = self.agent._parse_output(raw)
-        assert output["riscos"][0]["severidade"] == "media"  # Invalid → media
-        assert output["riscos"][1]["severidade"] == "alta"
+def test_compress_clip_by_tokens_limits_length():
+    clipped = clip_by_tokens("palavra " * 2000, 50)
+    assert 0 < len(clipped) < len("palavra " * 2000)
+
+
+def test_compress_analyst_prompt_drops_repeated_citations():
+    m = WorkflowMemory()
+    m.set("pesquisa", {
+        "legislacao_principal": ["art. 483 CLT", "art. 483 CLT"],
+        "sumulas": ["Súmula 331 TST", "art. 483 CLT"],
+    })
+    _, user = AnalystAgent()._build_prompt(m)
+    assert user.count("art. 483 CLT") == 1
 
 
 # ── ReviewerAgent Tests ───────────────────────────────────────────────────────
 
-class TestReviewerAgent:
-    def setup_method(self):
-        self.agent = ReviewerAgent()
-
-    def test_high_severity_forces_not_approved(self):
-        raw = {
-            "aprovado": True,  # Agent said approved...
-            "score_qualidade": 0.9,
-            "issues": [
-                {"tipo": "citacao", "descricao": "art. 999 não existe", "severidade": "alta"}
-            ],
-            "recomendacao": "aprovar",
-            "confidence": 0.85,
-        }
-        output, _ = self.agent._parse_output(raw)
-        # Should override approval due to high severity issue
-        assert output["aprovado"] is False
-
-    def test_low_score_triggers_revision(self):
-        raw = {
-            "aprovado": False,
-            "score_qualidade": 0.55,
-            "issues": [{"tipo": "completude", "descricao": "falta pedido", "severidade": "media"}],
-            "recomendacao": "aprovar",  # Inconsistent — should be overridden
-            "confidence": 0.8,
-        }
-        output, _ = self.agent._parse_output(raw)
-        assert output["recomendacao"] in ("revisar", "rejeitar")
-
-    def test_clean_review_approved(self):
-        raw = {
-            "aprovado": True,
-            "score_qualidade": 0.88,
-            "issues": [],
-            "sugestoes": ["melhorar introdução"],
-            "secoes_ok": ["dos_fatos", "do_direito", "dos_pedidos"],
-            "secoes_problematicas": [],
-            "recomendacao": "aprovar",
-            "confidence": 0.9,
-        }
-        output, confidence = self.agent._parse_output(raw)
-        assert output["aprovado"] is True
-        assert output["recomendacao"] == "aprovar"
-        assert confidence == 0.9
+def test_reviewer_system_prompt_is_static():
+    memory = WorkflowMemory()
+    memory.set("minuta", {"dos_fatos": "fatos do caso"})
+    system, user = REVIEWER._build_prompt(memory)
+    assert system == REVIEWER._build_prompt(WorkflowMemory())[0]
+    assert system[0]["cache_control"] == {"type": "ephemeral"}
+    assert "fatos do caso" in user and "fatos do caso" not in system[0]["text"]
+
+
+def test_reviewer_user_prompt_is_case_json():
+    memory = WorkflowMemory()
+    memory.update({
+        "minuta": {"dos_fatos": "f", "dos_pedidos": "p"},
+        "pesquisa": {"legislacao_principal": [f"art. {i}" for i in range(10)]},
+    })
+    _, user = REVIEWER._build_prompt(memory)
+    payload = json.loads(user)
+    assert list(payload)[:5] == ["qualificacao", "dos_fatos", "do_direito", "dos_pedidos", "valor_causa"]
+    assert payload["qualificacao"] == "(não informado)"
+    assert len(payload["legislacao"]) == 6
+
+
+# ── BaseAgent Tests ───────────────────────────────────────────────────────────
+
+class FakeLLMClient:
+    """Stands in for AgentLLMClient with a canned JSON response."""
+
+    def __init__(self, response: dict, tokens: int = 50):
+        self.response = response
+        self.tokens = tokens
+
+    def complete_json(self, system, user, stats=None):
+        if stats and self.response:
+            stats.calls += 1
+            stats.tokens_used += self.tokens
+        return self.response, self.tokens
+
+    async def acomplete_json(self, system, user, stats=None):
+        return self.complete_json(system, user, stats)
+
+    async def acomplete_json_stream(self, system, user, stats=None):
+        parsed, _ = self.complete_json(system, user, stats)
+        for item in parsed.items():
+            yield item
+
+
+def test_base_agent_aexecute_builds_step_result():
+    raw = {"area": "civil", "urgencia": "baixa", "complexidade": "simples",
+           "procedimento": "rito_ordinario", "confidence": 0.8}
+    agent = ClassifierAgent(llm_client=FakeLLMClient(raw))
+    m = WorkflowMemory()
+    m.set("caso", "Cobrança de aluguel atrasado")
+
+    result = asyncio.run(agent.aexecute("classify", m))
+    assert result.succeeded
+    assert result.output["area"] == "civil"
+    assert result.llm_calls == 1
+    assert result.tokens_used == 50
+    assert result.agent_name == "ClassifierAgent"
+
+
+def test_base_agent_aexecute_empty_response_fails():
+    agent = ClassifierAgent(llm_client=FakeLLMClient({}))
+    result = asyncio.run(agent.aexecute("classify", WorkflowMemory()))
+    assert result.failed
+    assert "empty response" in result.error
+
+
+def test_base_agent_aexecute_streams_fields():
+    raw = {"area": "civil", "urgencia": "baixa", "confidence": 0.7}
+    agent = ClassifierAgent(llm_client=FakeLLMClient(raw))
+    seen = []
+    result = asyncio.run(agent.aexecute("classify", WorkflowMemory(),
+                                        on_field=lambda k, v: seen.append(k)))
+    assert seen == ["area", "urgencia", "confidence"]
+    assert result.succeeded and result.output["area"] == "civil"
+
+
+def test_base_agent_stream_dying_midway_fails_uncached():
+    def chunk(text):
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+    async def dying_stream():
+        yield chunk('{"area": "civil", ')
+        raise ConnectionError("reset")
+
+    async def create(**kwargs):
+        return dying_stream()
+
+    client = AgentLLMClient(cache={})
+    client._aclient = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    agent = ClassifierAgent(llm_client=client)
+    seen = []
+    result = asyncio.run(agent.aexecute("classify", WorkflowMemory(),
+                                        on_field=lambda k, v: seen.append(k)))
+    assert seen == ["area"]
+    assert result.failed and "interrupted" in result.error
+    assert agent._cache_lookup(*agent._build_prompt(WorkflowMemory()))[1] is None
+    assert client.cache == {}
+
+
+def test_base_agent_sync_batch_closes_loop_clients(monkeypatch):
+    from src.agents import base_agent
+    built, closed = [], []
+
+    class FakeAsyncClient:
+        def __init__(self):
+            self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+            built.append(self)
+
+        async def create(self, **kwargs):
+            raise ValueError("not retryable")
 
+        async def close(self):
+            closed.append(self)
 
-# ── WorkflowStep Tests ────────────────────────────────────────────────────────
+    monkeypatch.setattr(base_agent, "_build_client",
+                        lambda provider, asynchronous: FakeAsyncClient() if asynchronous else None)
+    client = AgentLLMClient()
+    for _ in range(2):
+        assert client.complete_many_json([("s", "a"), ("s", "b")]) == [({}, 0), ({}, 0)]
+    assert len(built) == 2 and closed == built
+    assert len(base_agent._async_clients) == 0
+
+
+def test_base_agent_cache_hits_do_not_share_nested_values():
+    raw = {"area": "civil", "fatos_principais": ["atraso"], "partes": {"requerente": "A"}, "confidence": 0.8}
+    agent = ClassifierAgent(llm_client=FakeLLMClient(raw))
+    first = agent.execute("classify", WorkflowMemory())
+    first.output["fatos_principais"].append("mutado")
+    first.output["partes"]["requerido"] = "B"
+    second = agent.execute("classify", WorkflowMemory())
+    assert second.llm_calls == 0
+    assert second.output["fatos_principais"] == ["atraso"]
+    assert "requerido" not in second.output["partes"]
+
+
+def test_base_agent_metadata_readable_without_instance():
+    assert ClassifierAgent.name == "ClassifierAgent"
+    assert ReviewerAgent.description
+
+
+def test_base_agent_subclass_without_name_rejected():
+    with pytest.raises(TypeError, match="name"):
+        class NamelessAgent(BaseAgent):
+            description = "sem nome"
+
+
+def test_base_agent_execute_and_aexecute_agree():
+    raw = {"area": "penal", "urgencia": "urgente", "complexidade": "complexo",
+           "procedimento": "habeas_corpus", "confidence": 0.95}
+    agent = ClassifierAgent(llm_client=FakeLLMClient(raw))
+    sync_result = agent.execute("classify", WorkflowMemory())
+    async_result = asyncio.run(agent.aexecute("classify", WorkflowMemory()))
+    assert sync_result.output == async_result.output
+    assert sync_result.confidence == async_result.confidence
 
-class TestWorkflowSteps:
-    def test_agent_step_condition_true(self):
-        mock_agent = MagicMock()
-        mock_agent.name = "MockAgent"
-        step = AgentStep(
-            step_id="test",
-            agent=mock_agent,
-            memory_key="result",
-            condition=lambda m: m.get("flag") is True,
-        )
-        m = WorkflowMemory()
-        m.set("flag", True)
-        assert step.should_run(m) is True
-
-    def test_agent_step_condition_false(self):
-        mock_agent = MagicMock()
-        mock_agent.name = "MockAgent"
-        step = AgentStep(
-            step_id="test",
-            agent=mock_agent,
-            memory_key="result",
-            condition=lambda m: m.get("flag") is True,
-        )
-        m = WorkflowMemory()
-        m.set("flag", False)
-        assert step.should_run(m) is False
-
-    def test_step_condition_error_defaults_to_run(self):
-        mock_agent = MagicMock()
-        mock_agent.name = "MockAgent"
-        step = AgentStep(
-            step_id="test",
-            agent=mock_agent,
-            memory_key="result",
-            condition=lambda m: 1 / 0,  # Always errors
-        )
-        m = WorkflowMemory()
-        assert step.should_run(m) is True  # Default to running
 
-    def test_no_condition_always_runs(self):
-        mock_agent = MagicMock()
-        mock_agent.name = "MockAgent"
-        step = AgentStep(step_id="test", agent=mock_agent, memory_key="result")
-        assert step.should_run(WorkflowMemory()) is True
+def test_base_agent_duration_measured_monotonic_ns():
+    agent = ClassifierAgent(llm_client=FakeLLMClient({"area": "civil", "confidence": 0.9}))
+    result = agent.execute("classify", WorkflowMemory(_store={"caso": "x"}))
+    assert result.duration_ns > 0
+    assert result.duration_ms == result.duration_ns / 1_000_000
+
+
+def test_base_agent_repeated_prompt_served_from_agent_cache():
+    llm = FakeLLMClient({"area": "civil", "confidence": 0.9})
+    llm.complete_json = MagicMock(wraps=llm.complete_json)
+    agent = ClassifierAgent(llm_client=llm)
+    memory = WorkflowMemory(_store={"caso": "Cobrança de aluguel"})
+
+    first = agent.execute("classify", memory)
+    second = agent.execute("classify", memory)
+    assert llm.complete_json.call_count == 1
+    assert first.llm_calls == 1 and second.llm_calls == 0
+    assert second.output == first.output
+    assert second.confidence == first.confidence
 
+    uncached = ClassifierAgent(llm_client=llm, cache_size=0)
+    uncached.execute("classify", memory)
+    uncached.execute("classify", memory)
+    assert llm.complete_json.call_count == 3
 
-# ── WorkflowEngine Tests (Mock LLM) ─────────────────────────────────────────
 
-def make_mock_agent(name: str, output: dict, confidence: float = 0.9) -> MagicMock:
-    """Create a mock agent that returns a pre-defined StepResult."""
-    agent = MagicMock(spec=BaseAgent)
-    agent.name = name
-
-    def execute(step_id, memory):
-        return StepResult(
-            step_id=step_id,
-            status=StepStatus.COMPLETED,
-            output=output,
-            confidence=confidence,
-            duration_ms=10.0,
-            llm_calls=1,
-            tokens_used=100,
-            agent_name=name,
-        )
+def test_base_agent_failed_parse_not_cached():
+    llm = FakeLLMClient({})
+    agent = ClassifierAgent(llm_client=llm)
+    assert agent.execute("classify", WorkflowMemory()).failed
+    llm.response = {"area": "civil", "confidence": 0.9}
+    assert agent.execute("classify", WorkflowMemory()).succeeded
 
-    agent.execute = execute
-    return agent
-
-
-class TestWorkflowEngine:
-    def setup_method(self):
-        self.engine = WorkflowEngine()
-
-    def test_register_and_run(self):
-        classify_output = {
-            "area": "trabalhista", "subarea": "rescisao", "urgencia": "media",
-            "complexidade": "medio", "procedimento": "rito_ordinario",
-            "partes": {}, "fatos_principais": [], "confidence": 0.9,
-        }
-        mock_classifier = make_mock_agent("ClassifierAgent", classify_output)
-
-        workflow = WorkflowDefinition(
-            name="test_workflow",
-            steps=[
-                AgentStep(
-                    step_id="classify",
-                    agent=mock_classifier,
-                    memory_key="classification",
-                    required=True,
-                )
-            ]
-        )
-        self.engine.register(workflow)
-
-        result = self.engine.run("test_workflow", {"caso": "teste"})
-        assert result.status == WorkflowStatus.COMPLETED
-        assert result.memory.get("classification") == classify_output
-
-    def test_failed_required_step_fails_workflow(self):
-        failing_agent = MagicMock(spec=BaseAgent)
-        failing_agent.name = "FailAgent"
-        failing_agent.execute.return_value = StepResult(
-            step_id="fail_step",
-            status=StepStatus.FAILED,
-            error="Simulated failure",
-            agent_name="FailAgent",
-        )
 
-        workflow = WorkflowDefinition(
-            name="fail_workflow",
-            steps=[
-                AgentStep(
-                    step_id="fail_step",
-                    agent=failing_agent,
-                    memory_key="result",
-                    required=True,
-                    max_retries=1,
-                )
-            ]
-        )
-        self.engine.register(workflow)
-
-        result = self.engine.run("fail_workflow", {})
-        assert result.status == WorkflowStatus.FAILED
-
-    def test_failed_optional_step_continues(self):
-        failing_agent = MagicMock(spec=BaseAgent)
-        failing_agent.name = "FailAgent"
-        failing_agent.execute.return_value = StepResult(
-            step_id="opt_step",
-            status=StepStatus.FAILED,
-            error="Optional failure",
-            agent_name="FailAgent",
-        )
+def test_base_agent_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache["a"], cache["b"] = 1, 2
+    assert cache["a"] == 1  # "b" is now the oldest
+    cache["c"] = 3
+    assert set(cache) == {"a", "c"}
 
-        success_agent = make_mock_agent("SuccessAgent", {"ok": True})
-
-        workflow = WorkflowDefinition(
-            name="optional_fail_workflow",
-            steps=[
-                AgentStep(
-                    step_id="opt_step",
-                    agent=failing_agent,
-                    memory_key="optional_result",
-                    required=False,
-                    max_retries=1,
-                ),
-                AgentStep(
-                    step_id="required_step",
-                    agent=success_agent,
-                    memory_key="final_result",
-                    required=True,
-                ),
-            ]
-        )
-        self.engine.register(workflow)
-
-        result = self.engine.run("optional_fail_workflow", {})
-        assert result.status == WorkflowStatus.COMPLETED
-        assert result.memory.get("final_result") == {"ok": True}
-
-    def test_skipped_step_not_in_failure(self):
-        workflow = WorkflowDefinition(
-            name="skip_workflow",
-            steps=[
-                AgentStep(
-                    step_id="always_skip",
-                    agent=make_mock_agent("A", {}),
-                    memory_key="skipped",
-                    condition=lambda m: False,
-                    required=True,  # Even required can be skipped
-                ),
-                AgentStep(
-                    step_id="always_run",
-                    agent=make_mock_agent("B", {"ran": True}),
-                    memory_key="ran",
-                ),
-            ]
-        )
-        self.engine.register(workflow)
-        result = self.engine.run("skip_workflow", {})
-        assert result.status == WorkflowStatus.COMPLETED
-        assert result.memory.get("ran") == {"ran": True}
-        assert result.memory.get("skipped") is None
-
-    def test_human_gate_auto_approved_non_interactive(self):
-        human_gate = HumanGateStep(
-            step_id="gate",
-            prompt_fn=lambda m: "Review this",
-            require_approval=True,
-            description="Test gate",
-        )
-        success_agent = make_mock_agent("A", {"done": True})
 
-        workflow = WorkflowDefinition(
-            name="gate_workflow",
-            steps=[human_gate, AgentStep(step_id="s", agent=success_agent, memory_key="done")],
-        )
-        self.engine.register(workflow)
-        result = self.engine.run("gate_workflow", {}, interactive=False)
-        assert result.status == WorkflowStatus.COMPLETED
-
-    def test_unregistered_workflow_raises(self):
-        with pytest.raises(ValueError, match="not registered"):
-            self.engine.run("nonexistent", {})
-
-    def test_trace_captures_all_steps(self):
-        agents = [make_mock_agent(f"Agent{i}", {"i": i}) for i in range(3)]
-        workflow = WorkflowDefinition(
-            name="trace_workflow",
-            steps=[
-                AgentStep(step_id=f"step{i}", agent=a, memory_key=f"k{i}")
-                for i, a in enumerate(agents)
-            ]
-        )
-        self.engine.register(workflow)
-        result = self.engine.run("trace_workflow", {})
-        assert len(result.trace.steps) == 3
-        assert result.trace.total_llm_calls == 3
-        assert result.trace.total_tokens_used == 300
+# ── AgentLLMClient Tests ──────────────────────────────────────────────────────
+
+def make_openai_response(content: str, tokens: int = 42):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(total_tokens=tokens),
+    )
+
+
+_JSON_STREAM_DOC = '```json\n{"dos_fatos": "Em 2020, o autor {...}", "itens": [1, {"a": "]"}], "score": 0.9}\n```'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 16, 1000])
+def test_json_stream_fields_emitted_across_chunks(chunk_size):
+    stream = TopLevelJSONStream()
+    fields = []
+    for i in range(0, len(_JSON_STREAM_DOC), chunk_size):
+        fields.extend(stream.feed(_JSON_STREAM_DOC[i:i + chunk_size]))
+    assert fields == [
+        ("dos_fatos", "Em 2020, o autor {...}"),
+        ("itens", [1, {"a": "]"}]),
+        ("score", 0.9),
+    ]
+    assert stream.done
+
+
+def test_json_stream_field_available_before_object_closes():
+    stream = TopLevelJSONStream()
+    assert stream.feed('{"dos_fatos": "narrativa", "do_dir') == [("dos_fatos", "narrativa")]
+    assert not stream.done
+
+
+def test_llm_client_prompt_key_ignores_whitespace():
+    a = prompt_key("gpt-4o-mini", "sys", "CASO:\n  demissão   sem justa causa")
+    b = prompt_key("gpt-4o-mini", "sys", "CASO: demissão sem justa causa\n")
+    assert a == b
+    assert a != prompt_key("gpt-4o", "sys", "CASO: demissão sem justa causa")
+
+
+def test_llm_client_cache_hit_skips_provider():
+    client = AgentLLMClient(cache={})
+    sdk = MagicMock()
+    sdk.chat.completions.create.return_value = make_openai_response('{"area": "civil"}')
+    client._client = sdk
+
+    first = client.complete_json("sys", "user")
+    second = client.complete_json("sys", "user")
+    assert first == ({"area": "civil"}, 42)
+    assert second == ({"area": "civil"}, 0)
+    assert sdk.chat.completions.create.call_count == 1
+
+
+def test_llm_client_sdk_client_shared_across_agents(monkeypatch):
+    import src.agents.base_agent as base_agent
+    built = []
+
+    def fake_build(provider, asynchronous):
+        built.append((provider, asynchronous))
+        return object()
+
+    monkeypatch.setattr(base_agent, "_build_client", fake_build)
+    monkeypatch.setattr(base_agent, "_sync_clients", {})
+    a = AgentLLMClient(model="gpt-4o-mini")
+    b = AgentLLMClient(model="gpt-4o")
+    assert a._client is b._client
+    assert built == [("openai", False)]
+
+
+def test_llm_client_sdk_import_probed_once():
+    import src.agents.base_agent as base_agent
+    base_agent._get_sdk.cache_clear()
+    assert base_agent._get_sdk("desconhecido") is None
+    base_agent._get_sdk("desconhecido")
+    assert base_agent._get_sdk.cache_info().hits == 1
+
+
+def test_llm_client_complete_many_keeps_order():
+    client = AgentLLMClient()
+
+    async def fake_acomplete(system, user, stats=None):
+        await asyncio.sleep(0.01 if user == "a" else 0)
+        return {"user": user}, 1
+
+    client.acomplete_json = fake_acomplete
+    results = client.complete_many_json([("s", "a"), ("s", "b"), ("s", "c")], max_concurrent=2)
+    assert [r[0]["user"] for r in results] == ["a", "b", "c"]
+
+
+def test_llm_client_sqlite_cache_roundtrip(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    cache["k"] = {"tipo": "trabalhista", "lista": [1, 2]}
+    assert cache["k"] == {"tipo": "trabalhista", "lista": [1, 2]}
+    assert len(cache) == 1
+    del cache["k"]
+    assert "k" not in cache
+    cache.close()
+
+
+@pytest.mark.parametrize("content", [
+    '{"area": "civil"}',
+    '```json\n{"area": "civil"}\n```',
+    '```\n{"area": "civil"}\n```',
+    'Segue:\n```json\n{"area": "civil"}\n```\n',
+])
+def test_llm_client_handle_response_unwraps_fences(content):
+    client = AgentLLMClient()
+    assert client._handle_response(make_openai_response(content), None) == ({"area": "civil"}, 42)
+
+
+def test_llm_client_transient_errors_are_retried(monkeypatch):
+    import src.agents.base_agent as base_agent
+
+    class RateLimitError(Exception):
+        status_code = 429
+        response = MagicMock(headers={"retry-after": "0.25"})
+
+    sleeps = []
+    monkeypatch.setattr(base_agent.time, "sleep", sleeps.append)
+    client = AgentLLMClient()
+    sdk = MagicMock()
+    sdk.chat.completions.create.side_effect = [
+        RateLimitError("slow down"),
+        ConnectionError("reset"),
+        make_openai_response('{"area": "civil"}'),
+    ]
+    client._client = sdk
+    assert client.complete_json("sys", "user") == ({"area": "civil"}, 42)
+    assert sleeps[0] == 0.25
+    assert len(sleeps) == 2
+
+
+def test_llm_client_permanent_errors_fail_fast(monkeypatch):
+    import src.agents.base_agent as base_agent
+
+    class BadRequestError(Exception):
+        status_code = 400
+
+    sleeps = []
+    monkeypatch.setattr(base_agent.time, "sleep", sleeps.append)
+    client = AgentLLMClient()
+    client._client = MagicMock()
+    client._client.chat.completions.create.side_effect = BadRequestError("bad")
+    assert client.complete_json("sys", "user") == ({}, 0)
+    assert sleeps == []
+    assert client._client.chat.completions.create.call_count == 1
+
+
+def test_llm_client_json_utils_roundtrip_keeps_unicode():
+    doc = {"area": "trabalhista", "pedidos": ["férias", "13º salário"]}
+    assert json_utils.loads(json_utils.dumpb(doc, pretty=True)) == doc
+    assert "férias" in json_utils.dumps(doc)
+
+
+def test_llm_client_cached_system_blocks_per_provider():
+    system = cached_system("Você é um classificador.")
+    anthropic = AgentLLMClient(provider="anthropic")._anthropic_kwargs(system, "CASO")
+    assert anthropic["system"][0]["cache_control"] == {"type": "ephemeral"}
+    assert anthropic["system"][-1]["text"] == "Respond ONLY with valid JSON."
+    openai = AgentLLMClient()._openai_kwargs(system, "CASO")
+    assert openai["messages"][0]["content"] == "Você é um classificador."
+    assert prompt_key("m", "Você é um classificador.", "CASO") == AgentLLMClient(
+        model="m", cache={}
+    )._cache_lookup(system, "CASO")[0]
+
+
+# ── WorkflowStep Tests ────────────────────────────────────────────────────────
+
+def _flag_is_true(m: WorkflowMemory) -> bool:
+    return m.get("flag") is True
+
+
+def _always_false(m: WorkflowMemory) -> bool:
+    return False
+
+
+def _always_errors(m: WorkflowMemory) -> bool:
+    raise ZeroDivisionError
+
+
+def test_step_agent_step_condition_true():
+    mock_agent = make_mock_agent("MockAgent", {})
+    step = AgentStep(
+        step_id="test",
+        agent=mock_agent,
+        memory_key="result",
+        condition=_flag_is_true,
+    )
+    m = WorkflowMemory()
+    m.set("flag", True)
+    assert step.should_run(m) is True
+
+
+def test_step_should_run_reuses_result_until_memory_changes():
+    calls = []
+    step = AgentStep(step_id="a", agent=make_mock_agent("A", {}), memory_key="x",
+                     condition=lambda m: calls.append(1) or m.get("flag") is True)
+    m = WorkflowMemory()
+    m.set("flag", True)
+    assert step.should_run(m) and step.should_run(m)
+    assert len(calls) == 1
+    m.set("flag", False)
+    assert step.should_run(m) is False
+    assert step.should_run(WorkflowMemory(_store={"flag": True})) is True
+    assert len(calls) == 3
+
+
+def test_step_should_run_cache_does_not_keep_memory_alive():
+    step = AgentStep(step_id="a", agent=make_mock_agent("A", {}), memory_key="x",
+                     condition=lambda m: True)
+    m = WorkflowMemory()
+    assert step.should_run(m)
+    ref = weakref.ref(m)
+    del m
+    assert ref() is None
+
+
+def test_steps_are_slotted():
+    step = AgentStep(step_id="a", agent=make_mock_agent("A", {}), memory_key="x")
+    assert not hasattr(step, "__dict__")
+    with pytest.raises(AttributeError):
+        step.timeout_s = 5
+
+
+def test_step_workflow_definition_rejects_duplicate_step_ids():
+    agent = make_mock_agent("A", {})
+    with pytest.raises(ValueError, match="Duplicate step id 'a'"):
+        WorkflowDefinition(name="dup", steps=[
+            AgentStep(step_id="a", agent=agent, memory_key="x"),
+            ParallelStep(step_id="group", steps=[AgentStep(step_id="a", agent=agent, memory_key="y")]),
+        ])
+
+
+def test_step_agent_step_condition_false():
+    mock_agent = make_mock_agent("MockAgent", {})
+    step = AgentStep(
+        step_id="test",
+        agent=mock_agent,
+        memory_key="result",
+        condition=_flag_is_true,
+    )
+    m = WorkflowMemory()
+    m.set("flag", False)
+    assert step.should_run(m) is False
+
+
+def test_step_declarative_conditions():
+    m = WorkflowMemory(_store={"classification": {"confidence": 0.6, "urgencia": "media"}})
+    assert Condition.nested_gte(("classification", "confidence"), 0.5)(m)
+    assert not Condition.nested_gte(("analise", "probabilidade_exito"), 0.2)(m)
+    assert Condition.nested_lt(("revisao", "score_qualidade"), 0.8, default=1.0)(m) is False
+    gate = Condition.any_of(
+        Condition.nested_eq(("classification", "urgencia"), "urgente"),
+        Condition.nested_in(("revisao", "recomendacao"), ("revisar", "rejeitar")),
+    )
+    assert not gate(m)
+    m.set("revisao", {"recomendacao": "revisar"})
+    assert gate(m) and Condition.has("revisao")(m)
+    assert gate.keys == {"classification", "revisao"}
+    with pytest.raises(ValueError):
+        Condition("gt", ("a",), 1)
+
+
+def test_step_definition_conditions_read_declared_keys(workflows):
+    for workflow in workflows.values():
+        for step in workflow.iter_steps():
+            if isinstance(step, AgentStep) and isinstance(step.condition, Condition):
+                assert step.condition.keys <= set(step.reads), step.step_id
+
+
+def test_step_condition_error_defaults_to_run():
+    mock_agent = make_mock_agent("MockAgent", {})
+    step = AgentStep(
+        step_id="test",
+        agent=mock_agent,
+        memory_key="result",
+        condition=_always_errors,
+    )
+    m = WorkflowMemory()
+    assert step.should_run(m) is True  # Default to running
+
+
+def test_step_no_condition_always_runs():
+    mock_agent = make_mock_agent("MockAgent", {})
+    step = AgentStep(step_id="test", agent=mock_agent, memory_key="result")
+    assert step.should_run(WorkflowMemory()) is True
+
+
+# ── WorkflowEngine Tests (Mock LLM) ─────────────────────────────────────────
+
+# Stub agents stamp their results from these; completed_ts stays the template's.
+_OK_RESULT_TEMPLATE = StepResult(step_id="_", status=StepStatus.COMPLETED, duration_ms=10.0,
+                                 llm_calls=1, tokens_used=100)
+_FAIL_RESULT_TEMPLATE = StepResult(step_id="_", status=StepStatus.FAILED, error="_", agent_name="_")
+
+
+class _StubAgent:
+    """
+    Agent stand-in returning a fixed COMPLETED StepResult.
+
+    The engine only touches .name and .execute, so a slotted class is all a
+    test needs — MagicMock(spec=BaseAgent) introspects BaseAgent and records
+    every call for nothing.
+    """
+
+    __slots__ = ("name", "_out", "_conf")
+
+    def __init__(self, name: str, out: dict, conf: float = 0.9):
+        self.name, self._out, self._conf = name, out, conf
+
+    def execute(self, step_id, memory):
+        return replace(_OK_RESULT_TEMPLATE, step_id=step_id, output=self._out,
+                       confidence=self._conf, agent_name=self.name)
+
+
+class _FailAgent:
+    """Agent stand-in whose every attempt returns a FAILED StepResult."""
+
+    __slots__ = ("name", "_error")
+
+    def __init__(self, name: str, error: str):
+        self.name, self._error = name, error
+
+    def execute(self, step_id, memory):
+        return replace(_FAIL_RESULT_TEMPLATE, step_id=step_id, error=self._error, agent_name=self.name)
+
+
+# Engine tests derive their steps from this one, overriding only what they set.
+_TEMPLATE_STEP = AgentStep(step_id="_", agent=None, memory_key="_")
+
+
+def make_mock_agent(name: str, output: dict, confidence: float = 0.9) -> _StubAgent:
+    """Create a stub agent that returns a pre-defined StepResult."""
+    return _StubAgent(name, output, confidence)
+
+
+def test_engine_register_and_run(engine):
+    classify_output = {
+        "area": "trabalhista", "subarea": "rescisao", "urgencia": "media",
+        "complexidade": "medio", "procedimento": "rito_ordinario",
+        "partes": {}, "fatos_principais": [], "confidence": 0.9,
+    }
+    mock_classifier = make_mock_agent("ClassifierAgent", classify_output)
+
+    workflow = WorkflowDefinition(
+        name="test_workflow",
+        steps=[
+            replace(
+                _TEMPLATE_STEP,
+                step_id="classify",
+                agent=mock_classifier,
+                memory_key="classification",
+                required=True,
+            )
+        ]
+    )
+    engine.register(workflow)
+
+    result = engine.run("test_workflow", {"caso": "teste"})
+    assert result.status == WorkflowStatus.COMPLETED
+    assert result.memory.get("classification") == classify_output
+
+
+def test_engine_failed_required_step_fails_workflow(engine):
+    failing_agent = _FailAgent("FailAgent", "Simulated failure")
+
+    workflow = WorkflowDefinition(
+        name="fail_workflow",
+        steps=[
+            replace(
+                _TEMPLATE_STEP,
+                step_id="fail_step",
+                agent=failing_agent,
+                memory_key="result",
+                required=True,
+                max_retries=1,
+            )
+        ]
+    )
+    engine.register(workflow)
+
+    result = engine.run("fail_workflow", {})
+    assert result.status == WorkflowStatus.FAILED
+
+
+def test_engine_failed_optional_step_continues(engine):
+    failing_agent = _FailAgent("FailAgent", "Optional failure")
+
+    success_agent = make_mock_agent("SuccessAgent", {"ok": True})
+
+    workflow = WorkflowDefinition(
+        name="optional_fail_workflow",
+        steps=[
+            replace(
+                _TEMPLATE_STEP,
+                step_id="opt_step",
+                agent=failing_agent,
+                memory_key="optional_result",
+                required=False,
+                max_retries=1,
+            ),
+            replace(
+                _TEMPLATE_STEP,
+                step_id="required_step",
+                agent=success_agent,
+                memory_key="final_result",
+                required=True,
+            ),
+        ]
+    )
+    engine.register(workflow)
+
+    result = engine.run("optional_fail_workflow", {})
+    assert result.status == WorkflowStatus.COMPLETED
+    assert result.memory.get("final_result") == {"ok": True}
+
+
+def test_engine_skipped_step_not_in_failure(engine):
+    workflow = WorkflowDefinition(
+        name="skip_workflow",
+        steps=[
+            replace(
+                _TEMPLATE_STEP,
+                step_id="always_skip",
+                agent=make_mock_agent("A", {}),
+                memory_key="skipped",
+                condition=_always_false,
+                required=True,  # Even required can be skipped
+            ),
+            replace(
+                _TEMPLATE_STEP,
+                step_id="always_run",
+                agent=make_mock_agent("B", {"ran": True}),
+                memory_key="ran",
+            ),
+        ]
+    )
+    engine.register(workflow)
+    result = engine.run("skip_workflow", {})
+    assert result.status == WorkflowStatus.COMPLETED
+    assert result.memory.get("ran") == {"ran": True}
+    assert result.memory.get("skipped") is None
+
+
+def test_engine_human_gate_auto_approved_non_interactive(engine):
+    human_gate = HumanGateStep(
+        step_id="gate",
+        prompt_fn=lambda m: "Review this",
+        require_approval=True,
+        description="Test gate",
+    )
+    success_agent = make_mock_agent("A", {"done": True})
+
+    workflow = WorkflowDefinition(
+        name="gate_workflow",
+        steps=[human_gate, replace(_TEMPLATE_STEP, step_id="s", agent=success_agent,
+                                   memory_key="done")],
+    )
+    engine.register(workflow)
+    result = engine.run("gate_workflow", {}, interactive=False)
+    assert result.status == WorkflowStatus.COMPLETED
+
+
+def test_engine_final_output_keys(engine):
+    agent = make_mock_agent("A", {"tipo": "civil"})
+    engine.register(WorkflowDefinition(
+        name="default_keys",
+        steps=[replace(_TEMPLATE_STEP, step_id="s", agent=agent, memory_key="classification")],
+    ))
+    engine.register(WorkflowDefinition(
+        name="custom_keys",
+        steps=[replace(_TEMPLATE_STEP, step_id="s", agent=agent, memory_key="resumo")],
+        metadata={"final_output_keys": ("resumo",)},
+    ))
+    assert engine.run("default_keys", {"caso": "x"}).final_output == {"classification": {"tipo": "civil"}}
+    assert engine.run("custom_keys", {"caso": "x"}).final_output == {"resumo": {"tipo": "civil"}}
+
+
+def test_engine_gate_summary_reused_until_memory_changes(engine):
+    calls = []
+    gate = HumanGateStep(step_id="gate", prompt_fn=lambda m: calls.append(1) or f"v{m.version}")
+    m = WorkflowMemory()
+    m.set("caso", "x")
+    assert engine._gate_summary(gate, m) == engine._gate_summary(gate, m) == "v1"
+    m.set("analise", {})
+    assert engine._gate_summary(gate, m) == "v2"
+    assert engine._gate_summary(gate, WorkflowMemory()) == "v0"
+    assert len(calls) == 3
+
+
+def test_engine_register_freezes_steps_and_rejects_shared_memory_keys(engine):
+    agent = make_mock_agent("A", {})
+    workflow = WorkflowDefinition(name="frozen", steps=[
+        replace(_TEMPLATE_STEP, step_id="a", agent=agent, memory_key="x"),
+    ])
+    engine.register(workflow)
+    assert isinstance(workflow.steps, tuple)
+
+    with pytest.raises(ValueError, match=r"duplicate memory keys: \['x'\]"):
+        engine.register(WorkflowDefinition(name="clash", steps=[
+            replace(_TEMPLATE_STEP, step_id="a", agent=agent, memory_key="x"),
+            replace(_TEMPLATE_STEP, step_id="b", agent=agent, memory_key="x"),
+        ]))
+
+
+def test_engine_unregistered_workflow_raises(engine):
+    with pytest.raises(ValueError, match="not registered"):
+        engine.run("nonexistent", {})
+
+
+def test_engine_retries_back_off_exponentially(engine, monkeypatch):
+    import src.workflows.workflow_engine as workflow_engine
+    sleeps = []
+    monkeypatch.setattr(workflow_engine.time, "sleep", sleeps.append)
+    attempts = []
+
+    class FlakyAgent(_StubAgent):
+        def execute(self, step_id, memory):
+            attempts.append(step_id)
+            status = StepStatus.COMPLETED if len(attempts) == 3 else StepStatus.FAILED
+            return StepResult(step_id=step_id, status=status, output={"ok": True}, agent_name=self.name)
+
+    agent = FlakyAgent("F", {"ok": True})
+    engine.register(WorkflowDefinition(
+        name="flaky_workflow",
+        steps=[replace(_TEMPLATE_STEP, step_id="s", agent=agent, memory_key="out", max_retries=4,
+                       retry_backoff=1.0, retry_backoff_cap=1.5)],
+    ))
+    result = engine.run("flaky_workflow", {})
+    assert result.status == WorkflowStatus.COMPLETED
+    assert result.trace.steps[0].retry_count == 2
+    assert len(sleeps) == 2
+    assert 0.5 <= sleeps[0] <= 1.5   # 1.0 ± 50%
+    assert 0.75 <= sleeps[1] <= 2.25  # min(2.0, cap 1.5) ± 50%
+
+
+def test_engine_step_memo_skips_agent_on_rerun():
+    calls = []
+
+    class CountingAgent(_StubAgent):
+        def execute(self, step_id, memory):
+            calls.append(step_id)
+            return super().execute(step_id, memory)
+
+    agent = CountingAgent("A", {"tipo": "civil"})
+    engine = WorkflowEngine(memo={})
+    engine.register(WorkflowDefinition(
+        name="memo_workflow",
+        steps=[replace(_TEMPLATE_STEP, step_id="s", agent=agent, memory_key="out", reads=("caso",))],
+    ))
+
+    engine.run("memo_workflow", {"caso": "x"})
+    result = engine.run("memo_workflow", {"caso": "x"})
+    assert calls == ["s"]
+    assert result.memory.get("out") == {"tipo": "civil"}
+    assert result.trace.steps[0].notes == "memoized"
+    assert result.trace.total_llm_calls == 0
+
+    engine.run("memo_workflow", {"caso": "y"})  # different input → agent runs
+    engine.clear_memo("s")
+    engine.run("memo_workflow", {"caso": "x"})
+    assert calls == ["s", "s", "s"]
+
+
+def test_engine_step_memo_serves_independent_copies():
+    engine = WorkflowEngine(memo={})
+    engine.register(WorkflowDefinition(
+        name="memo_copies",
+        steps=[replace(_TEMPLATE_STEP, step_id="s", agent=make_mock_agent("A", {"partes": ["A"]}),
+                       memory_key="out", reads=("caso",))],
+    ))
+    engine.run("memo_copies", {"caso": "x"}).memory.get("out")["partes"].append("B")
+    hit = engine.run("memo_copies", {"caso": "x"})
+    assert hit.trace.steps[0].notes == "memoized"
+    hit.memory.get("out")["partes"].append("C")
+    assert engine.run("memo_copies", {"caso": "x"}).memory.get("out") == {"partes": ["A"]}
+
+
+def test_engine_trace_captures_all_steps(engine):
+    agents = [make_mock_agent(f"Agent{i}", {"i": i}) for i in range(3)]
+    workflow = WorkflowDefinition(
+        name="trace_workflow",
+        steps=[
+            replace(_TEMPLATE_STEP, step_id=f"step{i}", agent=a, memory_key=f"k{i}")
+            for i, a in enumerate(agents)
+        ]
+    )
+    engine.register(workflow)
+    result = engine.run("trace_workflow", {})
+    assert len(result.trace.steps) == 3
+    assert result.trace.total_llm_calls == 3
+    assert result.trace.total_tokens_used == 300
+
+
+def test_engine_trace_stores_snapshot_deltas(engine):
+    agents = [make_mock_agent(f"Agent{i}", {"i": i}) for i in range(3)]
+    engine.register(WorkflowDefinition(
+        name="delta_workflow",
+        steps=[
+            replace(_TEMPLATE_STEP, step_id=f"step{i}", agent=a, memory_key=f"k{i}")
+            for i, a in enumerate(agents)
+        ],
+    ))
+    trace = engine.run("delta_workflow", {"caso": "teste"}).trace
+
+    assert trace.steps[0].input_snapshot == {"base_step": None, "changed": {"caso": "teste"}}
+    assert trace.steps[2].input_snapshot == {"base_step": "step1", "changed": {"k1": {"i": 1}}}
+    assert trace.materialize_snapshot(2) == {"caso": "teste", "k0": {"i": 0}, "k1": {"i": 1}}
+    assert json.loads(trace.to_json())["steps"][2]["input_snapshot"]["changed"] == {"k1": {"i": 1}}
+
+
+# ── Async / Parallel Engine Tests ─────────────────────────────────────────────
+
+class SleepyAgent:
+    """Async agent that sleeps to simulate LLM latency."""
+
+    def __init__(self, name: str, output: dict, delay: float = 0.05):
+        self.name = name
+        self.output = output
+        self.delay = delay
+
+    def execute(self, step_id, memory):
+        time.sleep(self.delay)
+        return self._result(step_id)
+
+    async def aexecute(self, step_id, memory):
+        await asyncio.sleep(self.delay)
+        return self._result(step_id)
+
+    def _result(self, step_id):
+        return StepResult(step_id=step_id, status=StepStatus.COMPLETED,
+                          output=self.output, llm_calls=1, tokens_used=10,
+                          agent_name=self.name)
+
+
+class SyncOnlyAgent:
+    """Agent without aexecute — the async engine runs it in a worker thread."""
+
+    def __init__(self, name: str, output: dict):
+        self.name = name
+        self.output = output
+
+    def execute(self, step_id, memory):
+        return StepResult(step_id=step_id, status=StepStatus.COMPLETED,
+                          output=self.output, agent_name=self.name)
+
+
+def test_async_arun_sequential():
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="async_seq",
+        steps=[
+            AgentStep(step_id="a", agent=SleepyAgent("A", {"x": 1}, 0), memory_key="a"),
+            AgentStep(step_id="b", agent=SyncOnlyAgent("B", {"y": 2}), memory_key="b"),
+        ],
+    ))
+    result = asyncio.run(engine.arun("async_seq", {}))
+    assert result.status == WorkflowStatus.COMPLETED
+    assert result.memory.get("a") == {"x": 1}
+    assert result.memory.get("b") == {"y": 2}
+
+
+def test_async_interactive_gate_does_not_block_loop(monkeypatch, capsys):
+    events = []
+
+    def slow_input(prompt):
+        time.sleep(0.2)
+        events.append("answered")
+        return "nao"
+
+    monkeypatch.setattr("src.workflows.workflow_engine._read_line", slow_input)
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="gated",
+        steps=[HumanGateStep(step_id="gate", prompt_fn=lambda m: "Review", require_approval=True)],
+    ))
+    engine.register(WorkflowDefinition(
+        name="other",
+        steps=[AgentStep(step_id="a", agent=SleepyAgent("A", {"x": 1}, 0.05), memory_key="a")],
+    ))
+
+    async def both():
+        gated = asyncio.create_task(engine.arun("gated", {}, interactive=True))
+        other = await engine.arun("other", {})
+        events.append("other done")
+        return await gated, other
+
+    gated, other = asyncio.run(both())
+    assert events == ["other done", "answered"]
+    assert gated.status == WorkflowStatus.CANCELLED
+    assert other.status == WorkflowStatus.COMPLETED
+
+
+def test_async_unanswered_gate_times_out_as_rejection(monkeypatch, capsys):
+    monkeypatch.setattr("src.workflows.workflow_engine._read_line", lambda prompt: time.sleep(0.2) or "sim")
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="abandoned",
+        steps=[HumanGateStep(step_id="gate", prompt_fn=lambda m: "Review", timeout_seconds=0.05)],
+    ))
+    assert engine.run("abandoned", {}, interactive=True).status == WorkflowStatus.CANCELLED
+    result = asyncio.run(engine.arun("abandoned", {}, interactive=True))
+    assert result.status == WorkflowStatus.CANCELLED
+    assert result.trace.human_gates_approved == 0
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_async_late_answer_goes_to_next_gate(monkeypatch, capsys, use_async):
+    calls = []
+    monkeypatch.setattr("src.workflows.workflow_engine._read_line", lambda prompt: calls.append(prompt) or time.sleep(0.2) or "sim")
+    engine = WorkflowEngine()
+    for name, timeout in (("first", 0.05), ("second", 2.0)):
+        engine.register(WorkflowDefinition(
+            name=name,
+            steps=[HumanGateStep(step_id="gate", prompt_fn=lambda m: "Review", timeout_seconds=timeout)],
+        ))
+    run = (lambda name: asyncio.run(engine.arun(name, {}, interactive=True))) if use_async else (
+        lambda name: engine.run(name, {}, interactive=True))
+
+    assert run("first").status == WorkflowStatus.CANCELLED
+    # The line typed for the timed-out gate answers the one now open
+    second = run("second")
+    assert second.status == WorkflowStatus.COMPLETED
+    assert second.trace.human_gates_approved == 1
+    assert len(calls) == 1
+    assert engine._gate_reader()._thread.daemon
+
+
+def test_async_concurrent_gates_answered_in_order(monkeypatch):
+    answers = iter(["sim", "não"])
+    prompts = []
+    monkeypatch.setattr("src.workflows.workflow_engine._read_line",
+                        lambda prompt: prompts.append(prompt) or time.sleep(0.05) or next(answers))
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="g",
+        steps=[HumanGateStep(step_id="gate", prompt_fn=lambda m: "Review", timeout_seconds=2.0)],
+    ))
+
+    async def both():
+        return await asyncio.gather(engine.arun("g", {}, interactive=True),
+                                    engine.arun("g", {}, interactive=True))
+
+    started = time.perf_counter()
+    first, second = asyncio.run(both())
+    assert time.perf_counter() - started < 1.0  # neither gate waited out its timeout
+    assert first.status == WorkflowStatus.COMPLETED
+    assert second.status == WorkflowStatus.CANCELLED  # "não" went to the second gate
+    assert len(prompts) == 2  # one question per gate
+
+
+def test_async_arun_streaming_callback():
+    raw = {"area": "civil", "confidence": 0.7}
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="streamed",
+        steps=[
+            AgentStep(step_id="a", agent=ClassifierAgent(llm_client=FakeLLMClient(raw)),
+                      memory_key="a"),
+            AgentStep(step_id="b", agent=SyncOnlyAgent("B", {"y": 2}), memory_key="b"),
+        ],
+    ))
+    chunks = []
+    result = asyncio.run(engine.arun("streamed", {"caso": "x"},
+                                     streaming_callback=lambda *c: chunks.append(c)))
+    assert result.status == WorkflowStatus.COMPLETED
+    assert [(name, is_final) for name, _, is_final in chunks] == [
+        ("ClassifierAgent", False), ("ClassifierAgent", False),
+        ("ClassifierAgent", True), ("B", True),
+    ]
+    assert [json.loads(c) for _, c, _ in chunks[:2]] == [{"area": "civil"}, {"confidence": 0.7}]
+    assert chunks[2][1] == chunks[3][1] == ""
+
+
+def test_async_plan_waves_groups_independent_steps():
+    agent = SleepyAgent("A", {})
+    workflow = WorkflowDefinition(
+        name="waves",
+        steps=[
+            AgentStep(step_id="root", agent=agent, memory_key="root", reads=("caso",)),
+            AgentStep(step_id="left", agent=agent, memory_key="left", reads=("root",)),
+            AgentStep(step_id="right", agent=agent, memory_key="right", reads=("root",)),
+            AgentStep(step_id="join", agent=agent, memory_key="join", reads=("left", "right")),
+            AgentStep(step_id="opaque", agent=agent, memory_key="opaque"),
+        ],
+    )
+    waves = WorkflowEngine._plan_waves(workflow)
+    assert [[s.step_id for s in w] for w in waves] == [
+        ["root"], ["left", "right"], ["join"], ["opaque"],
+    ]
+
+
+def test_async_parallel_wave_runs_concurrently():
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="fan_out",
+        steps=[
+            AgentStep(step_id=f"s{i}", agent=SleepyAgent(f"A{i}", {"i": i}, 0.1),
+                      memory_key=f"k{i}", reads=("caso",))
+            for i in range(3)
+        ],
+    ))
+    started = time.perf_counter()
+    result = asyncio.run(engine.arun("fan_out", {"caso": "x"}, parallel=True))
+    elapsed = time.perf_counter() - started
+
+    assert result.status == WorkflowStatus.COMPLETED
+    assert elapsed < 0.25  # ≈ max(step), not sum(step) = 0.3s
+    assert [s.step_id for s in result.trace.steps] == ["s0", "s1", "s2"]
+
+
+def test_async_sync_parallel_step_runs_concurrently():
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="sync_fan_out",
+        steps=[
+            ParallelStep(step_id="group", steps=[
+                AgentStep(step_id=f"s{i}", agent=SleepyAgent(f"A{i}", {"i": i}, 0.1),
+                          memory_key=f"k{i}")
+                for i in range(3)
+            ]),
+            AgentStep(step_id="after", agent=SyncOnlyAgent("B", {"done": True}), memory_key="after"),
+        ],
+    ))
+    started = time.perf_counter()
+    result = engine.run("sync_fan_out", {})
+    elapsed = time.perf_counter() - started
+
+    assert result.status == WorkflowStatus.COMPLETED
+    assert elapsed < 0.25
+    assert [s.step_id for s in result.trace.steps] == ["s0", "s1", "s2", "after"]
+    assert result.memory.get("k2") == {"i": 2}
+
+
+def test_async_parallel_steps_do_not_see_sibling_writes():
+    seen = {}
+
+    class PeekAgent(SleepyAgent):
+        async def aexecute(self, step_id, memory):
+            result = await super().aexecute(step_id, memory)
+            seen[step_id] = memory.get("fast")
+            return result
+
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="forked",
+        steps=[ParallelStep(step_id="group", steps=[
+            AgentStep(step_id="fast", agent=SleepyAgent("F", {"f": 1}, 0), memory_key="fast"),
+            AgentStep(step_id="slow", agent=PeekAgent("S", {"s": 1}, 0.05), memory_key="slow"),
+        ])],
+    ))
+    result = asyncio.run(engine.arun("forked", {}))
+    assert seen == {"slow": None}
+    assert result.memory.get("fast") == {"f": 1}
+    assert result.memory.get("slow") == {"s": 1}
+
+
+def test_async_parallel_step_duplicate_memory_keys_rejected():
+    agent = SleepyAgent("A", {})
+    with pytest.raises(ValueError, match="duplicate memory keys"):
+        WorkflowEngine().register(WorkflowDefinition(
+            name="clash",
+            steps=[ParallelStep(step_id="group", steps=[
+                AgentStep(step_id="a", agent=agent, memory_key="out"),
+                AgentStep(step_id="b", agent=agent, memory_key="out"),
+            ])],
+        ))
+
+
+def test_async_research_retrieval_is_prefetched_after_classify():
+    queries, prompts = [], []
+
+    async def retrieve(query):
+        queries.append(query)
+        await asyncio.sleep(0)
+        return ["Súmula 331 TST"]
+
+    class RecordingLLM(FakeLLMClient):
+        async def acomplete_json(self, system, user, stats=None):
+            prompts.append(user)
+            return self.complete_json(system, user, stats)
+
+    researcher = ResearcherAgent(
+        llm_client=RecordingLLM({"sumulas": ["Súmula 331 TST"], "confidence": 0.8}),
+        retrieval_fn_async=retrieve,
+    )
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="prefetch",
+        steps=[
+            AgentStep(step_id="classify", memory_key="classification",
+                      agent=SyncOnlyAgent("C", {"area": "trabalhista", "subarea": "terceirização"})),
+            AgentStep(step_id="research", agent=researcher, memory_key="pesquisa"),
+        ],
+    ))
+    result = asyncio.run(engine.arun("prefetch", {"caso": "x"}))
+
+    assert result.status == WorkflowStatus.COMPLETED
+    assert queries == ["trabalhista terceirização "]
+    assert "DOCUMENTOS RECUPERADOS:\nSúmula 331 TST" in prompts[0]
+    assert not result.memory.scratch
+
+
+def test_async_run_batch_isolates_failing_cases():
+    class PickyAgent(SleepyAgent):
+        async def aexecute(self, step_id, memory):
+            if memory.get("caso") == "boom":
+                raise RuntimeError("malformed case")
+            return await super().aexecute(step_id, memory)
+
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="batch",
+        steps=[AgentStep(step_id="classify", agent=PickyAgent("A", {"ok": True}, 0.1),
+                         memory_key="classification")],
+    ))
+    seen = []
+    started = time.perf_counter()
+    results = asyncio.run(engine.arun_batch(
+        "batch", [{"caso": "a"}, {"caso": "boom"}, {"caso": "c"}],
+        on_result=lambda i, r: seen.append(i),
+    ))
+    elapsed = time.perf_counter() - started
+
+    assert [r.status for r in results] == [
+        WorkflowStatus.COMPLETED, WorkflowStatus.FAILED, WorkflowStatus.COMPLETED,
+    ]
+    assert results[2].memory.get("caso") == "c"
+    assert sorted(seen) == [0, 1, 2]
+    assert elapsed < 0.25  # cases overlap
+
+
+def test_async_run_batch_isolates_callback_errors():
+    engine = WorkflowEngine()
+    engine.register(WorkflowDefinition(
+        name="batch",
+        steps=[AgentStep(step_id="a", agent=make_mock_agent("A", {"ok": True}), memory_key="a")],
+    ))
+
+    async def report(index, result):
+        if index == 0:
+            raise OSError("disk full")
+
+    results = asyncio.run(engine.arun_batch("batch", [{"caso": "a"}, {"caso": "b"}], on_result=report))
+    assert [r.status for r in results] == [WorkflowStatus.COMPLETED] * 2
+
+
+def test_async_run_batch_mixes_workflows():
+    agent = make_mock_agent("A", {"ok": True})
+    engine = WorkflowEngine()
+    for name in ("wf1", "wf2", "wf3"):
+        engine.register(WorkflowDefinition(
+            name=name, steps=[AgentStep(step_id=f"{name}_step", agent=agent, memory_key="out")],
+        ))
+    results = engine.run_batch(["wf1", "wf2", "wf3"], [{}, {}, {}])
+
+    assert [r.status for r in results] == [WorkflowStatus.COMPLETED] * 3
+    assert [r.trace.workflow_name for r in results] == ["wf1", "wf2", "wf3"]
+    assert [r.trace.steps[0].step_id for r in results] == ["wf1_step", "wf2_step", "wf3_step"]
+    with pytest.raises(ValueError, match="2 workflow names for 3 inputs"):
+        engine.run_batch(["wf1", "wf2"], [{}, {}, {}])
+
+
+def test_async_plan_batch_bins_cases_by_length():
+    inputs = [{"caso": "x" * n} for n in (4000, 40, 400, 80, 4000)]
+    assert WorkflowEngine._plan_batch(inputs) == [[0, 1, 2, 3, 4]]
+    assert WorkflowEngine._plan_batch(inputs, length_bins=2) == [[1, 3], [2, 0, 4]]
+    # 4000 chars ≈ 1000 tokens: the long cases go out one per group
+    assert WorkflowEngine._plan_batch(inputs, max_batch_tokens=1000) == [[1, 3, 2], [0], [4]]
+
+
+def test_async_peticao_drafts_fatos_alongside_research(workflows):
+    waves = WorkflowEngine._plan_waves(workflows["peticao"])
+    assert [s.step_id for s in waves[1]] == ["research", "draft_fatos"]
+
+
+def test_async_definition_reads_are_declared():
+    for factory in (triagem_rapida_workflow, recurso_ordinario_workflow, peticao_inicial_workflow):
+        for step in factory().iter_steps():
+            if isinstance(step, AgentStep):
+                assert step.reads is not None, step.step_id
 
 
 # ── Workflow Definitions Tests ────────────────────────────────────────────────
 
-class TestWorkflowDefinitions:
-    def test_triagem_rapida_has_2_steps(self):
-        w = triagem_rapida_workflow()
-        assert len(w.steps) == 2
-        assert w.steps[0].step_id == "classify"
-        assert w.steps[1].step_id == "analyze"
-
-    def test_peticao_inicial_has_6_steps(self):
-        w = peticao_inicial_workflow()
-        assert len(w.steps) == 6
-        step_ids = [s.step_id for s in w.steps]
-        assert "classify" in step_ids
-        assert "research" in step_ids
-        assert "draft" in step_ids
-        assert "review" in step_ids
-        assert "human_approval" in step_ids
-
-    def test_recurso_ordinario_has_4_steps(self):
-        w = recurso_ordinario_workflow()
-        assert len(w.steps) == 4
-
-    def test_draft_condition_skips_unviable_case(self):
-        """Draft step should be skipped when probability is too low."""
-        w = recurso_ordinario_workflow()
-        draft_step = w.get_step("draft")
-        assert draft_step is not None
-
-        m = WorkflowMemory()
-        m.set("analise", {"probabilidade_exito": 0.1})  # Below threshold
-        assert draft_step.should_run(m) is False
-
-        m.set("analise", {"probabilidade_exito": 0.5})  # Above threshold
-        assert draft_step.should_run(m) is True
+@pytest.mark.parametrize("key,n,n_ids,must_contain", [
+    ("triagem", 2, 2, ("classify", "analyze")),
+    ("recurso", 4, 4, ()),
+    # research ∥ draft_fatos share a ParallelStep: 6 top-level steps, 7 ids
+    ("peticao", 6, 7, ("classify", "research", "draft_fatos", "draft", "review", "human_approval")),
+])
+def test_definitions_workflow_shape(workflows, key, n, n_ids, must_contain):
+    w = workflows[key]
+    assert len(w.steps) == n
+    ordered = w.step_ids()
+    assert len(ordered) == n_ids
+    assert ordered[0] == "classify"
+    step_ids = {s.step_id for s in w.iter_steps()}
+    assert len(step_ids) == n_ids  # no id repeats across parallel groups
+    assert set(must_contain) <= step_ids
+
+
+def test_definitions_workflows_share_agent_instances(workflows):
+    recurso, peticao = workflows["recurso"], workflows["peticao"]
+    for step_id in ("classify", "research", "analyze"):
+        assert recurso.get_step(step_id).agent is peticao.get_step(step_id).agent
+    assert recurso.get_step("research").condition is not None
+    assert peticao.get_step("research").condition is None
+
+
+def test_definitions_speculative_fatos_pass_is_optional(workflows):
+    assert workflows["peticao"].get_step("draft_fatos").required is False
+
+
+def test_definitions_human_gate_prompt_summary():
+    from src.workflows.definitions import _human_gate_prompt
+    m = WorkflowMemory(_store={
+        "classification": {"area": "trabalhista", "subarea": "rescisao", "urgencia": "urgente"},
+        "analise": {"probabilidade_exito": 0.72, "categoria_exito": "favoravel",
+                    "alertas_prazo": ["prazo prescricional"]},
+        "minuta": {"valor_causa": "R$ 10.000,00"},
+    })
+    summary = _human_gate_prompt(m)
+    assert summary.startswith("ÁREA: TRABALHISTA / rescisao\nURGÊNCIA: URGENTE\n\n")
+    assert "PROBABILIDADE DE ÊXITO: 72% (favoravel)" in summary
+    assert "\n  • prazo prescricional\n" in summary
+    assert summary.endswith("VALOR DA CAUSA: R$ 10.000,00")
+
+
+def test_definitions_draft_condition_skips_unviable_case():
+    """Draft step should be skipped when probability is too low."""
+    # A fresh definition: the step is modified and keeps its should_run cache
+    draft_step = recurso_ordinario_workflow().get_step("draft")
+    assert draft_step is not None
+    calls = []
+    condition = draft_step.condition
+    draft_step.condition = lambda m: calls.append(1) or condition(m)
+
+    m = WorkflowMemory()
+    m.set("analise", {"probabilidade_exito": 0.1})  # Below threshold
+    assert draft_step.should_run(m) is False
+    assert draft_step.should_run(m) is False  # same memory version → cached
+    assert len(calls) == 1
+
+    m.set("analise", {"probabilidade_exito": 0.5})  # Above threshold
+    assert draft_step.should_run(m) is True
+    assert len(calls) == 2
 
 
 if __name__ == "__main__":